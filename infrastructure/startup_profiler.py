@@ -0,0 +1,327 @@
+"""
+Profiling of the startup of a plugin in a headless QGIS application.
+
+Imports the plugin package and runs classFactory, initGui and unload like QGIS
+does when the plugin is loaded, and reports the time of each phase, the time
+spent in imports and the calls of the tools used during the startup:
+
+    python -m myplugin.qgis_plugin_tools.infrastructure.startup_profiler myplugin \
+        --flamegraph startup.folded
+
+The folded stacks can be rendered with flamegraph.pl or speedscope.
+"""
+
+import argparse
+import builtins
+import functools
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from types import FrameType, ModuleType
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from unittest import mock
+
+from qgis.core import QgsApplication
+from qgis.gui import QgisInterface, QgsMapCanvas, QgsMessageBar
+from qgis.PyQt.QtWidgets import QMainWindow
+
+from ..tools import custom_logging, resources, ui_cache
+
+__copyright__ = "Copyright 2020-2021, Gispo Ltd"
+__license__ = "GPL version 3"
+__email__ = "info@gispo.fi"
+__revision__ = "$Format:%H$"
+
+# Functions of the tools measured during the startup by the report section
+INSTRUMENTED_FUNCTIONS: Dict[str, List[Tuple[ModuleType, str]]] = {
+    "logging": [
+        (custom_logging, "setup_logger"),
+        (custom_logging, "setup_loggers"),
+    ],
+    "ui": [(ui_cache, "load_ui_type")],
+    "resources": [
+        (resources, "plugin_path"),
+        (resources, "resources_path"),
+        (resources, "plugin_name"),
+        (resources, "plugin_metadata"),
+    ],
+}
+
+_qgis_app: Optional[QgsApplication] = None
+
+
+class CallStatistics(NamedTuple):
+    calls: int
+    # Seconds including the nested calls of the instrumented functions
+    seconds: float
+
+
+class StartupReport(NamedTuple):
+    plugin: str
+    # Seconds of the import, classFactory, initGui and unload phases
+    phases: Dict[str, float]
+    # Seconds spent in the import statements run during the phases
+    import_time: float
+    imported_modules: int
+    # Statistics of the instrumented functions by section and function name
+    calls: Dict[str, Dict[str, CallStatistics]]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "plugin": self.plugin,
+            "phases": self.phases,
+            "import_time": self.import_time,
+            "imported_modules": self.imported_modules,
+            "calls": {
+                section: {name: stats._asdict() for name, stats in functions.items()}
+                for section, functions in self.calls.items()
+            },
+        }
+
+    def __str__(self) -> str:
+        lines = [f"Startup of {self.plugin}"]
+        for phase, seconds in self.phases.items():
+            lines.append(f"  {phase}: {seconds * 1000:.1f} ms")
+        lines.append(
+            f"  imports: {self.import_time * 1000:.1f} ms, "
+            f"{self.imported_modules} modules"
+        )
+        for section, functions in self.calls.items():
+            lines.append(f"  {section}:")
+            for name, stats in functions.items():
+                lines.append(
+                    f"    {name}: {stats.calls} calls, {stats.seconds * 1000:.1f} ms"
+                )
+        return "\n".join(lines)
+
+
+def profile_startup(
+    plugin_package: str, flamegraph_path: Optional[Path] = None
+) -> StartupReport:
+    """
+    Load the plugin like QGIS does and measure the startup.
+
+    Function tracing slows down the execution, so the times are larger when
+    the flamegraph is written.
+    :param plugin_package: Name of the importable plugin package
+    :param flamegraph_path: If given, the folded stacks of the startup are
+        written to this file with the self time of each stack in microseconds
+    :return: report of the startup
+    """
+    _start_qgis()
+    iface = _create_iface()
+    stacks = _FoldedStacks()
+    import_timer = _ImportTimer()
+    calls: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+    phases: Dict[str, float] = {}
+    modules_before = len(sys.modules)
+
+    with ExitStack() as context:
+        # instrumented before importing the plugin, which imports the tools by name
+        context.enter_context(_instrumented(calls))
+        context.enter_context(import_timer)
+        if flamegraph_path is not None:
+            context.enter_context(stacks)
+        with _measure(phases, "import"):
+            plugin_module = importlib.import_module(plugin_package)
+        with _measure(phases, "classFactory"):
+            plugin = plugin_module.classFactory(iface)
+        with _measure(phases, "initGui"):
+            plugin.initGui()
+        with _measure(phases, "unload"):
+            plugin.unload()
+
+    if flamegraph_path is not None:
+        stacks.write(flamegraph_path)
+    return StartupReport(
+        plugin_package,
+        phases,
+        import_timer.seconds,
+        len(sys.modules) - modules_before,
+        {
+            section: {
+                name: CallStatistics(calls=int(calls[name][0]), seconds=calls[name][1])
+                for _, name in functions
+                if name in calls
+            }
+            for section, functions in INSTRUMENTED_FUNCTIONS.items()
+        },
+    )
+
+
+def _start_qgis() -> None:
+    """Start headless QGIS application unless running inside QGIS or tests"""
+    global _qgis_app
+    if QgsApplication.instance() is not None:
+        return
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    _qgis_app = QgsApplication([], True)
+    _qgis_app.initQgis()
+
+
+def _create_iface() -> QgisInterface:
+    main_window = QMainWindow()
+    iface = mock.MagicMock(spec=QgisInterface)
+    iface.mainWindow.return_value = main_window
+    iface.mapCanvas.return_value = QgsMapCanvas(main_window)
+    iface.messageBar.return_value = QgsMessageBar(main_window)
+    return iface
+
+
+@contextmanager
+def _measure(phases: Dict[str, float], phase: str) -> Iterator[None]:
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[phase] = time.perf_counter() - started_at
+
+
+class _instrumented:  # noqa: N801
+    """
+    Replaces the instrumented functions with wrappers counting the calls and
+    their time. Also the references imported to other modules are replaced,
+    since the tools import the functions from each other by name.
+    """
+
+    def __init__(self, calls: Dict[str, List[float]]) -> None:
+        self.calls = calls
+        self._replaced: List[Tuple[ModuleType, str, Callable]] = []
+
+    def __enter__(self) -> None:
+        for functions in INSTRUMENTED_FUNCTIONS.values():
+            for module, name in functions:
+                function = getattr(module, name)
+                self._replace_everywhere(function, self._wrap(name, function))
+
+    def __exit__(self, *args: object) -> None:
+        for module, name, function in reversed(self._replaced):
+            setattr(module, name, function)
+        self._replaced.clear()
+
+    def _wrap(self, name: str, function: Callable) -> Callable:
+        stats = self.calls[name]
+
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            started_at = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stats[0] += 1
+                stats[1] += time.perf_counter() - started_at
+
+        return wrapper
+
+    def _replace_everywhere(self, function: Callable, wrapper: Callable) -> None:
+        for module in list(sys.modules.values()):
+            module_dict = getattr(module, "__dict__", None)
+            if not isinstance(module_dict, dict):
+                continue
+            for name, value in list(module_dict.items()):
+                if value is function:
+                    self._replaced.append((module, name, function))
+                    setattr(module, name, wrapper)
+
+
+class _ImportTimer:
+    """Measures the time of the outermost import statements of the main thread"""
+
+    def __init__(self) -> None:
+        self.seconds = 0.0
+        self._import = builtins.__import__
+        self._depth = 0
+
+    def __enter__(self) -> None:
+        self._import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def __exit__(self, *args: object) -> None:
+        builtins.__import__ = self._import
+
+    def _timed_import(self, *args: Any, **kwargs: Any) -> ModuleType:
+        if self._depth or threading.current_thread() is not threading.main_thread():
+            return self._import(*args, **kwargs)
+        self._depth += 1
+        started_at = time.perf_counter()
+        try:
+            return self._import(*args, **kwargs)
+        finally:
+            self.seconds += time.perf_counter() - started_at
+            self._depth -= 1
+
+
+class _FoldedStacks:
+    """
+    Traces the calls of the main thread and collects the self time of each
+    call stack, in the folded format of flamegraph.pl
+    """
+
+    def __init__(self) -> None:
+        self.stacks: Dict[Tuple[str, ...], float] = defaultdict(float)
+        self._stack: List[str] = []
+        self._last = 0.0
+
+    def __enter__(self) -> None:
+        self._last = time.perf_counter()
+        sys.setprofile(self._trace)
+
+    def __exit__(self, *args: object) -> None:
+        sys.setprofile(None)
+        self._stack.clear()
+
+    def write(self, path: Path) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, seconds in self.stacks.items():
+                microseconds = round(seconds * 1_000_000)
+                if microseconds > 0:
+                    f.write(f"{';'.join(stack)} {microseconds}\n")
+
+    def _trace(self, frame: FrameType, event: str, arg: Any) -> None:
+        now = time.perf_counter()
+        if self._stack:
+            self.stacks[tuple(self._stack)] += now - self._last
+        if event == "call":
+            code = frame.f_code
+            self._stack.append(
+                f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+            )
+        elif event == "c_call":
+            self._stack.append(_builtin_name(arg))
+        elif self._stack:
+            # return, c_return or c_exception
+            self._stack.pop()
+        self._last = time.perf_counter()
+
+
+def _builtin_name(function: Any) -> str:
+    module = getattr(function, "__module__", None)
+    name = getattr(function, "__qualname__", repr(function))
+    return f"{module}.{name}" if module else name
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Profile the startup of a QGIS plugin in headless QGIS"
+    )
+    parser.add_argument("plugin", help="Name of the importable plugin package")
+    parser.add_argument(
+        "--flamegraph", type=Path, help="File to write the folded call stacks to"
+    )
+    parser.add_argument("--json", type=Path, help="File to write the report to")
+    args = parser.parse_args(argv)
+
+    report = profile_startup(args.plugin, args.flamegraph)
+    print(report)
+    if args.json is not None:
+        args.json.write_text(json.dumps(report.as_dict(), indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
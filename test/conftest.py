@@ -6,10 +6,11 @@ __license__ = "GPL version 3"
 __email__ = "info@gispo.fi"
 __revision__ = "$Format:%H$"
 
-from typing import Tuple
+from typing import Iterator, Tuple
 
 import pytest
 
+from ..testing.http_server import LocalHttpServer
 from ..testing.utilities import TestTaskRunner
 from ..tools.custom_logging import (
     LogTarget,
@@ -44,3 +45,9 @@ def file_fixture() -> Tuple[str, bytes, str]:
 def another_file_fixture() -> Tuple[str, bytes, str]:
     with open("test/fixtures/text.txt", "rb") as f:
         yield "text.txt", f.read(), "text/plain"
+
+
+@pytest.fixture()
+def http_server() -> Iterator[LocalHttpServer]:
+    with LocalHttpServer() as server:
+        yield server
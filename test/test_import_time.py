@@ -0,0 +1,76 @@
+"""
+Import costs of the tools. The per module report is printed with
+
+QGIS_PLUGIN_TOOLS_BENCHMARK=1 pytest -s test/test_import_time.py
+"""
+
+from typing import Set
+
+import pytest
+
+from ..testing.benchmark import measure_imports
+from ..testing.utilities import is_benchmarking
+from ..tools import (
+    custom_logging,
+    decorations,
+    i18n,
+    network,
+    resources,
+    settings,
+    ui,
+    version,
+)
+
+# Modules loaded by QGIS before the plugins
+QGIS_MODULES = ("qgis.core", "qgis.gui", "qgis.PyQt.QtWidgets")
+# Dependencies that should be imported only when they are used
+LAZY_DEPENDENCIES = ("requests", "osgeo", "PyQt5.uic", "PyQt6.uic")
+TOOLS = [
+    module.__name__
+    for module in (
+        custom_logging,
+        decorations,
+        i18n,
+        network,
+        resources,
+        settings,
+        ui,
+        version,
+    )
+]
+
+
+@pytest.fixture(scope="module")
+def qgis_modules() -> Set[str]:
+    return {import_time.module for import_time in measure_imports(*QGIS_MODULES)}
+
+
+def test_tools_do_not_import_lazy_dependencies(qgis_modules):
+    # all the tools are imported in a single interpreter to keep the test fast
+    imported = {
+        import_time.module
+        for import_time in measure_imports(*QGIS_MODULES, *TOOLS)
+        if import_time.module not in qgis_modules
+    }
+
+    assert not [
+        name
+        for name in imported
+        for dependency in LAZY_DEPENDENCIES
+        if name == dependency or name.startswith(f"{dependency}.")
+    ]
+
+
+@pytest.mark.skipif(
+    not is_benchmarking(), reason="Set QGIS_PLUGIN_TOOLS_BENCHMARK=1 to benchmark"
+)
+def test_benchmark_import_time(qgis_modules):
+    import_times = [
+        import_time
+        for import_time in measure_imports(*QGIS_MODULES, *TOOLS)
+        if import_time.module not in qgis_modules
+    ]
+
+    print()
+    for import_time in sorted(import_times, key=lambda t: -t.cumulative_time)[:30]:
+        print(import_time)
@@ -0,0 +1,80 @@
+import json
+from typing import List
+
+import pytest
+
+from ..tools.json_stream import iter_json_items
+
+DOCUMENT = {
+    "type": "FeatureCollection",
+    "name": 'escaped \\" [ characters',
+    "metadata": [{"features": ["not", "these"]}],
+    "features": [
+        {"id": 1, "properties": {"name": "ä ] \\"}},
+        {"id": 2, "properties": {"values": [1.5, -2e3, None, True]}},
+        12345,
+    ],
+    "links": [],
+}
+
+
+def _chunks(content: bytes, size: int) -> List[bytes]:
+    return [content[i : i + size] for i in range(0, len(content), size)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 1000])
+def test_iter_json_items(chunk_size):
+    content = json.dumps(DOCUMENT, ensure_ascii=False).encode("utf-8")
+
+    items = list(iter_json_items(_chunks(content, chunk_size), "features"))
+
+    assert items == DOCUMENT["features"]
+
+
+def test_iter_json_items_nested_path():
+    content = b'{"result": {"count": 2, "items": [{"a": 1}, {"b": 2}]}}'
+
+    assert list(iter_json_items(_chunks(content, 3), "result.items")) == [
+        {"a": 1},
+        {"b": 2},
+    ]
+
+
+def test_iter_json_items_top_level_array():
+    assert list(iter_json_items([b"[1, 2", b"3, []", b"]"])) == [1, 23, []]
+    with pytest.raises(ValueError):
+        list(iter_json_items([b"[1 2]"]))
+
+
+def test_iter_json_items_is_lazy():
+    def chunks():
+        yield b'{"features": [1, 2, '
+        raise AssertionError("read too far")
+
+    assert next(iter_json_items(chunks(), "features")) == 1
+
+
+def test_iter_json_items_large_item_in_small_chunks():
+    feature = {"id": 1, "coordinates": [[i, i / 3, '\\"]'] for i in range(20000)]}
+    content = json.dumps({"features": [feature, "[", -1.5e3]}).encode("utf-8")
+
+    items = list(iter_json_items(_chunks(content, 1), "features"))
+
+    assert items == [feature, "[", -1.5e3]
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        b'{"type": "FeatureCollection"}',
+        b'{"features": [1, {]}',
+        b'{"features": [1',
+        b'{"features": [1 2]}',
+        b'{"features": [{"a": 1} {"b": 2}]}',
+        b'{"features": [1,, 2]}',
+        b'{"features": [1, ]}',
+    ],
+)
+def test_iter_json_items_invalid_document(content):
+    with pytest.raises(ValueError):
+        list(iter_json_items([content], "features"))
@@ -1,9 +1,33 @@
+import gzip
+import io
+import json
+import logging
+import queue
+import threading
 from threading import Thread
+from typing import List, Set
 from unittest.mock import MagicMock
 
+import pytest
+from qgis.core import Qgis, QgsMessageLog
 from qgis.PyQt.QtCore import QCoreApplication
 
-from ..tools.custom_logging import SimpleMessageBarProxy
+from ..tools import custom_logging, settings
+from ..tools.custom_logging import (
+    JsonFormatter,
+    JsonLinesFileHandler,
+    LogQueueHandler,
+    LogQueueListener,
+    LogTarget,
+    QgsLogHandler,
+    SimpleMessageBarProxy,
+    current_task_name,
+    get_log_level,
+    get_log_level_key,
+    refresh_log_levels,
+)
+from ..tools.messages import MessageBarLogger
+from ..tools.settings import set_setting
 
 
 def test_message_log_proxies_between_threads():
@@ -24,3 +48,348 @@ def test_message_log_proxies_between_threads():
     mock_msg_bar.pushMessage.assert_called_once_with(
         title="title", text="text", level=1, duration=2
     )
+
+
+def test_message_bar_proxy_coalesces_identical_messages(qtbot):
+    mock_msg_bar = MagicMock()
+    proxy = SimpleMessageBarProxy(mock_msg_bar, coalesce_seconds=0.05)
+
+    for _ in range(100):
+        proxy.push_message("title", "text", Qgis.Critical, 10)
+
+    mock_msg_bar.pushMessage.assert_called_once_with(
+        title="title", text="text", level=Qgis.Critical, duration=10
+    )
+    qtbot.waitUntil(lambda: mock_msg_bar.pushMessage.call_count == 2)
+    mock_msg_bar.pushMessage.assert_called_with(
+        title="title (+99)", text="text", level=Qgis.Critical, duration=10
+    )
+
+
+def test_message_bar_proxy_limits_message_rate(qtbot):
+    mock_msg_bar = MagicMock()
+    proxy = SimpleMessageBarProxy(
+        mock_msg_bar, coalesce_seconds=0.05, max_messages_per_second=3
+    )
+
+    for i in range(10):
+        level = Qgis.Warning if i == 5 else Qgis.Info
+        proxy.push_message(f"title {i}", "text", level, i)
+
+    assert mock_msg_bar.pushMessage.call_count == 3
+    qtbot.waitUntil(lambda: mock_msg_bar.pushMessage.call_count == 4)
+    mock_msg_bar.pushMessage.assert_called_with(
+        title="7 more messages",
+        text="See the message log for details",
+        level=Qgis.Warning,
+        duration=5,
+    )
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self, level: int = logging.NOTSET) -> None:
+        super().__init__(level)
+        self.records: List[str] = []
+        self.threads: Set[threading.Thread] = set()
+
+    def emit(self, record):
+        self.records.append(record.getMessage())
+        self.threads.add(threading.current_thread())
+
+
+@pytest.fixture()
+def queued_logger():
+    logger = logging.getLogger("test_queued_logging")
+    logger.setLevel(logging.DEBUG)
+    handlers = []
+
+    def add_queue_handler(handler, queue_size=100, start=True):
+        listener = LogQueueListener(queue.Queue(queue_size), [handler])
+        queue_handler = LogQueueHandler(listener)
+        if start:
+            listener.start()
+        logger.addHandler(queue_handler)
+        handlers.append(queue_handler)
+        return queue_handler
+
+    yield logger, add_queue_handler
+    for queue_handler in handlers:
+        logger.removeHandler(queue_handler)
+        queue_handler.close()
+
+
+def test_queued_records_are_handled_in_listener_thread(queued_logger):
+    logger, add_queue_handler = queued_logger
+    handler = RecordingHandler(logging.INFO)
+    queue_handler = add_queue_handler(handler)
+
+    logger.debug("not handled")
+    for i in range(3):
+        logger.info("message %d", i)
+    queue_handler.close()
+
+    assert handler.records == ["message 0", "message 1", "message 2"]
+    assert handler.threads and threading.current_thread() not in handler.threads
+
+
+def test_queued_exception_keeps_traceback_out_of_message(queued_logger):
+    logger, add_queue_handler = queued_logger
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    queue_handler = add_queue_handler(handler)
+
+    try:
+        raise ValueError("failure")
+    except ValueError:
+        logger.exception("message %s", "arg")
+    queue_handler.close()
+
+    (record,) = records
+    assert record.getMessage() == "message arg"
+    assert record.exc_info[0] is ValueError
+    assert "ValueError: failure" in logging.Formatter().format(record)
+    assert json.loads(JsonFormatter().format(record))["exception"].endswith(
+        "ValueError: failure"
+    )
+
+
+def test_stream_handler_is_flushed_once_per_batch(queued_logger):
+    logger, add_queue_handler = queued_logger
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.flush = MagicMock(wraps=handler.flush)
+    queue_handler = add_queue_handler(handler, start=False)
+
+    for i in range(10):
+        logger.info("message %d", i)
+    queue_handler.listener.start()
+    queue_handler.close()
+
+    assert stream.getvalue().splitlines() == [f"message {i}" for i in range(10)]
+    assert handler.flush.call_count == 1
+
+
+def test_full_queue_drops_records(queued_logger):
+    logger, add_queue_handler = queued_logger
+    handler = RecordingHandler()
+    queue_handler = add_queue_handler(handler, queue_size=2, start=False)
+
+    for i in range(5):
+        logger.info("message %d", i)
+    assert queue_handler.dropped == 3
+
+    # handle the queued records to make room
+    queue_handler.listener.start()
+    queue_handler.listener.stop()
+    queue_handler.listener.start()
+    logger.info("after drops")
+    queue_handler.close()
+
+    assert handler.records == [
+        "message 0",
+        "message 1",
+        "3 log messages were dropped, because the log queue was full",
+        "after drops",
+    ]
+
+
+def test_qgis_log_handler_joins_batch_by_level(mocker):
+    log_message = mocker.patch.object(QgsMessageLog, "logMessage")
+    handler = QgsLogHandler(message_log_name="test")
+    records = [
+        logging.makeLogRecord({"msg": msg, "levelname": level})
+        for msg, level in (("a", "INFO"), ("b", "DEBUG"), ("c", "WARNING"))
+    ]
+
+    handler.emit_batch(records)
+
+    assert [call.args[0] for call in log_message.call_args_list] == ["a\nb", "c"]
+
+
+class CountingStr:
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.str_calls = 0
+
+    def __str__(self) -> str:
+        self.str_calls += 1
+        return self.text
+
+
+@pytest.fixture()
+def recorded_logger():
+    logger = logging.getLogger("test_message_bar_logger")
+    handler = RecordingHandler()
+    handler.funcNames = []
+    handler.filter = lambda record: handler.funcNames.append(record.funcName) or True
+    logger.addHandler(handler)
+    yield logger, handler
+    logger.removeHandler(handler)
+    logger.setLevel(logging.NOTSET)
+
+
+def test_message_bar_logger_skips_disabled_levels(recorded_logger):
+    logger, handler = recorded_logger
+    logger.setLevel(logging.WARNING)
+    message, details = CountingStr("message"), CountingStr("details")
+
+    MessageBarLogger(logger.name).info(message, details)
+
+    assert handler.records == []
+    assert message.str_calls == 0
+    assert details.str_calls == 0
+
+
+def test_message_bar_logger_does_not_format_records_not_emitted(
+    recorded_logger, monkeypatch
+):
+    logger, handler = recorded_logger
+    logger.setLevel(logging.INFO)
+    handler.setLevel(logging.WARNING)
+    # no handlers of the root logger, such as the ones of pytest, either
+    monkeypatch.setattr(logger, "propagate", False)
+    message, details = CountingStr("message"), CountingStr("details")
+
+    MessageBarLogger(logger.name).info(message, details)
+
+    assert handler.records == []
+    assert message.str_calls == 0
+    assert details.str_calls == 0
+
+
+def test_message_bar_logger_logs_message_and_details(recorded_logger):
+    logger, handler = recorded_logger
+    logger.setLevel(logging.INFO)
+
+    MessageBarLogger(logger.name).warning(CountingStr("message"), "details")
+
+    assert handler.records == ["message", "details"]
+    assert handler.funcNames == ["test_message_bar_logger_logs_message_and_details"] * 2
+
+
+def test_json_formatter_includes_task_and_extra_fields():
+    record = logging.makeLogRecord(
+        {
+            "name": "test",
+            "levelname": "WARNING",
+            "msg": "message %s",
+            "args": ("arg",),
+            "details": "details",
+        }
+    )
+    token = current_task_name.set("TestTask")
+    try:
+        entry = json.loads(JsonFormatter().format(record))
+    finally:
+        current_task_name.reset(token)
+
+    assert entry["logger"] == "test"
+    assert entry["level"] == "WARNING"
+    assert entry["message"] == "message arg"
+    assert entry["task"] == "TestTask"
+    assert entry["details"] == "details"
+    assert entry["time"].endswith("+00:00")
+
+
+def test_json_lines_file_handler_rotates_and_compresses(tmp_path):
+    log_file = tmp_path / "plugin.jsonl"
+    handler = JsonLinesFileHandler(
+        str(log_file), max_bytes=1000, rotation_interval=None, backup_count=2
+    )
+    logger = logging.getLogger("test_json_lines")
+    logger.addHandler(handler)
+    try:
+        for i in range(100):
+            logger.warning("message %d", i)
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+    rotated_files = sorted(tmp_path.glob("plugin.*.jsonl.gz"))
+    assert len(rotated_files) == 2
+    assert not list(tmp_path.glob("plugin.*.jsonl"))
+    with gzip.open(rotated_files[-1], "rt", encoding="utf-8") as f:
+        rotated_messages = [json.loads(line)["message"] for line in f]
+    messages = [
+        json.loads(line)["message"]
+        for line in log_file.read_text(encoding="utf-8").splitlines()
+    ]
+    assert rotated_messages[-1] == f"message {99 - len(messages)}"
+    assert messages[-1] == "message 99"
+
+
+@pytest.fixture()
+def log_levels(qgis_new_project):
+    refresh_log_levels()
+    yield
+    for target in LogTarget:
+        set_setting(get_log_level_key(target), target.default_level)
+
+
+def test_log_level_is_cached_until_changed(log_levels, mocker):
+    set_setting(get_log_level_key(LogTarget.FILE), "WARNING")
+    get_log_level_name = mocker.spy(custom_logging, "get_log_level_name")
+
+    assert get_log_level(LogTarget.FILE) == logging.WARNING
+    assert get_log_level(LogTarget.FILE) == logging.WARNING
+    assert get_log_level_name.call_count == 0
+
+    set_setting(get_log_level_key(LogTarget.FILE), "DEBUG")
+
+    assert get_log_level(LogTarget.FILE) == logging.DEBUG
+    assert get_log_level_name.call_count == 1
+
+
+def test_log_level_change_updates_existing_handlers(log_levels):
+    set_setting(get_log_level_key(LogTarget.STREAM), "INFO")
+    set_setting(get_log_level_key(LogTarget.FILE), "NOTSET")
+    logger = logging.getLogger("test_live_log_levels")
+    stream_handler, qgis_handler = custom_logging._create_handlers("test", None)
+    logger.addHandler(stream_handler)
+    logger.addHandler(qgis_handler)
+    logger.setLevel(logging.INFO)
+    try:
+        set_setting(get_log_level_key(LogTarget.STREAM), "DEBUG")
+
+        assert stream_handler.level == logging.DEBUG
+        assert qgis_handler.level == logging.DEBUG
+        assert logger.level == logging.DEBUG
+
+        set_setting(get_log_level_key(LogTarget.STREAM), "NOTSET")
+
+        assert stream_handler.level > logging.CRITICAL
+        assert qgis_handler.level == logging.NOTSET
+    finally:
+        logger.removeHandler(stream_handler)
+        logger.removeHandler(qgis_handler)
+
+
+def test_log_levels_are_separate_per_plugin(log_levels, monkeypatch):
+    def use_plugin(name):
+        monkeypatch.setattr(custom_logging, "plugin_name", lambda: name)
+        monkeypatch.setattr(settings, "plugin_name", lambda: name)
+
+    handlers = {}
+    for plugin, level in (("plugin_a", "INFO"), ("plugin_b", "ERROR")):
+        use_plugin(plugin)
+        set_setting(get_log_level_key(LogTarget.FILE), "NOTSET")
+        set_setting(get_log_level_key(LogTarget.STREAM), level)
+        handlers[plugin] = custom_logging._create_handlers(plugin, None)
+        logging.getLogger(f"test_{plugin}").addHandler(handlers[plugin][0])
+
+    try:
+        assert get_log_level(LogTarget.STREAM) == logging.ERROR
+        use_plugin("plugin_a")
+        assert get_log_level(LogTarget.STREAM) == logging.INFO
+
+        set_setting(get_log_level_key(LogTarget.STREAM), "DEBUG")
+
+        assert handlers["plugin_a"][0].level == logging.DEBUG
+        assert handlers["plugin_b"][0].level == logging.ERROR
+    finally:
+        for plugin in handlers:
+            use_plugin(plugin)
+            logging.getLogger(f"test_{plugin}").removeHandler(handlers[plugin][0])
+            for target in LogTarget:
+                set_setting(get_log_level_key(target), target.default_level)
@@ -0,0 +1,45 @@
+"""
+Overhead of logging calls filtered out by the level.
+
+Run with QGIS_PLUGIN_TOOLS_BENCHMARK=1 pytest -s test/test_logging_benchmark.py
+"""
+
+import logging
+import timeit
+
+import pytest
+
+from ..testing.utilities import is_benchmarking
+from ..tools.messages import MessageBarLogger
+
+pytestmark = pytest.mark.skipif(
+    not is_benchmarking(), reason="Set QGIS_PLUGIN_TOOLS_BENCHMARK=1 to benchmark"
+)
+
+CALLS = 100_000
+
+
+@pytest.fixture()
+def disabled_logger():
+    logger = logging.getLogger("test_logging_benchmark")
+    logger.setLevel(logging.ERROR)
+    yield logger
+    logger.setLevel(logging.NOTSET)
+
+
+def test_benchmark_disabled_message_bar_logging(disabled_logger):
+    message_bar = MessageBarLogger(disabled_logger.name)
+    details = ValueError("details")
+
+    logger_seconds = min(
+        timeit.repeat(lambda: disabled_logger.info("message"), number=CALLS)
+    )
+    message_bar_seconds = min(
+        timeit.repeat(lambda: message_bar.info("message", details), number=CALLS)
+    )
+
+    print()
+    print(f"Logger.info: {logger_seconds / CALLS * 1e9:.0f} ns per call")
+    print(f"MessageBarLogger.info: {message_bar_seconds / CALLS * 1e9:.0f} ns per call")
+    # the disabled call returns after the level check
+    assert message_bar_seconds < 5 * logger_seconds
@@ -3,22 +3,59 @@ __license__ = "GPL version 3"
 __email__ = "info@gispo.fi"
 __revision__ = "$Format:%H$"
 
+import base64
+import gzip
+import hashlib
 import json
+import os
+import socket
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 
 import pytest
+from qgis.core import QgsNetworkAccessManager
+from qgis.PyQt.QtCore import QBuffer, QIODevice
+from qgis.PyQt.QtNetwork import QNetworkReply
 
+from ..testing.http_server import DROP_CONNECTION, LocalHttpServer
+from ..tools import network
 from ..tools.exceptions import QgsPluginNetworkException
-from ..tools.network import download_to_file, fetch, post
+from ..tools.network import (
+    FileField,
+    FileInfo,
+    MultipartEncoder,
+    RetryMetrics,
+    RetryPolicy,
+    _ContentDecoder,
+    _DownloadWriter,
+    _future_result,
+    _part_file_name,
+    _request_key,
+    _single_flight,
+    configure_requests_session,
+    download_to_file,
+    fetch,
+    fetch_json_stream,
+    fetch_many,
+    fetch_paged,
+    fetch_raw_async,
+    fetch_raw_many,
+    head,
+    post,
+    request_raw,
+    requests_session,
+)
+from ..tools.network_metrics import disable_metrics, enable_metrics
 
 
-@pytest.mark.skip(
-    "Skipped due httbin.org being flaky."
-    "TODO: refactor tests not to be dependent of an external http api"
-)
-def test_fetch(qgis_new_project):
-    data = fetch("https://httpbin.org/get")
+def test_fetch(qgis_new_project, http_server):
+    http_server.add_echo("/get")
+    data = fetch(http_server.url("/get"))
     data = json.loads(data)
-    assert data["url"] == "https://httpbin.org/get"
+    assert data["url"] == http_server.url("/get")
 
 
 def test_fetch_invalid_url(qgis_new_project):
@@ -26,25 +63,28 @@ def test_fetch_invalid_url(qgis_new_project):
         fetch("invalidurl")
 
 
-@pytest.mark.skip(
-    "Skipped due httbin.org being flaky."
-    "TODO: refactor tests not to be dependent of an external http api"
-)
-def test_fetch_params(qgis_new_project):
-    data = fetch("https://httpbin.org/get", params={"foo": "bar"})
+def test_fetch_params(qgis_new_project, http_server):
+    http_server.add_echo("/get")
+    data = fetch(http_server.url("/get"), params={"foo": "bar"})
     data = json.loads(data)
-    assert data["url"] == "https://httpbin.org/get?foo=bar"
+    assert data["url"] == http_server.url("/get?foo=bar")
     assert data["args"] == {"foo": "bar"}
 
 
-@pytest.mark.skip(
-    "Skipped due httbin.org being flaky."
-    "TODO: refactor tests not to be dependent of an external http api"
-)
-def test_post(qgis_new_project):
-    data = post("https://httpbin.org/post")
+def test_fetch_many_without_urls(qgis_new_project):
+    assert fetch_many([]) == []
+
+
+def test_fetch_many_invalid_url(qgis_new_project):
+    with pytest.raises(QgsPluginNetworkException):
+        fetch_many(["invalidurl", "anotherinvalidurl"], concurrency=1)
+
+
+def test_post(qgis_new_project, http_server):
+    http_server.add_echo("/post")
+    data = post(http_server.url("/post"))
     data = json.loads(data)
-    assert data["url"] == "https://httpbin.org/post"
+    assert data["url"] == http_server.url("/post")
 
 
 def test_post_invalid_url(qgis_new_project):
@@ -52,42 +92,101 @@ def test_post_invalid_url(qgis_new_project):
         post("invalidurl")
 
 
-@pytest.mark.skip(
-    "Skipped due httbin.org being flaky."
-    "TODO: refactor tests not to be dependent of an external http api"
-)
-def test_post_data(qgis_new_project):
-    data = post("https://httpbin.org/post", data={"foo": "bar"})
+def test_post_data(qgis_new_project, http_server):
+    http_server.add_echo("/post")
+    data = post(http_server.url("/post"), data={"foo": "bar"})
     data = json.loads(data)
-    assert data["url"] == "https://httpbin.org/post"
+    assert data["url"] == http_server.url("/post")
     assert data["data"] == json.dumps({"foo": "bar"})
 
 
-@pytest.mark.skip(
-    "Skipped due httbin.org being flaky."
-    "TODO: refactor tests not to be dependent of an external http api"
-)
-def test_upload_file(qgis_new_project, file_fixture):
+@pytest.mark.parametrize("method", ["put", "patch", "delete"])
+def test_request_raw_methods(qgis_new_project, http_server, method):
+    http_server.add_echo("/anything")
+    content, _ = request_raw(http_server.url("/anything"), method)
+    assert json.loads(content)["method"] == method.upper()
+
+
+@pytest.mark.parametrize("method", ["post", "put", "patch"])
+def test_request_raw_sends_body_as_is(qgis_new_project, http_server, method):
+    http_server.add_echo("/anything")
+    body = b"\x00\x01binary\xff"
+    content, _ = request_raw(
+        http_server.url("/anything"),
+        method,
+        body=body,
+        content_type="application/octet-stream",
+    )
+    data = json.loads(content)
+    assert data["headers"]["Content-Type"] == "application/octet-stream"
+    # binary data is echoed as base64 data url
+    assert base64.b64decode(data["data"].split(",")[1]) == body
+
+
+def test_request_raw_streams_device_body(qgis_new_project, http_server):
+    http_server.add_echo("/anything")
+    body = QBuffer()
+    body.setData(b"streamed body")
+    body.open(QIODevice.ReadOnly)
+    content, _ = request_raw(http_server.url("/anything"), "put", body=body)
+    assert json.loads(content)["data"] == "streamed body"
+
+
+def test_head(qgis_new_project, http_server):
+    http_server.add_file("/file.bin", b"content")
+    headers = head(http_server.url("/file.bin"))
+    assert headers["content-length"] == "7"
+    assert headers["etag"] == http_server.files["/file.bin"].etag
+    assert http_server.requests_to("/file.bin")[0].method == "HEAD"
+
+
+def test_concurrent_identical_heads_share_request(qgis_new_project):
+    with LocalHttpServer(latency=0.3) as server:
+        server.add_file("/file.bin", b"content")
+        with ThreadPoolExecutor(3) as executor:
+            results = list(
+                executor.map(lambda _: head(server.url("/file.bin")), range(3))
+            )
+
+        assert [headers["content-length"] for headers in results] == ["7"] * 3
+        assert len(server.requests_to("/file.bin")) == 1
+
+
+def test_patch_times_out(qgis_new_project):
+    old_timeout = QgsNetworkAccessManager.timeout()
+    QgsNetworkAccessManager.setTimeout(200)
+    try:
+        with LocalHttpServer(latency=2) as server:
+            server.add_echo("/anything")
+            with pytest.raises(QgsPluginNetworkException) as e:
+                request_raw(server.url("/anything"), "patch", body=b"body")
+    finally:
+        QgsNetworkAccessManager.setTimeout(old_timeout)
+
+    assert e.value.error == QNetworkReply.TimeoutError
+
+
+def test_upload_file(qgis_new_project, http_server, file_fixture):
+    http_server.add_echo("/post")
     file_name, file_content, file_type = file_fixture
     data = post(
-        "https://httpbin.org/post",
+        http_server.url("/post"),
         files=[("file", (file_name, file_content, file_type))],
     )
     data = json.loads(data)
-    assert data["url"] == "https://httpbin.org/post"
+    assert data["url"] == http_server.url("/post")
     assert data["files"]
     assert bytes(data["files"]["file"], "utf-8") == file_content
 
 
-@pytest.mark.skip(
-    "Skipped due httbin.org being flaky."
-    "TODO: refactor tests not to be dependent of an external http api"
-)
-def test_upload_multiple_files(qgis_new_project, file_fixture, another_file_fixture):
+def test_upload_multiple_files(
+    qgis_new_project, http_server, file_fixture, another_file_fixture
+):
+    http_server.add_echo("/post")
     file_name, file_content, file_type = file_fixture
     another_file_name, another_file_content, another_file_type = another_file_fixture
     data = post(
-        "https://httpbin.org/post",
+        http_server.url("/post"),
         files=[
             ("file", (file_name, file_content, file_type)),
             (
@@ -97,33 +196,100 @@ def test_upload_multiple_files(qgis_new_project, file_fixture, another_file_fixt
         ],
     )
     data = json.loads(data)
-    assert data["url"] == "https://httpbin.org/post"
+    assert data["url"] == http_server.url("/post")
     assert data["files"]
     assert bytes(data["files"]["file"], "utf-8") == file_content
     assert bytes(data["files"]["another_file"], "utf-8") == another_file_content
 
 
-@pytest.mark.skip(
-    "file does not exist. "
-    "TODO: search another file to be used using Content-Disposition"
-)
-def test_download_to_file(qgis_new_project, tmpdir):
-    path_to_file = download_to_file(
-        "https://twitter.com/gispofinland/status/1324599933337567232/photo/1",
-        tmpdir,
-        "test_file",
+def test_multipart_encoder_streams_files_from_disk(file_fixture, tmp_path):
+    file_name, file_content, file_type = file_fixture
+    file_on_disk = tmp_path / "text.txt"
+    file_on_disk.write_bytes(b"streamed content")
+
+    encoder = MultipartEncoder(
+        [
+            FileField("file", FileInfo(file_name, file_content, file_type)),
+            FileField("another_file", FileInfo("text.txt", file_on_disk, "text/plain")),
+        ],
+        boundary="boundary",
+    )
+
+    expected = (
+        b"\r\n--boundary\r\n"
+        b'Content-Disposition: form-data; name="file"; filename="file.xml"\r\n'
+        b"Content-Type: text/xml\r\n\r\n" + file_content + b"\r\n--boundary\r\n"
+        b'Content-Disposition: form-data; name="another_file"; filename="text.txt"\r\n'
+        b"Content-Type: text/plain\r\n\r\n"
+        b"streamed content"
+        b"\r\n--boundary--\r\n"
     )
+    assert encoder.content_type == "multipart/form-data; boundary=boundary"
+    assert len(encoder) == len(expected)
+
+    chunks = []
+    while chunk := encoder.read(7):
+        chunks.append(chunk)
+    assert b"".join(chunks) == expected
+
+    encoder.seek(len(expected) - 30)
+    assert encoder.read() == expected[-30:]
+    encoder.close()
+
+
+def test_download_writer_resumes_partial_file(tmp_path):
+    progress = []
+    writer = _DownloadWriter(tmp_path / "file.part", progress.append)
+    assert writer.resume_headers() == {"Accept-Encoding": "identity"}
+
+    writer.start(200, {"content-length": "6", "etag": '"1"'})
+    writer.write(b"abc")
+    writer.close()
+
+    writer = _DownloadWriter(tmp_path / "file.part", progress.append)
+    assert writer.resume_headers() == {
+        "Accept-Encoding": "identity",
+        "Range": "bytes=3-",
+        "If-Range": '"1"',
+    }
+    writer.start(206, {"content-range": "bytes 3-5/6", "content-length": "3"})
+    writer.write(b"def")
+    writer.finish(tmp_path / "file")
+
+    assert (tmp_path / "file").read_bytes() == b"abcdef"
+    assert not (tmp_path / "file.part").exists()
+    assert progress[-1].bytes_received == 6
+    assert progress[-1].total_bytes == 6
+
+
+def test_download_writer_restarts_if_file_changed(tmp_path):
+    (tmp_path / "file.part").write_bytes(b"old")
+    writer = _DownloadWriter(tmp_path / "file.part")
+
+    writer.start(200, {"content-length": "3"})
+    writer.write(b"new")
+    writer.finish(tmp_path / "file")
+
+    assert (tmp_path / "file").read_bytes() == b"new"
+
+
+def test_download_to_file(qgis_new_project, http_server, tmpdir):
+    http_server.add_file(
+        "/photo/1",
+        b"image",
+        "image/jpeg",
+        {"Content-Disposition": 'attachment; filename="photo.jpg"'},
+    )
+    path_to_file = download_to_file(http_server.url("/photo/1"), tmpdir, "test_file")
     assert path_to_file.exists()
     assert path_to_file.is_file()
+    assert path_to_file.name == "test_file"
 
 
-@pytest.mark.skip(
-    "file does not exist. "
-    "TODO: search another file to be used using Content-Disposition"
-)
-def test_download_to_file_without_requests(qgis_new_project, tmpdir):
+def test_download_to_file_without_requests(qgis_new_project, http_server, tmpdir):
+    http_server.add_file("/photo/1", b"image", "image/jpeg")
     path_to_file = download_to_file(
-        "https://twitter.com/gispofinland/status/1324599933337567232/photo/1",
+        http_server.url("/photo/1"),
         tmpdir,
         "test_file",
         use_requests_if_available=False,
@@ -132,16 +298,28 @@ def test_download_to_file_without_requests(qgis_new_project, tmpdir):
     assert path_to_file.is_file()
 
 
-def test_download_to_file_with_name(qgis_new_project, tmpdir):
-    path_to_file = download_to_file(
-        "https://raw.githubusercontent.com/GispoCoding/FMI2QGIS/master/FMI2QGIS/test/data/aq_small.nc",  # noqa E501
-        tmpdir,
-    )
+def test_download_to_file_with_name(qgis_new_project, http_server, tmpdir):
+    http_server.add_file("/test/data/aq_small.nc", b"netcdf")
+    path_to_file = download_to_file(http_server.url("/test/data/aq_small.nc"), tmpdir)
     assert path_to_file.exists()
     assert path_to_file.is_file()
     assert path_to_file.name == "aq_small.nc"
 
 
+def test_download_to_file_with_content_disposition_name(
+    qgis_new_project, http_server, tmpdir
+):
+    http_server.add_file(
+        "/photo/1",
+        b"image",
+        "image/jpeg",
+        {"Content-Disposition": 'attachment; filename="photo.jpg"'},
+    )
+    path_to_file = download_to_file(http_server.url("/photo/1"), tmpdir)
+    assert path_to_file.name == "photo.jpg"
+    assert path_to_file.read_bytes() == b"image"
+
+
 def test_download_to_file_invalid_url(qgis_new_project, tmpdir):
     with pytest.raises(QgsPluginNetworkException):
         download_to_file("invalidurl", tmpdir)
@@ -150,3 +328,426 @@ def test_download_to_file_invalid_url(qgis_new_project, tmpdir):
 def test_download_to_file_invalid_url_without_requests(qgis_new_project, tmpdir):
     with pytest.raises(QgsPluginNetworkException):
         download_to_file("invalidurl", tmpdir)
+
+
+@pytest.mark.parametrize("use_requests", [True, False])
+def test_download_to_file_in_segments(
+    qgis_new_project, http_server, tmp_path, mocker, use_requests
+):
+    mocker.patch.object(network, "MIN_SEGMENT_SIZE", 1000)
+    content = os.urandom(10_123)
+    http_server.add_file("/file.bin", content)
+
+    path_to_file = download_to_file(
+        http_server.url("/file.bin"),
+        tmp_path,
+        use_requests_if_available=use_requests,
+        segments=4,
+        expected_checksum=hashlib.sha256(content).hexdigest(),
+    )
+
+    assert path_to_file.read_bytes() == content
+    assert sorted(
+        request.headers.get("Range", "")
+        for request in http_server.requests_to("/file.bin")
+    ) == ["", "bytes=0-2530", "bytes=2531-5061", "bytes=5062-7592", "bytes=7593-10122"]
+
+
+@pytest.mark.parametrize(
+    "url,output_name,expected",
+    [
+        ("https://example.com/data/file.bin?key=a&b=c", None, "file.bin.part"),
+        ("https://example.com/data/my%20file.bin", None, "my file.bin.part"),
+        ("https://example.com/", None, "example.com.part"),
+        ("https://example.com/file.bin?key=a", "out.bin", "out.bin.part"),
+        ("https://example.com/a:b*c", None, "a_b_c.part"),
+    ],
+)
+def test_part_file_name(url, output_name, expected):
+    assert _part_file_name(url, output_name) == expected
+
+
+@pytest.mark.parametrize("use_requests", [True, False])
+def test_download_to_file_resumes_partial_download(
+    qgis_new_project, http_server, tmp_path, use_requests
+):
+    content = os.urandom(1000)
+    http_server.add_file("/file.bin", content)
+    (tmp_path / "file.bin.part").write_bytes(content[:500])
+    (tmp_path / "file.bin.part.validator").write_text(
+        http_server.files["/file.bin"].etag
+    )
+
+    path_to_file = download_to_file(
+        http_server.url("/file.bin"), tmp_path, use_requests_if_available=use_requests
+    )
+
+    assert path_to_file.read_bytes() == content
+    assert http_server.requests_to("/file.bin")[0].headers["Range"] == "bytes=500-"
+
+
+def test_download_to_file_checksum_mismatch(qgis_new_project, http_server, tmp_path):
+    http_server.add_file("/file.bin", b"content")
+
+    with pytest.raises(QgsPluginNetworkException):
+        download_to_file(
+            http_server.url("/file.bin"), tmp_path, expected_checksum="invalid"
+        )
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_requests_session_is_shared(qgis_new_project):
+    session = requests_session()
+
+    assert requests_session() is session
+    assert "QGIS/" in session.headers["User-Agent"]
+
+    new_session = configure_requests_session(pool_maxsize=2)
+    assert requests_session() is new_session
+    assert new_session is not session
+
+
+def test_configure_requests_session_of_named_plugin(qgis_new_project):
+    session = requests_session()
+
+    other_session = configure_requests_session(plugin="other_plugin")
+
+    assert requests_session(plugin="other_plugin") is other_session
+    assert requests_session() is session
+
+
+def test_retry_policy_delay():
+    policy = RetryPolicy(max_attempts=3, backoff_factor=1, jitter=False)
+    timeout = QgsPluginNetworkException(error=QNetworkReply.TimeoutError)
+
+    assert policy.retry_delay("get", 1, timeout) == 1
+    assert policy.retry_delay("get", 2, timeout) == 2
+    assert policy.retry_delay("get", 3, timeout) is None
+    assert policy.retry_delay("post", 1, timeout) is None
+    assert (
+        policy.retry_delay("get", 1, QgsPluginNetworkException(status_code=404)) is None
+    )
+    assert (
+        policy.retry_delay(
+            "get",
+            1,
+            QgsPluginNetworkException(status_code=503, headers={"retry-after": "5"}),
+        )
+        == 5
+    )
+    assert (
+        policy.retry_delay(
+            "get",
+            1,
+            QgsPluginNetworkException(status_code=429, headers={"retry-after": "60"}),
+        )
+        is None
+    )
+
+
+@pytest.mark.parametrize("use_requests", [True, False])
+def test_download_to_file_retries_transient_errors(
+    qgis_new_project, http_server, tmp_path, use_requests
+):
+    http_server.add_file("/file.bin", b"content")
+    http_server.add_failure("/file.bin", 503, headers={"Retry-After": "0"})
+    policy = RetryPolicy(max_attempts=2)
+
+    path_to_file = download_to_file(
+        http_server.url("/file.bin"),
+        tmp_path,
+        use_requests_if_available=use_requests,
+        retry_policy=policy,
+    )
+
+    assert path_to_file.read_bytes() == b"content"
+    assert policy.metrics == RetryMetrics(attempts=2, retries=1, failures=0)
+
+
+def test_request_raw_gives_up_after_max_attempts(qgis_new_project, http_server):
+    http_server.add_file("/data.json", b"{}")
+    http_server.add_failure("/data.json", 502, count=2)
+    policy = RetryPolicy(max_attempts=2, backoff_factor=0)
+
+    with pytest.raises(QgsPluginNetworkException) as e:
+        request_raw(http_server.url("/data.json"), "get", retry_policy=policy)
+
+    assert e.value.status_code == 502
+    assert policy.metrics == RetryMetrics(attempts=2, retries=1, failures=1)
+
+
+@pytest.mark.parametrize("use_requests", [True, False])
+def test_fetch_json_stream(qgis_new_project, http_server, use_requests):
+    features = [{"type": "Feature", "id": i} for i in range(1000)]
+    http_server.add_file(
+        "/items.geojson",
+        json.dumps({"type": "FeatureCollection", "features": features}).encode(),
+        "application/geo+json",
+    )
+
+    items = fetch_json_stream(
+        http_server.url("/items.geojson"),
+        chunk_size=100,
+        use_requests_if_available=use_requests,
+    )
+
+    assert list(items) == features
+
+
+@pytest.mark.parametrize(
+    "content_encoding,compress",
+    [
+        ("gzip", lambda content: gzip.compress(content)),
+        ("deflate", lambda content: zlib.compress(content)),
+        ("deflate", lambda content: zlib.compress(content)[2:-4]),
+        ("identity", lambda content: content),
+        ("gzip, gzip", lambda content: gzip.compress(gzip.compress(content))),
+    ],
+)
+def test_content_decoder(content_encoding, compress):
+    content = json.dumps([{"id": i} for i in range(1000)]).encode()
+    compressed = compress(content)
+    decoder = _ContentDecoder(content_encoding)
+
+    decompressed = b"".join(
+        decoder.decompress(compressed[i : i + 100])
+        for i in range(0, len(compressed), 100)
+    )
+
+    assert decompressed + decoder.flush() == content
+
+
+def test_content_decoder_unsupported_encoding():
+    with pytest.raises(QgsPluginNetworkException):
+        _ContentDecoder("compress")
+
+
+def test_download_to_file_records_metrics(qgis_new_project, http_server, tmp_path):
+    http_server.add_file("/file.bin", b"content")
+    http_server.add_failure("/file.bin", 503)
+    metrics = enable_metrics()
+    try:
+        download_to_file(
+            http_server.url("/file.bin"),
+            tmp_path,
+            retry_policy=RetryPolicy(backoff_factor=0),
+        )
+    finally:
+        disable_metrics()
+
+    (record,) = metrics.records
+    assert record.status_code == 200
+    assert record.bytes_received == len(b"content")
+    assert record.retries == 1
+    assert record.error is None
+
+
+@pytest.mark.parametrize("use_requests", [True, False])
+def test_download_to_file_retries_dropped_connection(
+    qgis_new_project, http_server, tmp_path, use_requests
+):
+    http_server.add_file("/file.bin", b"content")
+    http_server.add_failure("/file.bin", DROP_CONNECTION)
+
+    path_to_file = download_to_file(
+        http_server.url("/file.bin"),
+        tmp_path,
+        use_requests_if_available=use_requests,
+        retry_policy=RetryPolicy(backoff_factor=0),
+    )
+
+    assert path_to_file.read_bytes() == b"content"
+
+
+@pytest.mark.parametrize("use_requests", [True, False])
+def test_fetch_json_stream_from_slow_chunked_response(qgis_new_project, use_requests):
+    features = [{"type": "Feature", "id": i} for i in range(100)]
+    with LocalHttpServer(
+        chunked=True, chunk_size=64, throughput=100_000, latency=0.05
+    ) as server:
+        server.add_file(
+            "/items.geojson",
+            json.dumps({"features": features}).encode(),
+            "application/geo+json",
+        )
+
+        items = fetch_json_stream(
+            server.url("/items.geojson"), use_requests_if_available=use_requests
+        )
+
+        assert list(items) == features
+
+
+def test_chunked_server_sends_no_body_when_not_modified():
+    with LocalHttpServer(chunked=True) as server:
+        server.add_file("/file.bin", b"content")
+        etag = server.files["/file.bin"].etag
+        url = urlsplit(server.url())
+        with socket.create_connection((url.hostname, url.port), timeout=5) as sock:
+            sock.sendall(
+                b"GET /file.bin HTTP/1.1\r\nHost: localhost\r\n"
+                b"If-None-Match: " + etag.encode() + b"\r\n"
+                b"Connection: close\r\n\r\n"
+            )
+            response = b"".join(iter(lambda: sock.recv(4096), b""))
+
+    head, body = response.split(b"\r\n\r\n", 1)
+    assert head.startswith(b"HTTP/1.1 304")
+    assert b"Transfer-Encoding" not in head
+    assert body == b""
+
+
+def test_fetch_paged_follows_next_links(qgis_new_project, http_server):
+    http_server.add_file(
+        "/items",
+        json.dumps(
+            {
+                "features": [1, 2],
+                "links": [
+                    {"rel": "self", "href": "/items"},
+                    {"rel": "next", "href": "/items/2"},
+                ],
+            }
+        ).encode(),
+    )
+    http_server.add_file(
+        "/items/2", json.dumps({"features": [3], "next": "/items/3"}).encode()
+    )
+    http_server.add_file(
+        "/items/3",
+        json.dumps({"features": [4]}).encode(),
+        headers={"Link": '</items/3>; rel="self", </items/4>; rel="next"'},
+    )
+    http_server.add_file("/items/4", json.dumps({"features": []}).encode())
+
+    assert list(fetch_paged(http_server.url("/items"))) == [1, 2, 3, 4]
+
+
+def test_fetch_paged_sends_user_agent_of_calling_plugin(qgis_new_project, http_server):
+    http_server.add_file("/items", json.dumps({"features": [1]}).encode())
+
+    assert list(fetch_paged(http_server.url("/items"))) == [1]
+
+    (request,) = http_server.requests_to("/items")
+    assert request.headers["User-Agent"] == network._user_agent()
+
+
+def test_fetch_paged_with_offset(qgis_new_project, http_server):
+    http_server.add_file("/items", json.dumps([1, 2]).encode())
+
+    records = fetch_paged(
+        http_server.url("/items"),
+        path="",
+        offset_param="offset",
+        page_size=2,
+        max_pages=3,
+    )
+
+    assert list(records) == [1, 2, 1, 2, 1, 2]
+    assert len(http_server.requests_to("/items")) == 3
+
+
+def test_fetch_paged_stops_at_short_page(qgis_new_project, http_server):
+    http_server.add_file("/items", json.dumps({"features": [1, 2]}).encode())
+
+    records = fetch_paged(http_server.url("/items"), offset_param="offset", page_size=3)
+
+    assert list(records) == [1, 2]
+    assert len(http_server.requests_to("/items")) == 1
+
+
+def test_single_flight_shares_result_between_threads():
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def request():
+        calls.append(threading.get_ident())
+        started.set()
+        release.wait(5)
+        return b"content", "file.txt"
+
+    key = ("get", "https://example.com", "", "", "utf-8")
+    with ThreadPoolExecutor(3) as executor:
+        leader = executor.submit(_single_flight, key, request)
+        started.wait(5)
+        followers = [executor.submit(_single_flight, key, request) for _ in range(2)]
+        time.sleep(0.1)
+        release.set()
+        results = [future.result() for future in [leader, *followers]]
+
+    assert len(calls) == 1
+    assert results == [(b"content", "file.txt")] * 3
+
+
+def test_single_flight_shares_exception():
+    started = threading.Event()
+    release = threading.Event()
+
+    def request():
+        started.set()
+        release.wait(5)
+        raise QgsPluginNetworkException("Request failed")
+
+    key = ("get", "https://example.com", "", "", "utf-8")
+    with ThreadPoolExecutor(2) as executor:
+        leader = executor.submit(_single_flight, key, request)
+        started.wait(5)
+        follower = executor.submit(_single_flight, key, request)
+        time.sleep(0.1)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(QgsPluginNetworkException):
+                future.result()
+
+
+def test_fetch_raw_many_completes_on_unexpected_error(
+    qgis_new_project, http_server, monkeypatch
+):
+    http_server.add_file("/file.txt", b"content")
+
+    def fail(*args: object) -> None:
+        raise ValueError("failure")
+
+    monkeypatch.setattr(network, "_default_file_name", fail)
+
+    with pytest.raises(ValueError, match="failure"):
+        fetch_raw_many([http_server.url("/file.txt")])
+
+
+def test_concurrent_identical_fetches_share_request(qgis_new_project):
+    with LocalHttpServer(latency=0.3) as server:
+        server.add_file("/data.json", b"{}")
+        with ThreadPoolExecutor(3) as executor:
+            results = list(
+                executor.map(lambda _: fetch(server.url("/data.json")), range(3))
+            )
+
+        assert results == ["{}"] * 3
+        assert len(server.requests_to("/data.json")) == 1
+
+
+def test_async_and_blocking_fetches_share_request(qgis_new_project):
+    with LocalHttpServer(latency=0.3) as server:
+        server.add_file("/data.json", b"{}")
+        future = fetch_raw_async(server.url("/data.json"))
+        with ThreadPoolExecutor(1) as executor:
+            blocking = executor.submit(fetch, server.url("/data.json"))
+            content, _ = _future_result(future)
+            assert blocking.result(5) == "{}"
+
+        assert content == b"{}"
+        assert len(server.requests_to("/data.json")) == 1
+
+
+def test_request_key_depends_on_retrying_policy():
+    def key(retry_policy):
+        return _request_key(
+            "get", "https://example.com", None, "", "utf-8", retry_policy
+        )
+
+    policy = RetryPolicy()
+    assert key(None) == key(RetryPolicy(max_attempts=1))
+    assert key(policy) == key(policy)
+    assert key(policy) != key(RetryPolicy())
+    assert key(policy) != key(None)
@@ -0,0 +1,85 @@
+"""
+Benchmarks of the network tools against a local server.
+
+Run with QGIS_PLUGIN_TOOLS_BENCHMARK=1 pytest -s test/test_network_benchmark.py
+"""
+
+import os
+
+import pytest
+
+from ..testing.benchmark import MB, measure
+from ..testing.http_server import LocalHttpServer
+from ..testing.utilities import is_benchmarking
+from ..tools.network import (
+    DOWNLOAD_CHUNK_SIZE,
+    FileField,
+    FileInfo,
+    download_to_file,
+    fetch_raw,
+    post,
+)
+
+pytestmark = pytest.mark.skipif(
+    not is_benchmarking(), reason="Set QGIS_PLUGIN_TOOLS_BENCHMARK=1 to benchmark"
+)
+
+PAYLOAD_SIZES = [1 * MB, 16 * MB, 64 * MB]
+
+
+@pytest.fixture(scope="module")
+def benchmark_server():
+    with LocalHttpServer(chunk_size=DOWNLOAD_CHUNK_SIZE) as server:
+        for size in PAYLOAD_SIZES:
+            server.add_file(f"/{size}.bin", os.urandom(size))
+        yield server
+
+
+@pytest.mark.parametrize("size", PAYLOAD_SIZES)
+def test_benchmark_fetch(qgis_new_project, benchmark_server, size):
+    result = measure(
+        "fetch_raw", size, lambda: fetch_raw(benchmark_server.url(f"/{size}.bin"))
+    )
+
+    print(result)
+    # the content is returned as bytes, but should not be copied many times
+    assert result.peak_memory < 4 * size + 4 * MB
+
+
+@pytest.mark.parametrize("size", PAYLOAD_SIZES)
+def test_benchmark_post_multipart(qgis_new_project, benchmark_server, tmp_path, size):
+    upload = tmp_path / "upload.bin"
+    upload.write_bytes(os.urandom(size))
+    files = [FileField("file", FileInfo("upload.bin", upload, "application/zip"))]
+
+    result = measure(
+        "post multipart",
+        size,
+        lambda: post(benchmark_server.url("/upload"), files=files),
+    )
+
+    print(result)
+    # the file is streamed from the disk
+    assert result.peak_memory < size / 2 + 4 * MB
+
+
+@pytest.mark.parametrize("use_requests", [True, False])
+@pytest.mark.parametrize("size", PAYLOAD_SIZES)
+def test_benchmark_download_to_file(
+    qgis_new_project, benchmark_server, tmp_path, size, use_requests
+):
+    def download() -> None:
+        path = download_to_file(
+            benchmark_server.url(f"/{size}.bin"),
+            tmp_path,
+            use_requests_if_available=use_requests,
+        )
+        path.unlink()
+
+    result = measure(
+        f"download_to_file{' with requests' if use_requests else ''}", size, download
+    )
+
+    print(result)
+    # only a few chunks are kept in memory at a time
+    assert result.peak_memory < 4 * DOWNLOAD_CHUNK_SIZE + 4 * MB
@@ -0,0 +1,118 @@
+__copyright__ = "Copyright 2020-2021, Gispo Ltd"
+__license__ = "GPL version 3"
+__email__ = "info@gispo.fi"
+__revision__ = "$Format:%H$"
+
+import time
+
+import pytest
+
+from ..tools.exceptions import QgsPluginNetworkException
+from ..tools.network import fetch
+from ..tools.network_cache import CacheEntry, ResponseCache, _cache_control
+
+
+@pytest.fixture()
+def cache(tmp_path):
+    return ResponseCache(tmp_path, max_size=10, ttl=60)
+
+
+def _cache_response(cache, url, content, stored_at=None, etag='"1"') -> None:
+    entry = CacheEntry(url, "", stored_at or time.time(), cache.ttl, etag=etag)
+    cache._store(cache._key(url, "", None), entry, content)
+
+
+def test_fresh_response_is_used_without_request(qgis_new_project, cache):
+    _cache_response(cache, "invalidurl", b"cached")
+
+    assert fetch("invalidurl", cache=cache) == "cached"
+
+
+def test_stale_response_is_revalidated(qgis_new_project, cache, http_server):
+    http_server.add_file("/data.json", b"changed")
+    url = http_server.url("/data.json")
+    etag = http_server.files["/data.json"].etag
+    _cache_response(cache, url, b"cached", stored_at=time.time() - 120, etag=etag)
+
+    # the server responds 304 Not Modified to the matching validator
+    assert fetch(url, cache=cache) == "cached"
+
+    (request,) = http_server.requests_to("/data.json")
+    assert request.headers["If-None-Match"] == etag
+    entry, content = cache._read(cache._key(url, "", None))
+    assert entry.is_fresh()
+    assert content == b"cached"
+
+
+def test_changed_response_replaces_stale_entry(qgis_new_project, cache, http_server):
+    http_server.add_file("/data.json", b"changed")
+    url = http_server.url("/data.json")
+    _cache_response(cache, url, b"cached", stored_at=time.time() - 120)
+
+    assert fetch(url, cache=cache) == "changed"
+    assert cache._read(cache._key(url, "", None))[1] == b"changed"
+
+
+def test_no_cache_response_is_revalidated_before_use(
+    qgis_new_project, cache, http_server
+):
+    http_server.add_file(
+        "/data.json", b"content", headers={"Cache-Control": "private, no-cache"}
+    )
+    url = http_server.url("/data.json")
+
+    assert fetch(url, cache=cache) == "content"
+    assert fetch(url, cache=cache) == "content"
+
+    first, second = http_server.requests_to("/data.json")
+    assert "If-None-Match" not in first.headers
+    assert second.headers["If-None-Match"] == http_server.files["/data.json"].etag
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        (None, {}),
+        ("no-cache", {"no-cache": ""}),
+        (
+            'Private, max-age=60, no-cache="Set-Cookie"',
+            {
+                "private": "",
+                "max-age": "60",
+                "no-cache": "Set-Cookie",
+            },
+        ),
+        ("s-maxage=10,max-age=0", {"s-maxage": "10", "max-age": "0"}),
+    ],
+)
+def test_cache_control(value, expected):
+    assert _cache_control(value) == expected
+
+
+def test_stale_response_revalidation_failure(qgis_new_project, cache):
+    _cache_response(cache, "invalidurl", b"cached", stored_at=time.time() - 120)
+
+    with pytest.raises(QgsPluginNetworkException):
+        fetch("invalidurl", cache=cache)
+
+
+def test_least_recently_used_responses_are_evicted(qgis_new_project, cache):
+    _cache_response(cache, "first", b"12345")
+    time.sleep(0.01)
+    _cache_response(cache, "second", b"12345")
+    time.sleep(0.01)
+    assert cache.fetch_raw("first") == (b"12345", "")
+    time.sleep(0.01)
+    _cache_response(cache, "third", b"12345")
+
+    assert cache.size() == 10
+    assert cache._read(cache._key("second", "", None)) is None
+    assert cache._read(cache._key("first", "", None)) is not None
+
+
+def test_clear(qgis_new_project, cache):
+    _cache_response(cache, "first", b"12345")
+
+    cache.clear()
+
+    assert cache.size() == 0
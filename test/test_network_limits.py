@@ -0,0 +1,187 @@
+import threading
+import time
+from email.utils import formatdate
+
+import pytest
+
+from ..tools import network_limits
+from ..tools.exceptions import QgsPluginNetworkException
+from ..tools.network_limits import (
+    HostLimiter,
+    TokenBucket,
+    host_limiter,
+    reset_host_limits,
+)
+
+
+@pytest.fixture()
+def limit_settings(mocker):
+    settings = {}
+    mocker.patch.object(
+        network_limits,
+        "get_setting",
+        side_effect=lambda key, default=None, internal=True: settings.get(key, default),
+    )
+    mocker.patch.object(network_limits, "plugin_name", return_value="plugin")
+    reset_host_limits()
+    yield settings
+    reset_host_limits()
+
+
+def test_token_bucket_allows_burst_then_rate():
+    bucket = TokenBucket(rate=10, capacity=2)
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+    assert not bucket.try_take()
+
+
+def test_token_bucket_refills():
+    bucket = TokenBucket(rate=100, capacity=1)
+    assert bucket.try_take()
+    assert not bucket.try_take()
+    time.sleep(0.02)
+    assert bucket.try_take()
+
+
+def test_host_limiter_limits_rate():
+    limiter = HostLimiter("example.com", rate_limit=20, burst=1)
+
+    started_at = time.monotonic()
+    for _ in range(3):
+        with limiter.limit():
+            pass
+
+    assert time.monotonic() - started_at >= 0.09
+
+
+def test_host_limiter_limits_connections():
+    limiter = HostLimiter("example.com", max_connections=2)
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def request():
+        nonlocal active, max_active
+        with limiter.limit():
+            with lock:
+                active += 1
+                max_active = max(max_active, active)
+            time.sleep(0.02)
+            with lock:
+                active -= 1
+
+    threads = [threading.Thread(target=request) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max_active == 2
+
+
+def test_host_limiter_try_acquire():
+    limiter = HostLimiter("example.com", max_connections=1)
+
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+    limiter.release()
+    assert limiter.try_acquire()
+
+
+def test_host_limiter_pauses_when_throttled():
+    limiter = HostLimiter("example.com")
+
+    with pytest.raises(QgsPluginNetworkException):
+        with limiter.limit():
+            raise QgsPluginNetworkException(
+                "Too many requests", status_code=429, headers={"retry-after": "0.1"}
+            )
+
+    assert not limiter.try_acquire()
+    started_at = time.monotonic()
+    with limiter.limit():
+        pass
+    assert time.monotonic() - started_at >= 0.05
+
+
+def test_host_limiter_throttled_with_http_date():
+    limiter = HostLimiter("example.com")
+
+    limiter.throttled(formatdate(time.time() + 30, usegmt=True))
+
+    assert limiter._pause_remaining() > 25
+
+
+@pytest.mark.parametrize("value", [None, "", "invalid"])
+def test_parse_retry_after_invalid(value):
+    assert network_limits._parse_retry_after(value) is None
+
+
+def test_host_limiter_reads_settings(limit_settings):
+    limit_settings[f"/plugin/{network_limits.RATE_LIMIT_KEY}"] = 5
+    limit_settings[f"/plugin/{network_limits.MAX_CONNECTIONS_KEY}"] = 4
+    limit_settings[
+        "/plugin/network/hosts/slow.example.com/max_connections_per_host"
+    ] = 1
+
+    limiter = host_limiter("https://example.com/a")
+    slow_limiter = host_limiter("https://slow.example.com/b")
+
+    assert limiter is host_limiter("https://example.com/c?d=1")
+    assert limiter.rate_limit == 5
+    assert limiter.max_connections == 4
+    assert slow_limiter.rate_limit == 5
+    assert slow_limiter.max_connections == 1
+
+
+def test_host_limiter_is_unlimited_by_default(limit_settings):
+    limiter = host_limiter("https://example.com/a")
+
+    assert limiter.rate_limit == 0
+    assert limiter.max_connections == 0
+    assert all(limiter.try_acquire() for _ in range(100))
+
+
+def test_host_limiters_are_separate_per_plugin(limit_settings):
+    limit_settings[f"/other_plugin/{network_limits.MAX_CONNECTIONS_KEY}"] = 1
+
+    limiter = host_limiter("https://example.com/a")
+    other_limiter = host_limiter("https://example.com/a", "other_plugin")
+
+    assert limiter is not other_limiter
+    assert limiter is host_limiter("https://example.com/a", "plugin")
+    assert limiter.max_connections == 0
+    assert other_limiter.max_connections == 1
+
+
+@pytest.fixture()
+def main_thread(mocker):
+    mocker.patch.object(network_limits, "_is_main_thread", return_value=True)
+    mocker.patch.object(network_limits, "QCoreApplication")
+    mocker.patch.object(network_limits, "MAIN_THREAD_ACQUIRE_TIMEOUT", 0.2)
+
+
+def test_host_limiter_nested_limit_on_main_thread(main_thread):
+    limiter = HostLimiter("example.com", max_connections=1)
+
+    started_at = time.monotonic()
+    with limiter.limit():
+        with limiter.limit():
+            pass
+    assert time.monotonic() - started_at < 0.1
+    assert limiter.try_acquire()
+
+
+def test_host_limiter_main_thread_acquire_times_out(main_thread):
+    limiter = HostLimiter("example.com", max_connections=1)
+    # held by an asynchronous request, which would release it on the main thread
+    assert limiter.try_acquire()
+
+    started_at = time.monotonic()
+    assert not limiter.acquire()
+    assert time.monotonic() - started_at >= 0.2
+    limiter.release()
+    assert limiter.acquire()
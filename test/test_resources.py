@@ -0,0 +1,117 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+from ..tools import resources
+
+PLUGIN_INIT = """
+def classFactory(iface):
+    pass
+
+
+def plugin_directory():
+    return _plugin_path_dependency()
+
+
+def plugin_metadata():
+    return _plugin_metadata()
+
+
+def metadata_config():
+    return _metadata_config()
+"""
+
+
+@pytest.fixture()
+def fake_plugin(tmp_path, monkeypatch):
+    plugin_dir = tmp_path / "fake_plugin"
+    plugin_dir.mkdir()
+    (plugin_dir / "metadata.txt").write_text("[general]\nname=Fake plugin\n")
+    (plugin_dir / "__init__.py").write_text(PLUGIN_INIT)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = importlib.import_module("fake_plugin")
+    module._plugin_path_dependency = resources._plugin_path_dependency
+    yield module
+    sys.modules.pop("fake_plugin", None)
+    resources._PLUGIN_DIRECTORIES.pop("fake_plugin", None)
+
+
+def test_plugin_path_of_calling_plugin_is_cached(fake_plugin, tmp_path, monkeypatch):
+    checked_modules = []
+    is_module_qgis_plugin = resources._is_module_qgis_plugin
+
+    def check(module_name):
+        checked_modules.append(module_name)
+        return is_module_qgis_plugin(module_name)
+
+    monkeypatch.setattr(resources, "_is_module_qgis_plugin", check)
+
+    assert fake_plugin.plugin_directory() == str(tmp_path / "fake_plugin")
+    assert checked_modules == ["fake_plugin"]
+    assert fake_plugin.plugin_directory() == str(tmp_path / "fake_plugin")
+    assert checked_modules == ["fake_plugin"]
+
+
+def test_plugin_path_is_not_cached_before_plugin_is_imported(fake_plugin, tmp_path):
+    class_factory = fake_plugin.classFactory
+    del fake_plugin.classFactory
+
+    assert fake_plugin.plugin_directory() != str(tmp_path / "fake_plugin")
+    assert "fake_plugin" not in resources._PLUGIN_DIRECTORIES
+
+    fake_plugin.classFactory = class_factory
+    assert fake_plugin.plugin_directory() == str(tmp_path / "fake_plugin")
+
+
+@pytest.fixture()
+def plugin_metadata(fake_plugin, monkeypatch):
+    monkeypatch.setattr(resources, "METADATA_CHECK_INTERVAL", 0)
+    fake_plugin._plugin_metadata = resources.plugin_metadata
+    yield fake_plugin.plugin_metadata
+    resources._METADATA.clear()
+
+
+def test_plugin_metadata_is_cached(plugin_metadata, mocker):
+    read_metadata = mocker.spy(resources, "_read_metadata")
+
+    metadata = plugin_metadata()
+
+    assert metadata.get("name") == "Fake plugin"
+    assert plugin_metadata() is metadata
+    assert read_metadata.call_count == 1
+
+
+def test_plugin_metadata_is_read_again_when_changed(plugin_metadata, tmp_path):
+    metadata_path = tmp_path / "fake_plugin" / "metadata.txt"
+    metadata = plugin_metadata()
+
+    metadata_path.write_text("[general]\nname=Renamed plugin\nversion=1.0\n")
+    os.utime(metadata_path, ns=(metadata.mtime + 10**9, metadata.mtime + 10**9))
+
+    assert plugin_metadata().get("name") == "Renamed plugin"
+    assert plugin_metadata().get("version") == "1.0"
+
+
+def test_plugin_metadata_is_immutable(plugin_metadata):
+    metadata = plugin_metadata()
+
+    with pytest.raises(TypeError):
+        metadata.sections["general"]["name"] = "Changed"  # type: ignore
+
+
+def test_metadata_with_percent_sign(plugin_metadata, fake_plugin, tmp_path):
+    fake_plugin._metadata_config = resources.metadata_config
+    metadata_path = tmp_path / "fake_plugin" / "metadata.txt"
+    metadata = plugin_metadata()
+    metadata_path.write_text(
+        "[general]\nname=Fake plugin\nabout=100% free\ndescription=%(name)s\n"
+    )
+    os.utime(metadata_path, ns=(metadata.mtime + 10**9, metadata.mtime + 10**9))
+
+    assert plugin_metadata().get("about") == "100% free"
+    assert plugin_metadata().get("description") == "%(name)s"
+    # the config parser keeps interpolating the values
+    config = fake_plugin.metadata_config()
+    assert config.get("general", "description") == "Fake plugin"
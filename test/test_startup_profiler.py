@@ -0,0 +1,68 @@
+import importlib
+import re
+import sys
+
+import pytest
+
+from ..infrastructure.startup_profiler import profile_startup
+from ..tools import resources
+
+PLUGIN_INIT = """
+from {tools}.resources import plugin_name, resources_path
+
+
+def classFactory(iface):
+    return Plugin(iface)
+
+
+class Plugin:
+    def __init__(self, iface):
+        self.iface = iface
+        self.name = plugin_name()
+
+    def initGui(self):
+        self.icon = resources_path("icons", "icon.png")
+
+    def unload(self):
+        pass
+"""
+
+
+@pytest.fixture()
+def startup_plugin(tmp_path, monkeypatch):
+    plugin_dir = tmp_path / "startup_plugin"
+    plugin_dir.mkdir()
+    (plugin_dir / "metadata.txt").write_text("[general]\nname=Startup plugin\n")
+    (plugin_dir / "__init__.py").write_text(
+        PLUGIN_INIT.format(tools=resources.__name__.rsplit(".", 1)[0])
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    importlib.invalidate_caches()
+    yield "startup_plugin"
+    sys.modules.pop("startup_plugin", None)
+    resources._PLUGIN_DIRECTORIES.pop("startup_plugin", None)
+
+
+def test_profile_startup(qgis_iface, startup_plugin):
+    plugin_name = resources.plugin_name
+
+    report = profile_startup(startup_plugin)
+
+    assert list(report.phases) == ["import", "classFactory", "initGui", "unload"]
+    assert report.imported_modules >= 1
+    assert report.calls["resources"]["resources_path"].calls == 1
+    assert report.calls["resources"]["plugin_name"].calls == 1
+    assert "Startup of startup_plugin" in str(report)
+    assert resources.plugin_name is plugin_name
+
+
+def test_profile_startup_writes_folded_stacks(qgis_iface, startup_plugin, tmp_path):
+    flamegraph_path = tmp_path / "startup.folded"
+
+    profile_startup(startup_plugin, flamegraph_path)
+
+    lines = flamegraph_path.read_text(encoding="utf-8").splitlines()
+    assert lines
+    assert all(re.fullmatch(r".+ \d+", line) for line in lines)
+    assert any("initGui" in line for line in lines)
+    assert sys.getprofile() is None
@@ -0,0 +1,66 @@
+import os
+import shutil
+
+import pytest
+from qgis.PyQt.QtWidgets import QDialog
+
+from ..tools import ui_cache
+from ..tools.resources import qgis_plugin_tools_resources
+from ..tools.ui_cache import (
+    clear_ui_cache,
+    disable_ui_disk_cache,
+    enable_ui_disk_cache,
+    load_ui_type,
+)
+
+
+@pytest.fixture()
+def ui_file(tmp_path):
+    path = tmp_path / "dialog.ui"
+    shutil.copy(qgis_plugin_tools_resources("ui", "progress_dialog.ui"), path)
+    clear_ui_cache()
+    yield path
+    clear_ui_cache()
+    disable_ui_disk_cache()
+
+
+def test_load_ui_type(ui_file):
+    ui_class, base_class = load_ui_type(ui_file)
+
+    assert ui_class.__name__ == "Ui_Dialog"
+    assert hasattr(ui_class, "setupUi")
+    assert base_class is QDialog
+
+
+def test_load_ui_type_is_cached(ui_file, mocker):
+    generate_code = mocker.spy(ui_cache, "_generate_code")
+
+    classes = load_ui_type(ui_file)
+
+    assert load_ui_type(str(ui_file)) == classes
+    assert generate_code.call_count == 1
+
+
+def test_load_ui_type_compiles_modified_file(ui_file, mocker):
+    generate_code = mocker.spy(ui_cache, "_generate_code")
+    ui_class, _ = load_ui_type(ui_file)
+
+    mtime = os.stat(ui_file).st_mtime_ns + 10**9
+    os.utime(ui_file, ns=(mtime, mtime))
+
+    assert load_ui_type(ui_file)[0] is not ui_class
+    assert generate_code.call_count == 2
+
+
+def test_load_ui_type_from_disk_cache(ui_file, tmp_path, mocker):
+    enable_ui_disk_cache(tmp_path / "cache")
+    load_ui_type(ui_file)
+    clear_ui_cache()
+    generate_code = mocker.spy(ui_cache, "_generate_code")
+
+    ui_class, base_class = load_ui_type(ui_file)
+
+    assert ui_class.__name__ == "Ui_Dialog"
+    assert base_class is QDialog
+    assert generate_code.call_count == 0
+    assert len(list((tmp_path / "cache").glob("ui_*.py"))) == 1
@@ -0,0 +1,114 @@
+"""Helpers for measuring the speed and memory use of the tools."""
+
+import os
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, List, NamedTuple
+
+__copyright__ = "Copyright 2020-2021, Gispo Ltd"
+__license__ = "GPL version 3"
+__email__ = "info@gispo.fi"
+__revision__ = "$Format:%H$"
+
+MB = 1024 * 1024
+# Line of python -X importtime output: self [us] | cumulative [us] | module
+_IMPORT_TIME_PATTERN = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| *(\S+)")
+
+
+class BenchmarkResult(NamedTuple):
+    name: str
+    payload_size: int
+    # Fastest run in seconds
+    seconds: float
+    # Peak of the memory allocated by Python during the run in bytes
+    peak_memory: int
+
+    @property
+    def throughput(self) -> float:
+        """Bytes per second"""
+        return self.payload_size / self.seconds if self.seconds else float("inf")
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name}: {self.payload_size / MB:.1f} MB in {self.seconds:.3f} s "
+            f"({self.throughput / MB:.1f} MB/s), "
+            f"peak memory {self.peak_memory / MB:.1f} MB"
+        )
+
+
+def measure(
+    name: str, payload_size: int, function: Callable[[], object], repeat: int = 3
+) -> BenchmarkResult:
+    """
+    Measure the fastest of the runs of the function and the peak memory
+    allocated during a separate run. Memory is traced in its own run, since
+    tracing slows down the execution.
+
+    Memory allocated outside of Python, such as by Qt, is not included.
+    :param name: Name of the benchmark
+    :param payload_size: Size of the data processed in a run in bytes
+    :param function: Function to measure
+    :param repeat: Number of the timed runs
+    """
+    seconds = float("inf")
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        function()
+        seconds = min(seconds, time.perf_counter() - started_at)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return BenchmarkResult(name, payload_size, seconds, peak_memory)
+
+
+class ImportTime(NamedTuple):
+    module: str
+    # Seconds spent importing the module itself
+    self_time: float
+    # Seconds including the modules imported by the module
+    cumulative_time: float
+
+    def __str__(self) -> str:
+        return (
+            f"{self.module}: {self.cumulative_time * 1000:.1f} ms "
+            f"(self {self.self_time * 1000:.1f} ms)"
+        )
+
+
+def measure_imports(*modules: str) -> List[ImportTime]:
+    """
+    Import the modules in a new interpreter with python -X importtime and
+    return the import times of all the modules imported.
+
+    A module already imported by the previous modules is not imported again,
+    so list the modules expected to be loaded anyway, such as qgis.core, first
+    to measure only the cost of the last ones.
+    :param modules: Names of the modules to import in order
+    :return: import times in the order the imports finished
+    """
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, sys.path))}
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "\n".join(f"import {module}" for module in modules),
+        ],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return [
+        ImportTime(match.group(3), int(match.group(1)) / 1e6, int(match.group(2)) / 1e6)
+        for match in map(_IMPORT_TIME_PATTERN.match, result.stderr.splitlines())
+        if match is not None
+    ]
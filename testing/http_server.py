@@ -0,0 +1,366 @@
+"""Local HTTP server for testing network tools without internet access."""
+
+import base64
+import gzip
+import hashlib
+import json
+import re
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+from urllib.parse import parse_qsl, urlsplit
+
+__copyright__ = "Copyright 2020-2021, Gispo Ltd"
+__license__ = "GPL version 3"
+__email__ = "info@gispo.fi"
+__revision__ = "$Format:%H$"
+
+_RANGE_PATTERN = re.compile(r"bytes=(\d+)-(\d*)$")
+# Size of the chunks written to and read from the socket
+DEFAULT_CHUNK_SIZE = 64 * 1024
+# Status of a failure that closes the connection without a response
+DROP_CONNECTION = 0
+
+
+class ServedFile(NamedTuple):
+    content: bytes
+    content_type: str
+    headers: Dict[str, str]
+    etag: str
+
+
+class RecordedRequest(NamedTuple):
+    method: str
+    path: str
+    headers: Dict[str, str]
+
+
+class LocalHttpServer:
+    """
+    In-process HTTP server serving registered files. Supports HEAD requests,
+    conditional requests with If-None-Match and single byte range requests with
+    If-Range validation.
+
+    Echo paths respond with the details of the request as JSON in the same
+    format as httpbin.org. Request bodies sent to other paths are read and
+    discarded. Latency, throughput and chunked transfer of the responses can be
+    configured to simulate slow networks, and failures can be injected to the
+    next requests of a path.
+
+    >>> with LocalHttpServer(latency=0.1) as server:
+    >>>     server.add_file("/file.bin", b"content")
+    >>>     download_to_file(server.url("/file.bin"), output_dir)
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        throughput: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        chunked: bool = False,
+    ) -> None:
+        """
+        :param host: Host to listen to
+        :param port: Port to listen to, defaults to a free port
+        :param latency: Delay in seconds before each response
+        :param throughput: Maximum speed of sending the response body in bytes
+            per second, defaults to unlimited
+        :param chunk_size: Size of the chunks the response body is written in
+        :param chunked: Whether to send the response bodies with chunked
+            transfer encoding instead of Content-Length
+        """
+        self.files: Dict[str, ServedFile] = {}
+        self.echo_paths: Set[str] = set()
+        self.requests: List[RecordedRequest] = []
+        self.failures: Dict[str, List[Tuple[int, Dict[str, str]]]] = {}
+        self.latency = latency
+        self.throughput = throughput
+        self.chunk_size = chunk_size
+        self.chunked = chunked
+        self._server = ThreadingHTTPServer((host, port), _RequestHandler)
+        self._server.daemon_threads = True
+        self._server.local_server = self  # type: ignore
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "LocalHttpServer":
+        self.start()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def url(self, path: str = "/") -> str:
+        host, port = self._server.server_address[:2]
+        if isinstance(host, bytes):
+            host = host.decode("ascii")
+        return f"http://{host}:{port}{path}"
+
+    def add_file(
+        self,
+        path: str,
+        content: bytes,
+        content_type: str = "application/octet-stream",
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """
+        Serve the content in the path.
+        :param path: Path of the url, starting with /
+        :param content: Body of the response
+        :param content_type: Content-Type of the response
+        :param headers: Extra headers of the response
+        """
+        self.files[path] = ServedFile(
+            content,
+            content_type,
+            headers or {},
+            f'"{hashlib.sha1(content).hexdigest()}"',
+        )
+
+    def add_echo(self, path: str) -> None:
+        """
+        Respond to the requests to the path with the url, query parameters,
+        headers and body of the request as JSON, like httpbin.org does.
+        :param path: Path of the url, starting with /
+        """
+        self.echo_paths.add(path)
+
+    def add_failure(
+        self,
+        path: str,
+        status: int,
+        count: int = 1,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """
+        Respond to the next requests to the path with an error.
+        :param path: Path of the url, starting with /
+        :param status: HTTP status code of the error response or DROP_CONNECTION
+            to close the connection without a response
+        :param count: Number of the requests failing
+        :param headers: Extra headers of the error response
+        """
+        self.failures.setdefault(path, []).extend([(status, headers or {})] * count)
+
+    def requests_to(self, path: str) -> List[RecordedRequest]:
+        return [request for request in self.requests if request.path == path]
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def local_server(self) -> LocalHttpServer:
+        return self.server.local_server  # type: ignore
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+    def do_GET(self) -> None:  # noqa: N802
+        self._serve()
+
+    def do_HEAD(self) -> None:  # noqa: N802
+        self._serve()
+
+    def do_POST(self) -> None:  # noqa: N802
+        self._serve()
+
+    def do_PUT(self) -> None:  # noqa: N802
+        self._serve()
+
+    def do_PATCH(self) -> None:  # noqa: N802
+        self._serve()
+
+    def do_DELETE(self) -> None:  # noqa: N802
+        self._serve()
+
+    def _serve(self) -> None:
+        path = urlsplit(self.path).path
+        self.local_server.requests.append(
+            RecordedRequest(self.command, path, dict(self.headers.items()))
+        )
+        if self.local_server.latency:
+            time.sleep(self.local_server.latency)
+
+        failures = self.local_server.failures.get(path)
+        if failures:
+            status, failure_headers = failures.pop(0)
+            self._discard_body()
+            if status == DROP_CONNECTION:
+                self.close_connection = True
+                return
+            self._respond(
+                status, b"Error", {"Content-Type": "text/plain", **failure_headers}
+            )
+            return
+
+        if path in self.local_server.echo_paths:
+            body = json.dumps(self._echo(self._read_body())).encode()
+            self._respond(200, body, {"Content-Type": "application/json"})
+            return
+
+        if self.command not in ("GET", "HEAD"):
+            body = json.dumps({"received": self._discard_body()}).encode()
+            self._respond(200, body, {"Content-Type": "application/json"})
+            return
+
+        served_file = self.local_server.files.get(path)
+        if served_file is None:
+            self._respond(404, b"Not found", {"Content-Type": "text/plain"})
+            return
+
+        headers = {
+            "Content-Type": served_file.content_type,
+            "Accept-Ranges": "bytes",
+            "ETag": served_file.etag,
+            **served_file.headers,
+        }
+        if self.headers.get("If-None-Match") == served_file.etag:
+            self._respond(304, b"", {"ETag": served_file.etag})
+            return
+        byte_range = self._requested_range(served_file)
+        # memoryview avoids copying large contents
+        content = memoryview(served_file.content)
+        if byte_range is None:
+            self._respond(200, content, headers)
+            return
+
+        start, end = byte_range
+        size = len(served_file.content)
+        if start >= size:
+            self._respond(416, b"", {"Content-Range": f"bytes */{size}"})
+            return
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        self._respond(206, content[start : end + 1], headers)
+
+    def _requested_range(self, served_file: ServedFile) -> Optional[Tuple[int, int]]:
+        match = _RANGE_PATTERN.match(self.headers.get("Range", ""))
+        if match is None:
+            return None
+        if self.headers.get("If-Range", served_file.etag) != served_file.etag:
+            return None
+        start = int(match.group(1))
+        last = len(served_file.content) - 1
+        end = min(int(match.group(2)), last) if match.group(2) else last
+        return start, end
+
+    def _body_chunks(self) -> Iterator[bytes]:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return
+                yield self.rfile.read(size)
+                self.rfile.readline()
+        length = int(self.headers.get("Content-Length", 0))
+        while length > 0:
+            chunk = self.rfile.read(min(length, self.local_server.chunk_size))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+    def _read_body(self) -> bytes:
+        return b"".join(self._body_chunks())
+
+    def _discard_body(self) -> int:
+        """Read the body without keeping it in memory and return its length"""
+        return sum(len(chunk) for chunk in self._body_chunks())
+
+    def _echo(self, body: bytes) -> Dict[str, Any]:
+        if self.headers.get("Content-Encoding", "").lower() == "gzip":
+            body = gzip.decompress(body)
+        content_type = self.headers.get("Content-Type", "")
+        files: Dict[str, str] = {}
+        form: Dict[str, str] = {}
+        data = ""
+        json_data = None
+        if content_type.startswith("multipart/form-data"):
+            message = BytesParser(policy=HTTP).parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode() + body
+            )
+            for part in message.iter_parts():
+                name = str(part.get_param("name", header="content-disposition"))
+                content = part.get_payload(decode=True)
+                if not isinstance(content, bytes):
+                    content = str(part.get_payload()).encode("utf-8")
+                if part.get_filename() is not None:
+                    files[name] = _to_text(content)
+                else:
+                    form[name] = _to_text(content)
+        else:
+            data = _to_text(body)
+            if content_type.startswith("application/json"):
+                json_data = json.loads(body)
+        return {
+            "url": self.local_server.url(self.path),
+            "method": self.command,
+            "args": dict(parse_qsl(urlsplit(self.path).query)),
+            "headers": dict(self.headers.items()),
+            "data": data,
+            "files": files,
+            "form": form,
+            "json": json_data,
+        }
+
+    def _respond(
+        self, status: int, body: Union[bytes, memoryview], headers: Dict[str, str]
+    ) -> None:
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status < 200 or status in (204, 304):
+            # these responses never have a body, not even a terminating chunk
+            self.end_headers()
+            return
+        if self.local_server.chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self._write_body(memoryview(body))
+
+    def _write_body(self, body: memoryview) -> None:
+        chunk_size = self.local_server.chunk_size
+        throughput = self.local_server.throughput
+        started_at = time.monotonic()
+        for offset in range(0, len(body), chunk_size):
+            chunk = body[offset : offset + chunk_size]
+            if self.local_server.chunked:
+                self.wfile.write(b"%x\r\n" % len(chunk) + chunk + b"\r\n")
+            else:
+                self.wfile.write(chunk)
+            if throughput:
+                # sleep until the sent bytes are within the throughput
+                delay = (offset + len(chunk)) / throughput - (
+                    time.monotonic() - started_at
+                )
+                if delay > 0:
+                    time.sleep(delay)
+        if self.local_server.chunked:
+            self.wfile.write(b"0\r\n\r\n")
+
+
+def _to_text(content: bytes) -> str:
+    """Decode as text or as base64 data url if the content is binary"""
+    try:
+        return content.decode("utf-8")
+    except UnicodeDecodeError:
+        encoded = base64.b64encode(content).decode("ascii")
+        return f"data:application/octet-stream;base64,{encoded}"
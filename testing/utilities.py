@@ -36,6 +36,11 @@ def is_running_in_tools_module_ci() -> bool:
     )
 
 
+def is_benchmarking() -> bool:
+    """Tells whether the benchmarks should be run"""
+    return int(os.environ.get("QGIS_PLUGIN_TOOLS_BENCHMARK", "0")) == 1
+
+
 def qgis_supports_temporal() -> bool:
     try:
         from qgis.core import QgsRasterLayerTemporalProperties  # noqa F401
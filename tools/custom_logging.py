@@ -1,26 +1,61 @@
 """Setting up logging using QGIS, file, Sentry..."""
 
+import copy
 import functools
+import gzip
+import itertools
+import json
 import logging
+import os
+import queue
+import shutil
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from datetime import datetime, timezone
 from enum import Enum, unique
-from logging.handlers import RotatingFileHandler
+from logging.handlers import (
+    BaseRotatingHandler,
+    QueueHandler,
+    RotatingFileHandler,
+    TimedRotatingFileHandler,
+)
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
 
 from qgis.core import Qgis, QgsApplication, QgsMessageLog
 from qgis.gui import QgisInterface, QgsMessageBar
-from qgis.PyQt.QtCore import QObject, pyqtSignal, pyqtSlot
+from qgis.PyQt.QtCore import QObject, QTimer, pyqtSignal, pyqtSlot
 from qgis.PyQt.QtWidgets import QLayout, QVBoxLayout, QWidget
 
 from .i18n import tr
 from .resources import plugin_name, plugin_path, profile_path
-from .settings import get_setting, setting_key
+from .settings import add_setting_listener, get_setting, setting_key
 
 __copyright__ = "Copyright 2020-2021, Gispo Ltd"
 __license__ = "GPL version 3"
 __email__ = "info@gispo.fi"
 __revision__ = "$Format:%H$"
 
+# Maximum number of queued records handled at once by LogQueueListener
+LOG_BATCH_SIZE = 500
+# Defaults of the rotation of the JSON lines log file, overridable with the
+# log_json/max_bytes, log_json/rotation_hours and log_json/backup_count settings
+JSON_LOG_MAX_BYTES = 10 * 1024 * 1024
+JSON_LOG_ROTATION_HOURS = 24
+JSON_LOG_BACKUP_COUNT = 30
+
+# Name of the task run by the current thread, set by BaseTask
+current_task_name: ContextVar[Optional[str]] = ContextVar(
+    "current_task_name", default=None
+)
+# Seconds during which identical message bar messages are merged
+MESSAGE_BAR_COALESCE_SECONDS = 2.0
+MESSAGE_BAR_MAX_MESSAGES_PER_SECOND = 5
+
 
 @unique
 class LogTarget(Enum):
@@ -29,6 +64,7 @@ class LogTarget(Enum):
     STREAM = {"id": "stream", "default": "INFO"}
     FILE = {"id": "file", "default": "INFO"}
     BAR = {"id": "bar", "default": "INFO"}
+    JSON = {"id": "json", "default": "NOTSET"}
 
     @property
     def id(self) -> str:
@@ -39,6 +75,22 @@ class LogTarget(Enum):
         return self.value["default"]
 
 
+# Name of a plugin and a log target of it
+_PluginTarget = Tuple[str, LogTarget]
+# Log levels read from the settings by the plugin name and the target, and the
+# plugin names and the targets by the setting keys
+_LOG_LEVELS: Dict[_PluginTarget, int] = {}
+_LOG_LEVEL_TARGETS: Dict[str, _PluginTarget] = {}
+# Targets of the handlers created for them, for changing the levels
+_HANDLER_TARGETS: "weakref.WeakKeyDictionary[logging.Handler, _PluginTarget]" = (
+    weakref.WeakKeyDictionary()
+)
+# Targets whose lowest level is used by the qgis message log handler
+_MESSAGE_LOG_TARGETS = (LogTarget.STREAM, LogTarget.FILE, LogTarget.BAR)
+# Level of the handlers of the targets disabled after creating the handlers
+_DISABLED_LEVEL = logging.CRITICAL + 1
+
+
 def qgis_level(logging_level: str) -> int:
     """Check for the corresponding QGIS Level according to Logging Level.
 
@@ -80,7 +132,14 @@ def bar_msg(
         by the user.
     :param success: Whether the message is success message or not
     """
-    args = {"details": str(details), "success": success}
+    return _bar_msg_args(str(details), duration, success)
+
+
+def _bar_msg_args(
+    details: Any, duration: Optional[int], success: bool
+) -> Dict[str, Any]:
+    # details is kept as is, QgsMessageBarHandler converts it to string
+    args = {"details": details, "success": success}
     if duration is not None:
         args["duration"] = duration
     return args
@@ -101,14 +160,27 @@ class QgsLogHandler(logging.Handler):
         :param record: logging record containing whatever info needs to be
                 logged.
         """
+        self._log_message(record.getMessage(), qgis_level(record.levelname))
+
+    def emit_batch(self, records: Sequence[logging.LogRecord]) -> None:
+        """Log the consecutive records of the same QGIS level as one message.
+
+        :param records: logging records accepted by the handler
+        """
+        for level, level_records in itertools.groupby(
+            records, key=lambda record: qgis_level(record.levelname)
+        ):
+            self._log_message(
+                "\n".join(record.getMessage() for record in level_records), level
+            )
+
+    def _log_message(self, message: str, level: int) -> None:
         tag_kwargs = (
             {} if self._message_log_name is None else {"tag": self._message_log_name}
         )
         try:
             # noinspection PyCallByClass,PyTypeChecker
-            QgsMessageLog.logMessage(
-                record.getMessage(), level=qgis_level(record.levelname), **tag_kwargs
-            )
+            QgsMessageLog.logMessage(message, level=level, **tag_kwargs)
         except MemoryError:
             message = tr(
                 "Due to memory limitations on this machine, {} logger can not "
@@ -166,14 +238,42 @@ class QgsMessageBarFilter(logging.Filter):
         return 4
 
 
+def _severity(level: int) -> int:
+    # success messages are the least severe, although their level is the largest
+    return -1 if level == Qgis.Success else level
+
+
 class SimpleMessageBarProxy(QObject):
-    """Signal-slot pair to always push messages in the main thread."""
+    """
+    Signal-slot pair to always push messages in the main thread.
+
+    To keep error storms from flooding the message bar, a message identical
+    to one pushed during the last coalesce_seconds is not pushed again, but
+    counted and shown as one message with the count when the time has passed.
+    Messages exceeding max_messages_per_second are not pushed either,
+    they are summarized in one message telling how many were not shown.
+    """
 
     _emit_message = pyqtSignal(str, str, int, int)
 
-    def __init__(self, msg_bar: Optional[QgsMessageBar] = None) -> None:
+    def __init__(
+        self,
+        msg_bar: Optional[QgsMessageBar] = None,
+        coalesce_seconds: float = MESSAGE_BAR_COALESCE_SECONDS,
+        max_messages_per_second: int = MESSAGE_BAR_MAX_MESSAGES_PER_SECOND,
+    ) -> None:
         super().__init__()
         self._msg_bar = msg_bar
+        self._coalesce_msec = round(coalesce_seconds * 1000)
+        self._max_messages_per_second = max_messages_per_second
+        self._pushed_at: Deque[float] = deque()
+        # Count of repeated messages by title, text and level
+        self._repeated: Dict[Tuple[str, str, int], int] = {}
+        # Count of the messages not shown, and level and duration of the
+        # most severe of them
+        self._not_shown = 0
+        self._not_shown_level = Qgis.Info
+        self._not_shown_duration = 0
         self._emit_message.connect(self.push_message)
 
     def emit_message(self, title: str, text: str, level: int, duration: int) -> None:
@@ -181,6 +281,49 @@ class SimpleMessageBarProxy(QObject):
 
     @pyqtSlot(str, str, int, int)
     def push_message(self, title: str, text: str, level: int, duration: int) -> None:
+        key = (title, text, level)
+        if key in self._repeated:
+            self._repeated[key] += 1
+        elif self._is_rate_limited():
+            self._add_not_shown(level, duration)
+        else:
+            self._repeated[key] = 0
+            QTimer.singleShot(
+                self._coalesce_msec, lambda: self._push_repeated(key, duration)
+            )
+            self._push(title, text, level, duration)
+
+    def _is_rate_limited(self) -> bool:
+        second_ago = time.monotonic() - 1
+        while self._pushed_at and self._pushed_at[0] <= second_ago:
+            self._pushed_at.popleft()
+        return len(self._pushed_at) >= self._max_messages_per_second
+
+    def _push_repeated(self, key: Tuple[str, str, int], duration: int) -> None:
+        count = self._repeated.pop(key)
+        if count:
+            title, text, level = key
+            self._push(f"{title} (+{count})", text, level, duration)
+
+    def _add_not_shown(self, level: int, duration: int) -> None:
+        if not self._not_shown:
+            QTimer.singleShot(self._coalesce_msec, self._push_not_shown)
+        self._not_shown += 1
+        if self._not_shown == 1 or _severity(level) > _severity(self._not_shown_level):
+            self._not_shown_level = level
+            self._not_shown_duration = duration
+
+    def _push_not_shown(self) -> None:
+        self._push(
+            tr("{} more messages", self._not_shown),
+            tr("See the message log for details"),
+            self._not_shown_level,
+            self._not_shown_duration,
+        )
+        self._not_shown = 0
+
+    def _push(self, title: str, text: str, level: int, duration: int) -> None:
+        self._pushed_at.append(time.monotonic())
         try:
             if self._msg_bar is not None:
                 self._msg_bar.pushMessage(
@@ -196,9 +339,23 @@ class SimpleMessageBarProxy(QObject):
 class QgsMessageBarHandler(logging.Handler):
     """A logging handler that will log messages to the QGIS message bar."""
 
-    def __init__(self, msg_bar: Optional[QgsMessageBar] = None) -> None:
+    def __init__(
+        self,
+        msg_bar: Optional[QgsMessageBar] = None,
+        coalesce_seconds: float = MESSAGE_BAR_COALESCE_SECONDS,
+        max_messages_per_second: int = MESSAGE_BAR_MAX_MESSAGES_PER_SECOND,
+    ) -> None:
+        """
+        :param msg_bar: message bar to push the messages to
+        :param coalesce_seconds: seconds during which identical messages are
+            merged into one with a count
+        :param max_messages_per_second: messages over this rate are summarized
+            in one message
+        """
         super().__init__()
-        self._message_bar_proxy = SimpleMessageBarProxy(msg_bar)
+        self._message_bar_proxy = SimpleMessageBarProxy(
+            msg_bar, coalesce_seconds, max_messages_per_second
+        )
         self._message_bar_proxy.moveToThread(QgsApplication.instance().thread())
 
     def emit(self, record: logging.LogRecord) -> None:
@@ -210,13 +367,314 @@ class QgsMessageBarHandler(logging.Handler):
             QgsMessageBarFilter
         """
         self._message_bar_proxy.emit_message(
-            record.message,
-            record.details,  # type: ignore
+            record.getMessage(),
+            str(record.details),  # type: ignore
             record.qgis_level,  # type: ignore
             record.duration,  # type: ignore
         )
 
 
+class LogQueueListener:
+    """
+    Thread handling the records queued by LogQueueHandler with the actual
+    handlers. The records queued at the same time are handled as a batch:
+    stream and file handlers flush once per batch and QGIS message log gets
+    one message per level.
+    """
+
+    def __init__(
+        self,
+        log_queue: "queue.Queue[Optional[logging.LogRecord]]",
+        handlers: Sequence[logging.Handler],
+        batch_size: int = LOG_BATCH_SIZE,
+    ) -> None:
+        self.queue = log_queue
+        self.handlers = tuple(handlers)
+        self._batch_size = batch_size
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="qgis_plugin_tools log listener", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Handle the records already queued and stop the thread"""
+        if self._thread is None:
+            return
+        # None marks the end of the records
+        self.queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def handle_batch(self, records: Sequence[logging.LogRecord]) -> None:
+        for handler in self.handlers:
+            accepted = [
+                record
+                for record in records
+                if record.levelno >= handler.level and handler.filter(record)
+            ]
+            if not accepted:
+                continue
+            if isinstance(handler, logging.StreamHandler):
+                _emit_stream_batch(handler, accepted)
+                continue
+            handler.acquire()
+            try:
+                if isinstance(handler, QgsLogHandler):
+                    handler.emit_batch(accepted)
+                else:
+                    for record in accepted:
+                        handler.emit(record)
+            finally:
+                handler.release()
+
+    def _run(self) -> None:
+        while True:
+            records = [self.queue.get()]
+            while len(records) < self._batch_size:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in records:
+                self.handle_batch(records[: records.index(None)])  # type: ignore
+                return
+            self.handle_batch(records)  # type: ignore
+
+
+class LogQueueHandler(QueueHandler):
+    """
+    A logging handler that queues the records to be handled by the handlers
+    of LogQueueListener in a background thread, so that logging does not
+    wait for file writes and QGIS message log.
+
+    The queue is bounded. When it is full, records are dropped instead of
+    blocking the logging thread. The dropped records are counted and a
+    warning with the count is queued when there is room again.
+    """
+
+    def __init__(self, listener: LogQueueListener) -> None:
+        super().__init__(listener.queue)
+        self.queue: "queue.Queue[Optional[logging.LogRecord]]" = listener.queue
+        self.listener = listener
+        self.dropped = 0
+        self._unreported_drops = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Unlike QueueHandler.prepare, the traceback and the stack are not
+        # formatted into the message, so that the handlers format them
+        # themselves. Only the arguments are merged, since they may change
+        # before the record is handled.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        # the task of the logging thread for JsonFormatter
+        record.qgis_task = current_task_name.get()  # type: ignore
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        # logging.Handler.handle holds the handler lock during this call
+        if self.queue.full():
+            self.dropped += 1
+            self._unreported_drops += 1
+            return
+        try:
+            if self._unreported_drops:
+                self.queue.put_nowait(self._drop_warning())
+                self._unreported_drops = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self._unreported_drops += 1
+
+    def close(self) -> None:
+        self.listener.stop()
+        super().close()
+
+    def _drop_warning(self) -> logging.LogRecord:
+        return logging.makeLogRecord(
+            {
+                "name": __name__,
+                "levelno": logging.WARNING,
+                "levelname": "WARNING",
+                "msg": tr(
+                    "{} log messages were dropped, because the log queue was full",
+                    self._unreported_drops,
+                ),
+            }
+        )
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats the records as JSON objects with the time, logger, level, thread,
+    task, source location and message of the record, and the extra fields
+    given to the logging call, such as details of the message bar messages.
+    """
+
+    # attributes of every record, the others are extra fields
+    _RECORD_ATTRIBUTES = frozenset(
+        [*logging.makeLogRecord({}).__dict__, "message", "asctime", "qgis_task"]
+    )
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "logger": record.name,
+            "level": record.levelname,
+            "thread": record.threadName,
+            # set by LogQueueHandler when the record is handled in another thread
+            "task": getattr(record, "qgis_task", current_task_name.get()),
+            "module": record.module,
+            "function": record.funcName,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        for key, value in record.__dict__.items():
+            if key not in self._RECORD_ATTRIBUTES:
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class JsonLinesFileHandler(BaseRotatingHandler):
+    """
+    A logging handler that writes the records as JSON lines.
+
+    The file is rotated when it has grown over max_bytes or it has been open
+    for rotation_interval seconds. The rotated files are named with the time of
+    the rotation, compressed with gzip in a background thread and only the
+    backup_count latest of them are kept.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        max_bytes: int = JSON_LOG_MAX_BYTES,
+        rotation_interval: Optional[float] = JSON_LOG_ROTATION_HOURS * 3600,
+        backup_count: int = JSON_LOG_BACKUP_COUNT,
+    ) -> None:
+        """
+        :param filename: Path of the log file
+        :param max_bytes: Size of the file that causes the rotation, 0 to not
+            rotate by size
+        :param rotation_interval: Seconds after which the file is rotated, None
+            to not rotate by time
+        :param backup_count: Number of rotated files to keep
+        """
+        super().__init__(filename, "a", encoding="utf-8")
+        self.max_bytes = max_bytes
+        self.rotation_interval = rotation_interval
+        self.backup_count = backup_count
+        self._rollover_at = self._next_rollover()
+        self._compressor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="qgis_plugin_tools log compressor"
+        )
+        self.setFormatter(JsonFormatter())
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:  # noqa: N802
+        if self.stream is None:
+            return False
+        if self._rollover_at is not None and time.time() >= self._rollover_at:
+            return True
+        # the size is checked before writing instead of formatting the record
+        # twice, so the file can exceed the limit by one record
+        return self.max_bytes > 0 and self.stream.tell() >= self.max_bytes
+
+    def doRollover(self) -> None:  # noqa: N802
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None  # type: ignore
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename):
+            rotated_path = self._rotated_path()
+            os.replace(self.baseFilename, rotated_path)
+            self._compressor.submit(self._compress_and_remove_old, rotated_path)
+        self.stream = self._open()
+        self._rollover_at = self._next_rollover()
+
+    def close(self) -> None:
+        super().close()
+        # finish compressing the rotated files
+        self._compressor.shutdown(wait=True)
+
+    def _next_rollover(self) -> Optional[float]:
+        if self.rotation_interval is None:
+            return None
+        return time.time() + self.rotation_interval
+
+    def _rotated_path(self) -> Path:
+        path = Path(self.baseFilename)
+        # sortable by the time of the rotation
+        name = f"{path.stem}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+        rotated_path = path.with_name(f"{name}{path.suffix}")
+        index = 1
+        while rotated_path.exists() or Path(f"{rotated_path}.gz").exists():
+            rotated_path = path.with_name(f"{name}-{index}{path.suffix}")
+            index += 1
+        return rotated_path
+
+    def _compress_and_remove_old(self, rotated_path: Path) -> None:
+        compressed_path = Path(f"{rotated_path}.gz")
+        temporary_path = Path(f"{compressed_path}.tmp")
+        try:
+            with open(rotated_path, "rb") as source, gzip.open(
+                temporary_path, "wb"
+            ) as target:
+                shutil.copyfileobj(source, target)
+            os.replace(temporary_path, compressed_path)
+            os.remove(rotated_path)
+        except OSError:
+            # the rotated file is kept uncompressed
+            pass
+
+        path = Path(self.baseFilename)
+        rotated_paths = sorted(
+            path.parent.glob(f"{path.stem}.*{path.suffix}*"),
+            key=lambda rotated: rotated.name.replace(".gz", ""),
+        )
+        for old_path in rotated_paths[: max(len(rotated_paths) - self.backup_count, 0)]:
+            try:
+                old_path.unlink()
+            except OSError:
+                pass
+
+
+def _emit_stream_batch(
+    handler: logging.StreamHandler, records: Sequence[logging.LogRecord]
+) -> None:
+    """Write the records like StreamHandler.emit, but flush only once"""
+    handler.acquire()
+    try:
+        for record in records:
+            try:
+                if isinstance(
+                    handler,
+                    (
+                        RotatingFileHandler,
+                        TimedRotatingFileHandler,
+                        JsonLinesFileHandler,
+                    ),
+                ) and handler.shouldRollover(record):
+                    handler.doRollover()
+                if handler.stream is None:
+                    # file handler opening the file on the first record
+                    handler.emit(record)
+                    continue
+                handler.stream.write(handler.format(record) + handler.terminator)
+            except Exception:
+                handler.handleError(record)
+        handler.flush()
+    finally:
+        handler.release()
+
+
 def add_logging_handler_once(logger: logging.Logger, handler: logging.Handler) -> bool:
     """A helper to add a handler to a logger, ensuring there are no duplicates.
 
@@ -250,8 +708,108 @@ def get_log_level_name(target: LogTarget) -> str:
 
 
 def get_log_level(target: LogTarget) -> int:
-    """Finds log level of the target"""
-    return logging.getLevelName(get_log_level_name(target))
+    """
+    Finds log level of the target.
+
+    The level is read from the settings of the calling plugin once and cached
+    until it is changed with set_setting.
+    """
+    plugin_target = (plugin_name(), target)
+    level = _LOG_LEVELS.get(plugin_target)
+    if level is None:
+        level = _LOG_LEVELS[plugin_target] = _parse_log_level(
+            get_log_level_name(target), target
+        )
+        _LOG_LEVEL_TARGETS[setting_key(get_log_level_key(target))] = plugin_target
+    return level
+
+
+def refresh_log_levels() -> None:
+    """
+    Read the log levels from the settings again and apply them to the
+    handlers already created, for example after changing the settings
+    with QgsSettings instead of set_setting.
+    """
+    for key, (_, target) in list(_LOG_LEVEL_TARGETS.items()):
+        _log_level_changed(
+            key, get_setting(key, target.default_level, str, internal=False)
+        )
+
+
+def _parse_log_level(level_name: str, target: LogTarget) -> int:
+    level = logging.getLevelName(level_name)
+    if not isinstance(level, int):
+        # unknown level names are returned as "Level <name>"
+        level = logging.getLevelName(target.default_level)
+    return level
+
+
+def _log_level_changed(key: str, value: Any) -> None:
+    plugin_target = _LOG_LEVEL_TARGETS.get(key)
+    if plugin_target is not None:
+        level = _LOG_LEVELS[plugin_target] = _parse_log_level(
+            str(value), plugin_target[1]
+        )
+        _apply_log_level(plugin_target, level)
+
+
+def _apply_log_level(plugin_target: _PluginTarget, level: int) -> None:
+    """
+    Set the level of the existing handlers of the plugin and the target and
+    the levels derived from it. Handlers of the targets disabled after they
+    were created are given a level above CRITICAL, and the targets enabled
+    after the loggers were set up need the loggers to be set up again.
+    """
+    handler_level = level if level > logging.NOTSET else _DISABLED_LEVEL
+    for logger in _loggers():
+        if _set_handler_levels(logger.handlers, plugin_target, handler_level):
+            logger.setLevel(min(h.level for h in logger.handlers))
+
+
+def _set_handler_levels(
+    handlers: Sequence[logging.Handler],
+    plugin_target: _PluginTarget,
+    level: int,
+) -> bool:
+    """Set the levels of the handlers, returns whether any of them was changed"""
+    changed = False
+    for handler in handlers:
+        if _HANDLER_TARGETS.get(handler) == plugin_target:
+            handler.setLevel(level)
+            changed = True
+        elif isinstance(handler, LogQueueHandler) and _set_handler_levels(
+            handler.listener.handlers, plugin_target, level
+        ):
+            handler.setLevel(min(h.level for h in handler.listener.handlers))
+            changed = True
+
+    if changed:
+        message_log_targets = [
+            (plugin_target[0], target) for target in _MESSAGE_LOG_TARGETS
+        ]
+        # the qgis message log handler uses the lowest level of the stream,
+        # file and message bar handlers like in _create_handlers
+        levels = [
+            h.level
+            for h in handlers
+            if _HANDLER_TARGETS.get(h) in message_log_targets
+            and h.level != _DISABLED_LEVEL
+        ]
+        for handler in handlers:
+            if isinstance(handler, QgsLogHandler):
+                handler.setLevel(min(levels) if levels else logging.NOTSET)
+    return changed
+
+
+def _loggers() -> List[logging.Logger]:
+    return [
+        logging.getLogger(),
+        *(
+            logger
+            for logger in list(logging.Logger.manager.loggerDict.values())
+            if isinstance(logger, logging.Logger)
+        ),
+    ]
 
 
 def get_log_folder() -> Path:
@@ -269,10 +827,16 @@ def get_log_folder() -> Path:
     return log_dir
 
 
+def _log_file_name(message_log_name: str, suffix: str) -> str:
+    return "".join((c if c.isalnum() else "_") for c in message_log_name) + suffix
+
+
 def _create_handlers(
     message_log_name: str, message_bar: Optional[QgsMessageBar]
 ) -> List[logging.Handler]:
     handlers: List[logging.Handler] = []
+    # the handlers are tracked by the plugin for changing their levels
+    plugin = plugin_name()
 
     stream_level = get_log_level(LogTarget.STREAM)
     if stream_level > logging.NOTSET:
@@ -282,15 +846,14 @@ def _create_handlers(
             "%(asctime)s - %(levelname)s - %(message)s", "%d.%m.%Y %H:%M:%S"
         )
         console_handler.setFormatter(console_formatter)
+        _HANDLER_TARGETS[console_handler] = (plugin, LogTarget.STREAM)
         handlers.append(console_handler)
 
     file_level = get_log_level(LogTarget.FILE)
     if file_level > logging.NOTSET:
-        log_file_name = (
-            "".join((c if c.isalnum() else "_") for c in message_log_name) + ".log"
-        )
         file_handler = RotatingFileHandler(
-            str(get_log_folder() / log_file_name), maxBytes=1024 * 1024 * 2
+            str(get_log_folder() / _log_file_name(message_log_name, ".log")),
+            maxBytes=1024 * 1024 * 2,
         )
         file_handler.setLevel(file_level)
         file_formatter = logging.Formatter(
@@ -298,6 +861,7 @@ def _create_handlers(
             "%d.%m.%Y %H:%M:%S",
         )
         file_handler.setFormatter(file_formatter)
+        _HANDLER_TARGETS[file_handler] = (plugin, LogTarget.FILE)
         handlers.append(file_handler)
 
     bar_level = get_log_level(LogTarget.BAR)
@@ -305,6 +869,7 @@ def _create_handlers(
         qgis_msg_bar_handler = QgsMessageBarHandler(message_bar)
         qgis_msg_bar_handler.addFilter(QgsMessageBarFilter())
         qgis_msg_bar_handler.setLevel(bar_level)
+        _HANDLER_TARGETS[qgis_msg_bar_handler] = (plugin, LogTarget.BAR)
         handlers.append(qgis_msg_bar_handler)
 
     # NOTE: NOTSET on handler will match everything, compared to NOTSET
@@ -320,17 +885,57 @@ def _create_handlers(
     qgis_message_log_handler.setFormatter(qgis_message_log_formatter)
     handlers.append(qgis_message_log_handler)
 
+    # added after the qgis message log handler so that a detailed JSON log does
+    # not lower the level of the qgis message log
+    json_level = get_log_level(LogTarget.JSON)
+    if json_level > logging.NOTSET:
+        rotation_hours = float(
+            get_setting("log_json/rotation_hours", JSON_LOG_ROTATION_HOURS, float)
+        )
+        json_handler = JsonLinesFileHandler(
+            str(get_log_folder() / _log_file_name(message_log_name, ".jsonl")),
+            max_bytes=int(get_setting("log_json/max_bytes", JSON_LOG_MAX_BYTES, int)),
+            rotation_interval=rotation_hours * 3600 if rotation_hours > 0 else None,
+            backup_count=int(
+                get_setting("log_json/backup_count", JSON_LOG_BACKUP_COUNT, int)
+            ),
+        )
+        json_handler.setLevel(json_level)
+        _HANDLER_TARGETS[json_handler] = (plugin, LogTarget.JSON)
+        handlers.append(json_handler)
+
     return handlers
 
 
+def _create_queue_handler(
+    handlers: Sequence[logging.Handler], queue_size: int
+) -> LogQueueHandler:
+    listener = LogQueueListener(queue.Queue(queue_size), handlers)
+    queue_handler = LogQueueHandler(listener)
+    queue_handler.setLevel(min(h.level for h in handlers))
+    listener.start()
+    return queue_handler
+
+
+def _close_if_unused(handler: logging.Handler) -> None:
+    if not any(handler in logger.handlers for logger in _loggers()):
+        handler.close()
+
+
 def setup_logger(  # noqa QGS105
-    logger_name: str, iface: Optional[QgisInterface] = None
+    logger_name: str,
+    iface: Optional[QgisInterface] = None,
+    queue_size: Optional[int] = None,
 ) -> logging.Logger:
     """Run once when the module is loaded and enable logging.
 
 
     :param logger_name: The logger name that we want to set up.
     :param iface: QGIS Interface
+    :param queue_size: If given, the records are queued to a queue of this size
+        and handled in a background thread. Records logged when the queue is
+        full are dropped. By default the records are handled in the thread
+        that logs them.
 
     Borrowed heavily from this:
     http://docs.python.org/howto/logging-cookbook.html
@@ -357,6 +962,8 @@ def setup_logger(  # noqa QGS105
     # keep api stable and create the handlers as if the passed logger name
     # was plugin_name()
     handlers = _create_handlers(plugin_name(), message_bar)
+    if queue_size is not None:
+        handlers = [_create_queue_handler(handlers, queue_size)]
 
     # if the logger name was plugin_name(), create also the necessary logger for the
     # qgis_plugin_tools namespace for MsgBar and others to work properly using __name__
@@ -404,13 +1011,30 @@ def use_custom_msg_bar_in_logger(logger_name: str, msg_bar: QgsMessageBar) -> No
     logger = logging.getLogger(logger_name)
     bar_level = get_log_level(LogTarget.BAR)
 
+    qgis_msg_bar_handler = QgsMessageBarHandler(msg_bar)
+    qgis_msg_bar_handler.addFilter(QgsMessageBarFilter())
+    qgis_msg_bar_handler.setLevel(bar_level)
+    _HANDLER_TARGETS[qgis_msg_bar_handler] = (plugin_name(), LogTarget.BAR)
+
     for handler in logger.handlers[:]:
         if isinstance(handler, QgsMessageBarHandler):
             logger.removeHandler(handler)
+        elif isinstance(handler, LogQueueHandler):
+            # the queued handlers may be shared with other loggers, so this
+            # logger gets its own queue with the custom message bar
+            logger.removeHandler(handler)
+            _close_if_unused(handler)
+            queued_handlers = [
+                queued_handler
+                for queued_handler in handler.listener.handlers
+                if not isinstance(queued_handler, QgsMessageBarHandler)
+            ]
+            queued_handlers.append(qgis_msg_bar_handler)
+            add_logging_handler_once(
+                logger, _create_queue_handler(queued_handlers, handler.queue.maxsize)
+            )
+            return
 
-    qgis_msg_bar_handler = QgsMessageBarHandler(msg_bar)
-    qgis_msg_bar_handler.addFilter(QgsMessageBarFilter())
-    qgis_msg_bar_handler.setLevel(bar_level)
     add_logging_handler_once(logger, qgis_msg_bar_handler)
 
 
@@ -422,6 +1046,8 @@ def teardown_logger(logger_name: str) -> None:
     logger = logging.getLogger(logger_name)
     for handler in logger.handlers[:]:
         logger.removeHandler(handler)
+        if isinstance(handler, LogQueueHandler):
+            _close_if_unused(handler)
 
     # if the logger name was plugin_name(), also clean up the special case logger
     if logger_name == plugin_name():
@@ -440,12 +1066,16 @@ def setup_loggers(
     *logger_names: str,
     message_log_name: str,
     message_bar: Optional[QgsMessageBar] = None,
+    queue_size: Optional[int] = None,
 ) -> Callable[[], None]:
     """
     Setups all the loggers for the given logger names.
 
     Returns a teardown callback so setup can be called in initGui and
     the returned callback in unload.
+
+    With queue_size, the records are handled in a background thread like
+    in setup_logger.
     """
     if message_bar is None:
         try:
@@ -456,6 +1086,8 @@ def setup_loggers(
             message_bar = None
 
     handlers = _create_handlers(message_log_name, message_bar)
+    if queue_size is not None:
+        handlers = [_create_queue_handler(handlers, queue_size)]
 
     for logger_name in logger_names:
         logger = logging.getLogger(logger_name)
@@ -466,4 +1098,7 @@ def setup_loggers(
         for handler in handlers:
             add_logging_handler_once(logger, handler)
 
-    return functools.partial(teardown_loggers, logger_names)
+    return functools.partial(teardown_loggers, list(logger_names))
+
+
+add_setting_listener(_log_level_changed)
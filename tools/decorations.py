@@ -20,9 +20,6 @@ def log_if_fails(
     """
     from functools import wraps
 
-    # caller is at depth 3 (MessageBarLogger log call, this function, actual call)
-    message_bar = MessageBarLogger(logger_name, stack_level=3)
-
     def decorator(fn: Callable) -> Callable:
         @wraps(fn)
         def wrapper(*args: Any, **kwargs: Any) -> None:  # noqa: ANN001
@@ -32,12 +29,17 @@ def log_if_fails(
                     fn(*args, **kwargs)
                 else:
                     fn(*args[:-1], **kwargs)
-            except QgsPluginException as e:
-                message_bar.exception(e, **e.bar_msg, stack_info=True)
             except Exception as e:
-                message_bar.exception(
-                    tr("Unhandled exception occurred"), e, stack_info=True
-                )
+                # created on failure only, not when the function is decorated
+                # caller is at depth 3 (MessageBarLogger log call, this function,
+                # actual call)
+                message_bar = MessageBarLogger(logger_name, stack_level=3)
+                if isinstance(e, QgsPluginException):
+                    message_bar.exception(e, **e.bar_msg, stack_info=True)
+                else:
+                    message_bar.exception(
+                        tr("Unhandled exception occurred"), e, stack_info=True
+                    )
 
         return wrapper
 
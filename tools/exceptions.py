@@ -38,14 +38,20 @@ class QgsPluginNetworkException(QgsPluginException):
         self,
         *args: Any,
         error: Optional[QNetworkReply.NetworkError] = None,
+        status_code: Optional[int] = None,
+        headers: Optional[Dict[str, str]] = None,
         **kwargs: Any,
     ) -> None:
         """
         Initializes the exception with error details so the plugin may process
         different network exceptions differently.
-        :param status: The QNetworkReply error type
+        :param error: The QNetworkReply error type
+        :param status_code: HTTP status code of the response, if any
+        :param headers: Headers of the response with lower case names
         """
         self.error = error
+        self.status_code = status_code
+        self.headers: Dict[str, str] = headers if headers is not None else {}
         super().__init__(*args, **kwargs)
 
 
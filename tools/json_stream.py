@@ -0,0 +1,246 @@
+"""Incremental decoding of large JSON documents."""
+
+import codecs
+import json
+import re
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+__copyright__ = "Copyright 2020-2021, Gispo Ltd"
+__license__ = "GPL version 3"
+__email__ = "info@gispo.fi"
+__revision__ = "$Format:%H$"
+
+_WHITESPACE = " \t\n\r"
+_STRING_SPECIAL = re.compile(r'["\\]')
+_CONTAINER_SPECIAL = re.compile(r'["{}\[\]]')
+_SCALAR_END = re.compile(r"[\s,\]}]")
+
+
+def iter_json_items(
+    chunks: Iterable[bytes], path: str = "", encoding: str = "utf-8"
+) -> Iterator[Any]:
+    """
+    Decode items of a JSON array incrementally from the chunks of the document.
+
+    Only the chunk being parsed and the item being decoded are kept in memory,
+    so the items of large documents can be processed as they arrive.
+
+    >>> for feature in iter_json_items(chunks, "features"):
+    >>>     layer.addFeature(to_feature(feature))
+    :param chunks: Bytes of the JSON document in consecutive chunks
+    :param path: Dot separated keys of the objects containing the array,
+        e.g. "features" or "result.items". Empty for a top level array
+    :param encoding: Encoding of the document
+    :return: iterator of the decoded items of the array
+    :raises ValueError: if the document is not valid JSON or does not contain
+        the array
+    """
+    parser = _JsonArrayParser(path.split(".") if path else [])
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for chunk in chunks:
+        yield from parser.feed(decoder.decode(chunk))
+    yield from parser.feed(decoder.decode(b"", final=True), final=True)
+
+
+class _JsonArrayParser:
+    """
+    Scans the document for the array in the path and decodes its items
+    with json.loads when they have been scanned completely.
+    """
+
+    def __init__(self, keys: List[str]) -> None:
+        self._keys = keys
+        self._buffer = ""
+        self._position = 0
+        # containers enclosing the position with the current key of objects
+        self._stack: List[Tuple[str, Optional[str]]] = []
+        self._string_start: Optional[int] = None
+        self._last_string: Optional[str] = None
+        self._in_array = False
+        self._item: Optional[_ItemScanner] = None
+        self._expect_item = True
+        self._after_comma = False
+        self._done = False
+
+    def feed(self, text: str, final: bool = False) -> Iterator[Any]:
+        if self._done:
+            return
+        self._buffer += text
+        if not self._in_array:
+            self._scan()
+        if self._in_array:
+            yield from self._decode_items(final)
+        self._trim()
+        if final and not self._done:
+            raise ValueError(
+                f"JSON document ended before the array {'.'.join(self._keys)}"
+            )
+
+    def _scan(self) -> None:
+        """Advance until the start of the array in the path"""
+        buffer = self._buffer
+        while self._position < len(buffer):
+            char = buffer[self._position]
+            if self._string_start is not None:
+                if char == "\\":
+                    if self._position + 1 >= len(buffer):
+                        return
+                    self._position += 2
+                    continue
+                if char == '"':
+                    self._last_string = json.loads(
+                        buffer[self._string_start : self._position + 1]
+                    )
+                    self._string_start = None
+            elif char == '"':
+                self._string_start = self._position
+            elif char == ":" and self._stack and self._stack[-1][0] == "{":
+                self._stack[-1] = ("{", self._last_string)
+            elif char in "{[":
+                if char == "[" and self._path() == self._keys:
+                    self._position += 1
+                    self._in_array = True
+                    return
+                self._stack.append((char, None))
+            elif char in "}]":
+                if not self._stack:
+                    raise ValueError(f"Unexpected {char} in JSON document")
+                self._stack.pop()
+                if not self._stack:
+                    raise ValueError(
+                        f"JSON document does not contain array {'.'.join(self._keys)}"
+                    )
+            self._position += 1
+
+    def _path(self) -> Optional[List[str]]:
+        if any(container != "{" or key is None for container, key in self._stack):
+            return None
+        return [key for _, key in self._stack]  # type: ignore
+
+    def _decode_items(self, final: bool) -> Iterator[Any]:
+        buffer = self._buffer
+        while True:
+            if self._item is not None:
+                end = self._item.scan(buffer, self._position)
+                if end is None:
+                    # item continues in the next chunk
+                    self._position = len(buffer)
+                    return
+                item = self._item.decode()
+                self._position = end
+                self._item = None
+                self._expect_item = False
+                yield item
+                continue
+            position = self._skip_whitespace(buffer, self._position)
+            if position >= len(buffer):
+                self._position = position
+                return
+            char = buffer[position]
+            if char == "]" and not self._after_comma:
+                self._position = position + 1
+                self._done = True
+                return
+            if char == "," and not self._expect_item:
+                self._position = position + 1
+                self._expect_item = True
+                self._after_comma = True
+                continue
+            if not self._expect_item or char in ",]":
+                raise ValueError(f"Unexpected {char} in JSON array")
+            self._position = position
+            self._item = _ItemScanner()
+            self._after_comma = False
+
+    def _trim(self) -> None:
+        """Drop the parsed part of the buffer"""
+        start = self._position if self._string_start is None else self._string_start
+        self._buffer = self._buffer[start:]
+        self._position -= start
+        if self._string_start is not None:
+            self._string_start -= start
+
+    @staticmethod
+    def _skip_whitespace(buffer: str, position: int) -> int:
+        while position < len(buffer) and buffer[position] in _WHITESPACE:
+            position += 1
+        return position
+
+
+class _ItemScanner:
+    """
+    Finds the end of a JSON value arriving in chunks by tracking the nesting
+    depth and the strings, so the value is decoded only once when it is complete.
+    """
+
+    def __init__(self) -> None:
+        self._parts: List[str] = []
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def scan(self, text: str, position: int) -> Optional[int]:
+        """
+        Scan the text of the value from the position.
+        :return: end position of the value in the text, or None if the value
+            continues in the next text
+        """
+        start = position
+        while True:
+            if not self._started:
+                self._started = True
+                char = text[position]
+                position += 1
+                if char == '"':
+                    self._in_string = True
+                elif char in "{[":
+                    self._depth = 1
+            elif self._in_string:
+                if self._escape:
+                    if position >= len(text):
+                        break
+                    position += 1
+                    self._escape = False
+                match = _STRING_SPECIAL.search(text, position)
+                if match is None:
+                    break
+                position = match.end()
+                if match.group() == "\\":
+                    self._escape = True
+                else:
+                    self._in_string = False
+                    if self._depth == 0:
+                        return self._complete(text, start, position)
+            elif self._depth > 0:
+                match = _CONTAINER_SPECIAL.search(text, position)
+                if match is None:
+                    break
+                position = match.end()
+                char = match.group()
+                if char == '"':
+                    self._in_string = True
+                elif char in "{[":
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        return self._complete(text, start, position)
+            else:
+                # number, true, false or null
+                match = _SCALAR_END.search(text, position)
+                if match is None:
+                    break
+                return self._complete(text, start, match.start())
+        self._parts.append(text[start:])
+        return None
+
+    def decode(self) -> Any:
+        try:
+            return json.loads("".join(self._parts))
+        except json.JSONDecodeError as e:
+            raise ValueError("Invalid JSON document") from e
+
+    def _complete(self, text: str, start: int, end: int) -> int:
+        self._parts.append(text[start:end])
+        return end
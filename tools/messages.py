@@ -2,7 +2,7 @@ import logging
 import sys
 from typing import Any, Dict, Optional
 
-from .custom_logging import bar_msg
+from .custom_logging import _bar_msg_args
 
 
 class MessageBarLogger:
@@ -15,10 +15,11 @@ class MessageBarLogger:
 
     def __init__(self, logger_name: str, stack_level: int = 2) -> None:
         self._logger = logging.getLogger(logger_name)
+        # one more level for the _log method
         self._logger_kwargs: Dict[str, Any] = (
             {}
             if sys.version_info.major == 3 and sys.version_info.minor < 8
-            else {"stacklevel": stack_level}
+            else {"stacklevel": stack_level + 1}
         )
 
     def info(
@@ -41,21 +42,9 @@ class MessageBarLogger:
         :param exc_info: Exception of handled exception for capturing traceback
         :param stack_info: Whether to include stack info
         """
-
-        self._logger.info(
-            str(message),
-            extra=bar_msg(details, duration, success),
-            exc_info=exc_info,
-            stack_info=stack_info,
-            **self._logger_kwargs,
+        self._log(
+            logging.INFO, message, details, duration, success, exc_info, stack_info
         )
-        if details != "":
-            self._logger.info(
-                str(details),
-                exc_info=exc_info,
-                stack_info=stack_info,
-                **self._logger_kwargs,
-            )
 
     def warning(
         self,
@@ -77,20 +66,9 @@ class MessageBarLogger:
         :param exc_info: Exception of handled exception for capturing traceback
         :param stack_info: Whether to include stack info
         """
-        self._logger.warning(
-            str(message),
-            extra=bar_msg(details, duration, success),
-            exc_info=exc_info,
-            stack_info=stack_info,
-            **self._logger_kwargs,
+        self._log(
+            logging.WARNING, message, details, duration, success, exc_info, stack_info
         )
-        if details != "":
-            self._logger.warning(
-                str(details),
-                exc_info=exc_info,
-                stack_info=stack_info,
-                **self._logger_kwargs,
-            )
 
     def error(
         self,
@@ -112,20 +90,9 @@ class MessageBarLogger:
         :param exc_info: Exception of handled exception for capturing traceback
         :param stack_info: Whether to include stack info
         """
-        self._logger.error(
-            str(message),
-            extra=bar_msg(details, duration, success),
-            exc_info=exc_info,
-            stack_info=stack_info,
-            **self._logger_kwargs,
+        self._log(
+            logging.ERROR, message, details, duration, success, exc_info, stack_info
         )
-        if details != "":
-            self._logger.error(
-                str(details),
-                exc_info=exc_info,
-                stack_info=stack_info,
-                **self._logger_kwargs,
-            )
 
     def exception(
         self,
@@ -153,16 +120,45 @@ class MessageBarLogger:
         # being a simple helper which calls error internally). use plain error here to
         # have same effective stacklevel on both actual log records. possibly related
         # https://github.com/python/cpython/issues/89334 has been fixed in 3.11+
-        self._logger.error(
-            str(message),
-            extra=bar_msg(details, duration, success),
+        self._log(
+            logging.ERROR,
+            message,
+            details,
+            duration,
+            success,
+            exc_info,
+            stack_info,
+            message_exc_info=True,
+        )
+
+    def _log(
+        self,
+        level: int,
+        message: Any,
+        details: Any,
+        duration: Optional[int],
+        success: bool,
+        exc_info: Any,
+        stack_info: bool,
+        message_exc_info: Any = None,
+    ) -> None:
+        if not self._logger.isEnabledFor(level):
+            return
+
+        # the message and the details are converted to strings by the handlers
+        # emitting the records
+        self._logger.log(
+            level,
+            message,
+            extra=_bar_msg_args(details, duration, success),
+            exc_info=exc_info if message_exc_info is None else message_exc_info,
             stack_info=stack_info,
-            exc_info=True,
             **self._logger_kwargs,
         )
         if details != "":
-            self._logger.error(
-                str(details),
+            self._logger.log(
+                level,
+                details,
                 exc_info=exc_info,
                 stack_info=stack_info,
                 **self._logger_kwargs,
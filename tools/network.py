@@ -1,27 +1,75 @@
+import bisect
+import functools
+import gzip
+import hashlib
+import io
 import json
 import logging
+import os
+import random
 import re
-import shutil
+import threading
+import time
+import zlib
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Dict, List, Literal, NamedTuple, Optional, Tuple
-from urllib.parse import urlencode
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Literal,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+from urllib.parse import quote, unquote, urlencode, urljoin, urlsplit
 from uuid import uuid4
 
-from qgis.core import Qgis, QgsBlockingNetworkRequest, QgsNetworkReplyContent
-from qgis.PyQt.QtCore import QByteArray, QSettings, QUrl
-from qgis.PyQt.QtNetwork import QNetworkReply, QNetworkRequest
+from qgis.core import (
+    Qgis,
+    QgsApplication,
+    QgsBlockingNetworkRequest,
+    QgsFeedback,
+    QgsNetworkAccessManager,
+    QgsNetworkReplyContent,
+)
+from qgis.PyQt.QtCore import QByteArray, QEventLoop, QIODevice, QSettings, QTimer, QUrl
+from qgis.PyQt.QtNetwork import QNetworkProxy, QNetworkReply, QNetworkRequest
 
-from ..tools.exceptions import QgsPluginNetworkException
+from ..tools.exceptions import (
+    QgsPluginNetworkException,
+    QgsPluginNotImplementedException,
+)
 from ..tools.i18n import tr
 from ..tools.resources import plugin_name
 from .custom_logging import bar_msg
+from .json_stream import iter_json_items
+from .network_limits import (
+    HTTP_TOO_MANY_REQUESTS,
+    WAIT_INTERVAL,
+    HostLimiter,
+    _parse_retry_after,
+    _wait,
+    _wait_until,
+    host_limiter,
+)
+from .network_metrics import RequestTimer
 
-try:
+if TYPE_CHECKING:
     import requests
-    from requests.exceptions import RequestException
+
+    from .network_cache import ResponseCache
+
+try:
+    import brotli
 except ImportError:
-    requests = None  # type: ignore
-    RequestException = None  # type: ignore
+    brotli = None
 
 __copyright__ = "Copyright 2020-2023, Gispo Ltd"
 __license__ = "GPL version 3"
@@ -35,10 +83,55 @@ CONTENT_DISPOSITION_BYTE_HEADER = QByteArray(
     bytes(CONTENT_DISPOSITION_HEADER, ENCODING)
 )
 
+MULTIPART_READ_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Minimum interval of download progress reports in seconds
+PROGRESS_INTERVAL = 0.1
+# Files smaller than this per segment are not split into segments
+MIN_SEGMENT_SIZE = 1024 * 1024
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+HTTP_PARTIAL_CONTENT = 206
+HTTP_RANGE_NOT_SATISFIABLE = 416
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_SIZE = 10
+# Qt opens at most six connections per host
+DEFAULT_CONCURRENCY = 6
+# Qt negotiates and decompresses gzip and deflate unless Accept-Encoding is set
+# by the caller, so the header is set only if brotli is supported as well
+ACCEPT_ENCODING = "gzip, deflate, br" if brotli is not None else None
+# Errors of requests that may succeed if tried again
+TRANSIENT_NETWORK_ERRORS = (
+    QNetworkReply.RemoteHostClosedError,
+    QNetworkReply.TimeoutError,
+    QNetworkReply.TemporaryNetworkFailureError,
+    QNetworkReply.NetworkSessionFailedError,
+    QNetworkReply.ProxyConnectionClosedError,
+    QNetworkReply.ProxyTimeoutError,
+    QNetworkReply.UnknownNetworkError,
+    QNetworkReply.ServiceUnavailableError,
+)
+
+T = TypeVar("T")
+# Links of the Link header, e.g. <https://example.com/items?page=2>; rel="next"
+_LINK_HEADER_PATTERN = re.compile(r"<([^>]*)>([^<]*)")
+_LINK_REL_PATTERN = re.compile(r'rel\s*=\s*"?([^";,]*)')
+HttpMethod = Literal["get", "head", "post", "put", "patch", "delete"]
+# Request body sent as is. QIODevice is streamed without reading it into memory
+RequestBody = Union[bytes, QByteArray, QIODevice]
+
+# shared requests sessions by plugin name
+_SESSIONS: Dict[str, "requests.Session"] = {}
+_SESSIONS_LOCK = threading.Lock()
+
+# identical GET and HEAD requests in flight by request key, blocking and async
+_IN_FLIGHT: Dict[Tuple[str, ...], "_InFlightRequest"] = {}
+_IN_FLIGHT_LOCK = threading.Lock()
+
 
 class FileInfo(NamedTuple):
     file_name: str
-    content: bytes
+    # bytes of the file or path to the file to stream it from the disk
+    content: Union[bytes, "os.PathLike"]
     content_type: str
 
 
@@ -47,11 +140,361 @@ class FileField(NamedTuple):
     file_info: FileInfo
 
 
+class DownloadProgress(NamedTuple):
+    bytes_received: int
+    # None if the server did not tell the size of the file
+    total_bytes: Optional[int]
+    bytes_per_second: float
+
+
+class MultipartEncoder:
+    """
+    Read-only file-like object producing multipart/form-data body of the files.
+
+    File contents given as paths are read lazily from the disk while the body
+    is read, so the whole body is never held in the memory at once.
+    Boundary is generated like
+    https://github.com/requests/toolbelt/blob/master/requests_toolbelt/multipart/encoder.py
+    """
+
+    def __init__(
+        self,
+        files: List[FileField],
+        encoding: str = ENCODING,
+        boundary: Optional[str] = None,
+    ) -> None:
+        """
+        :param files: Files to encode. Same format as requests.
+        :param encoding: Encoding used for the part headers
+        :param boundary: Boundary to use, random boundary is generated by default
+        """
+        self.boundary = boundary if boundary is not None else uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+
+        byte_boundary = bytes(f"\r\n--{self.boundary}\r\n", encoding)
+        last_byte_boundary = bytes(f"\r\n--{self.boundary}--\r\n", encoding)
+
+        # each file may have different content type, name and filename
+        self._parts: List[Union[bytes, Path]] = []
+        for name, (file_name, content, content_type) in files:
+            content_disposition_form_data = (
+                f"Content-Disposition: form-data;"
+                f' name="{name}";'
+                f' filename="{file_name}"\r\n'
+            )
+            content_type_form_data = f"Content-Type: {content_type}\r\n\r\n"
+            self._parts.append(
+                byte_boundary
+                + bytes(content_disposition_form_data, encoding)
+                + bytes(content_type_form_data, encoding)
+            )
+            self._parts.append(content if isinstance(content, bytes) else Path(content))
+        self._parts.append(last_byte_boundary)
+
+        self._part_offsets: List[int] = []
+        size = 0
+        for part in self._parts:
+            self._part_offsets.append(size)
+            size += len(part) if isinstance(part, bytes) else part.stat().st_size
+        self._size = size
+
+        self._position = 0
+        self._open_part_index: Optional[int] = None
+        self._open_file: Optional[IO[bytes]] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._position = min(max(offset, 0), self._size)
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        Read at most size bytes of the body, or the rest of the body if size
+        is negative.
+        """
+        if size < 0:
+            size = self._size - self._position
+        chunks: List[bytes] = []
+        while size > 0 and self._position < self._size:
+            part_index = bisect.bisect_right(self._part_offsets, self._position) - 1
+            part = self._parts[part_index]
+            position_in_part = self._position - self._part_offsets[part_index]
+            if isinstance(part, bytes):
+                chunk = part[position_in_part : position_in_part + size]
+            else:
+                chunk = self._read_file_part(part_index, part, position_in_part, size)
+                if not chunk:
+                    raise OSError(f"File {part} changed while reading it")
+            chunks.append(chunk)
+            self._position += len(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def close(self) -> None:
+        if self._open_file is not None:
+            self._open_file.close()
+        self._open_file = None
+        self._open_part_index = None
+
+    def _read_file_part(
+        self, part_index: int, path: Path, position_in_part: int, size: int
+    ) -> bytes:
+        if self._open_part_index != part_index:
+            self.close()
+            self._open_file = open(path, "rb")
+            self._open_part_index = part_index
+        assert self._open_file is not None
+        if self._open_file.tell() != position_in_part:
+            self._open_file.seek(position_in_part)
+        return self._open_file.read(min(size, MULTIPART_READ_CHUNK_SIZE))
+
+
+class _FileLikeDevice(QIODevice):
+    """
+    Read-only QIODevice reading lazily from a seekable file-like object.
+    Used to stream request bodies to Qt without copying them into QByteArray.
+    """
+
+    def __init__(self, file_like: MultipartEncoder, size: int) -> None:
+        super().__init__()
+        self._file_like = file_like
+        self._size = size
+        self.open(QIODevice.ReadOnly)
+
+    def isSequential(self) -> bool:  # noqa: N802
+        return False
+
+    def size(self) -> int:
+        return self._size
+
+    def seek(self, pos: int) -> bool:
+        self._file_like.seek(pos)
+        return super().seek(pos)
+
+    def readData(self, max_size: int) -> bytes:  # noqa: N802
+        return self._file_like.read(max_size)
+
+    def writeData(self, data: bytes) -> int:  # noqa: N802
+        return -1
+
+
+class RetryMetrics(NamedTuple):
+    attempts: int
+    retries: int
+    failures: int
+
+
+class RetryPolicy:
+    """
+    Policy for retrying failed requests with exponential backoff.
+
+    Only idempotent methods are retried, and only after connection failures,
+    timeouts or responses with one of the retry statuses. Delay between the
+    attempts grows exponentially and is randomized with full jitter, unless the
+    server tells how long to wait with Retry-After header.
+
+    >>> policy = RetryPolicy(max_attempts=5)
+    >>> request_raw("https://example.com/data.json", "get", retry_policy=policy)
+    >>> policy.metrics
+    RetryMetrics(attempts=2, retries=1, failures=0)
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        backoff_factor: float = 0.5,
+        max_backoff: float = 30.0,
+        jitter: bool = True,
+        retry_statuses: Tuple[int, ...] = (429, 502, 503, 504),
+        retry_methods: Tuple[str, ...] = ("get", "head", "put", "delete", "options"),
+        respect_retry_after: bool = True,
+    ) -> None:
+        """
+        :param max_attempts: Maximum number of attempts including the first one
+        :param backoff_factor: Delay before the first retry in seconds, doubled
+            after every retry
+        :param max_backoff: Maximum delay between the attempts in seconds. If the
+            server asks to wait longer with Retry-After, the request is not retried
+        :param jitter: Whether to randomize the delay between 0 and the backoff
+        :param retry_statuses: HTTP status codes of the responses to retry
+        :param retry_methods: Lower case names of the HTTP methods to retry
+        :param respect_retry_after: Whether to wait as long as Retry-After header
+            of the response tells
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = retry_statuses
+        self.retry_methods = retry_methods
+        self.respect_retry_after = respect_retry_after
+        self._attempts = 0
+        self._retries = 0
+        self._failures = 0
+        self._lock = threading.Lock()
+
+    @property
+    def metrics(self) -> RetryMetrics:
+        """Number of attempts, retries and failed requests made with the policy"""
+        with self._lock:
+            return RetryMetrics(self._attempts, self._retries, self._failures)
+
+    def call(self, method: str, request: Callable[[], T]) -> T:
+        """
+        Call the request until it succeeds or the policy gives up.
+        :param method: HTTP method of the request
+        :param request: Function making the request
+        :raises QgsPluginNetworkException: the error of the last attempt
+        """
+        attempt = 1
+        while True:
+            self._count(attempts=1)
+            try:
+                return request()
+            except QgsPluginNetworkException as e:
+                delay = self.retry_delay(method, attempt, e)
+                if delay is None:
+                    self._count(failures=1)
+                    raise
+                LOGGER.debug(
+                    f"Request failed with {e.error}, status {e.status_code}. "
+                    f"Retrying in {delay:.2f} seconds"
+                )
+                self._count(retries=1)
+                _wait(delay)
+                attempt += 1
+
+    def retry_delay(
+        self, method: str, attempt: int, exception: QgsPluginNetworkException
+    ) -> Optional[float]:
+        """
+        Delay in seconds before the next attempt or None if the failed
+        attempt should not be retried.
+        :param method: HTTP method of the request
+        :param attempt: Number of the failed attempt starting from 1
+        :param exception: Error of the failed attempt
+        """
+        if attempt >= self.max_attempts or method.lower() not in self.retry_methods:
+            return None
+        if exception.status_code is not None:
+            if exception.status_code not in self.retry_statuses:
+                return None
+        elif exception.error not in TRANSIENT_NETWORK_ERRORS:
+            return None
+
+        if self.respect_retry_after:
+            retry_after = _parse_retry_after(exception.headers.get("retry-after"))
+            if retry_after is not None:
+                return retry_after if retry_after <= self.max_backoff else None
+        return self.backoff(attempt)
+
+    def backoff(self, attempt: int) -> float:
+        """Delay after the failed attempt without Retry-After"""
+        delay = min(self.max_backoff, self.backoff_factor * 2 ** (attempt - 1))
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def _count(self, attempts: int = 0, retries: int = 0, failures: int = 0) -> None:
+        with self._lock:
+            self._attempts += attempts
+            self._retries += retries
+            self._failures += failures
+
+
+_default_retry_policy = RetryPolicy(max_attempts=1)
+
+
+def set_default_retry_policy(policy: RetryPolicy) -> None:
+    """
+    Set the retry policy of the requests that do not specify their own policy.
+    By default requests are not retried.
+    """
+    global _default_retry_policy
+    _default_retry_policy = policy
+
+
+class _InFlightRequest:
+    def __init__(self) -> None:
+        self.thread_id = threading.get_ident()
+        self.future: "Future[Any]" = Future()
+        self.future.set_running_or_notify_cancel()
+
+
+def _request_key(
+    method: str,
+    url: str,
+    params: Optional[Dict[str, str]],
+    authcfg_id: str,
+    encoding: str,
+    retry_policy: Optional["RetryPolicy"] = None,
+) -> Tuple[str, ...]:
+    """
+    Key of the request for sharing it with the identical requests in flight.
+    Requests that are not retried share regardless of the policy, retried
+    requests only with the requests retried by the same policy, which records
+    the metrics of the attempts.
+    :param retry_policy: Policy retrying the request or None if not retried
+    """
+    retried = retry_policy is not None and retry_policy.max_attempts > 1
+    return (
+        method,
+        url,
+        urlencode(sorted((params or {}).items())),
+        authcfg_id,
+        encoding,
+        str(id(retry_policy)) if retried else "",
+    )
+
+
+def _single_flight(key: Tuple[str, ...], request: Callable[[], T]) -> T:
+    """
+    Make the request or wait for the result of the identical request in flight.
+    Request in flight in the same thread is not waited for, since it may be
+    waiting for this request to finish in a nested event loop.
+    """
+    with _IN_FLIGHT_LOCK:
+        in_flight = _IN_FLIGHT.get(key)
+        if in_flight is None:
+            in_flight = _IN_FLIGHT[key] = _InFlightRequest()
+            leader = True
+        else:
+            leader = False
+
+    if not leader:
+        if in_flight.thread_id == threading.get_ident():
+            return request()
+        LOGGER.debug(f"Waiting for the identical request in flight: {key[1]}")
+        return _future_result(in_flight.future)
+
+    try:
+        result = request()
+    except BaseException as e:
+        with _IN_FLIGHT_LOCK:
+            del _IN_FLIGHT[key]
+        in_flight.future.set_exception(e)
+        raise
+    with _IN_FLIGHT_LOCK:
+        del _IN_FLIGHT[key]
+    in_flight.future.set_result(result)
+    return result
+
+
 def fetch(
     url: str,
     encoding: str = ENCODING,
     authcfg_id: str = "",
     params: Optional[Dict[str, str]] = None,
+    cache: Optional["ResponseCache"] = None,
 ) -> str:
     """
     Fetch resource from the internet. Similar to requests.get(url) but is
@@ -60,9 +503,10 @@ def fetch(
     :param encoding: Encoding which will be used to decode the bytes
     :param authcfg_id: authcfg id from QGIS settings, defaults to ''
     :param params: Dictionary to send in the query string
+    :param cache: Optional response cache to use, see network_cache.ResponseCache
     :return: encoded string of the content
     """
-    content, _ = fetch_raw(url, encoding, authcfg_id, params)
+    content, _ = fetch_raw(url, encoding, authcfg_id, params, cache)
     return content.decode(ENCODING)
 
 
@@ -81,6 +525,7 @@ def post(
     :param authcfg_id: authcfg id from QGIS settings, defaults to ''
     :param data: Dictionary to send in the request body
     :param files: Files to send multipart-encoded. Same format as requests.
+    File content may also be a path to stream the file from the disk.
     :return: encoded string of the content
     """
     content, _ = post_raw(url, encoding, authcfg_id, data, files)
@@ -92,6 +537,7 @@ def fetch_raw(
     encoding: str = ENCODING,
     authcfg_id: str = "",
     params: Optional[Dict[str, str]] = None,
+    cache: Optional["ResponseCache"] = None,
 ) -> Tuple[bytes, str]:
     """
     Fetch resource from the internet. Similar to requests.get(url) but is
@@ -100,8 +546,11 @@ def fetch_raw(
     :param encoding: Encoding which will be used to decode the bytes
     :param authcfg_id: authcfg id from QGIS settings, defaults to ''
     :param params: Dictionary to send in the query string
+    :param cache: Optional response cache to use, see network_cache.ResponseCache
     :return: bytes of the content and default name of the file or empty string
     """
+    if cache is not None:
+        return cache.fetch_raw(url, encoding, authcfg_id, params)
     return request_raw(url, "get", encoding, authcfg_id, params)
 
 
@@ -111,6 +560,7 @@ def post_raw(
     authcfg_id: str = "",
     data: Optional[Dict[str, str]] = None,
     files: Optional[List[FileField]] = None,
+    gzip_data: bool = False,
 ) -> Tuple[bytes, str]:
     """
     Post resource. Similar to requests.post(url, data, files) but is
@@ -120,121 +570,1101 @@ def post_raw(
     :param authcfg_id: authcfg id from QGIS settings, defaults to ''
     :param data: Dictionary to send in the request body
     :param files: Files to send multipart-encoded. Same format as requests.
+    File content may also be a path to stream the file from the disk.
+    :param gzip_data: Whether to compress the JSON body with gzip. The server
+    must support Content-Encoding: gzip in requests.
     :return: bytes of the content and default name of the file or empty string
     """
-    return request_raw(url, "post", encoding, authcfg_id, None, data, files)
+    return request_raw(
+        url, "post", encoding, authcfg_id, None, data, files, gzip_data=gzip_data
+    )
+
+
+def head(
+    url: str,
+    encoding: str = ENCODING,
+    authcfg_id: str = "",
+    params: Optional[Dict[str, str]] = None,
+) -> Dict[str, str]:
+    """
+    Request only the headers of the resource, for example to check its size
+    or ETag before downloading it. Concurrent identical calls share a single
+    request and its result.
+    :param url: address of the web resource
+    :param encoding: Encoding which will be used to decode the headers
+    :param authcfg_id: authcfg id from QGIS settings, defaults to ''
+    :param params: Dictionary to send in the query string
+    :return: response headers with lower case names
+    """
+
+    def send() -> Dict[str, str]:
+        reply = _send_request(
+            url,
+            "head",
+            encoding,
+            authcfg_id,
+            params,
+            # size of the uncompressed resource
+            headers={"Accept-Encoding": "identity"},
+        )
+        return _reply_headers(reply, encoding)
+
+    # the headers are requested differently than in request_raw
+    key = (
+        *_request_key("head", url, params, authcfg_id, encoding, _default_retry_policy),
+        "headers",
+    )
+    return _single_flight(key, send)
 
 
 def request_raw(
     url: str,
-    method: Literal["get", "post"] = "get",
+    method: HttpMethod = "get",
     encoding: str = ENCODING,
     authcfg_id: str = "",
     params: Optional[Dict[str, str]] = None,
     data: Optional[Dict[str, str]] = None,
     files: Optional[List[FileField]] = None,
+    retry_policy: Optional["RetryPolicy"] = None,
+    gzip_data: bool = False,
+    body: Optional[RequestBody] = None,
+    content_type: Optional[str] = None,
 ) -> Tuple[bytes, str]:
     """
-    Request resource from the internet. Similar to requests.get(url) and
-    requests.post(url, data) but is recommended way of handling requests in QGIS plugin
+    Request resource from the internet. Similar to requests.request(method, url)
+    but is recommended way of handling requests in QGIS plugin
+
+    Compressed responses are requested and decompressed transparently.
+    Concurrent identical GET and HEAD requests share a single request and
+    its result, also with fetch_raw_async. Retried requests are shared only
+    if retried by the same policy.
     :param url: address of the web resource
     :param method: method to use, defaults to 'get'
     :param encoding: Encoding which will be used to decode the bytes
     :param authcfg_id: authcfg id from QGIS settings, defaults to ''
     :param params: Dictionary to send in the query string
-    :param data: Dictionary to send in the request body
+    :param data: Dictionary to send in the request body as JSON
     :param files: Files to send multipart-encoded. Same format as requests.
+    File content may also be a path to stream the file from the disk.
+    :param retry_policy: Policy for retrying transient failures, defaults to the
+    policy set with set_default_retry_policy
+    :param gzip_data: Whether to compress the JSON body with gzip
+    :param body: Already encoded request body sent as is instead of data or
+    files. A QIODevice is streamed to the server and must stay open until the
+    request is finished. Only seekable devices can be sent again on retry.
+    :param content_type: Content-Type of the body
     :return: bytes of the content and default name of the file or empty string
     """
+
+    def send() -> Tuple[bytes, str]:
+        reply = _send_request(
+            url,
+            method,
+            encoding,
+            authcfg_id,
+            params,
+            data,
+            files,
+            retry_policy=retry_policy,
+            gzip_data=gzip_data,
+            body=body,
+            content_type=content_type,
+        )
+        return bytes(reply.content()), _default_file_name(reply, encoding)
+
+    if method not in ("get", "head"):
+        return send()
+    key = _request_key(
+        method,
+        url,
+        params,
+        authcfg_id,
+        encoding,
+        retry_policy or _default_retry_policy,
+    )
+    return _single_flight(key, send)
+
+
+def _send_request(
+    url: str,
+    method: HttpMethod = "get",
+    encoding: str = ENCODING,
+    authcfg_id: str = "",
+    params: Optional[Dict[str, str]] = None,
+    data: Optional[Dict[str, str]] = None,
+    files: Optional[List[FileField]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    force_refresh: bool = False,
+    retry_policy: Optional["RetryPolicy"] = None,
+    gzip_data: bool = False,
+    body: Optional[RequestBody] = None,
+    content_type: Optional[str] = None,
+    plugin: Optional[str] = None,
+) -> QgsNetworkReplyContent:
+    """
+    Send blocking request and return the whole reply with decompressed content.
+    :param headers: Extra headers of the request
+    :param force_refresh: Whether to bypass the QGIS network cache
+    :param retry_policy: Policy for retrying transient failures, defaults to the
+        policy set with set_default_retry_policy
+    :param gzip_data: Whether to compress the JSON body with gzip
+    :param body: Already encoded request body sent as is
+    :param content_type: Content-Type of the body
+    :param plugin: Name of the plugin sending the request, defaults to the calling
+        plugin. Pass it when sending from a worker thread.
+    :raises QgsPluginNetworkException: if the request fails
+    """
+    policy = retry_policy if retry_policy is not None else _default_retry_policy
+    timer = RequestTimer(url, method)
+    if content_type is not None:
+        headers = {**(headers or {}), "Content-Type": content_type}
+    body_position = body.pos() if isinstance(body, QIODevice) else 0
+
+    def attempt() -> QgsNetworkReplyContent:
+        if isinstance(body, QIODevice) and timer.attempts:
+            # rewind the body consumed by the previous attempt
+            body.seek(body_position)
+        with host_limiter(url, plugin).limit():
+            return _send_request_once(
+                url,
+                method,
+                encoding,
+                authcfg_id,
+                params,
+                data,
+                files,
+                headers,
+                force_refresh,
+                gzip_data,
+                body,
+                timer,
+                plugin,
+            )
+
+    try:
+        reply = policy.call(method, attempt)
+    except Exception as e:
+        timer.finish(e)
+        raise
+    timer.finish()
+    return reply
+
+
+def _send_request_once(
+    url: str,
+    method: HttpMethod,
+    encoding: str,
+    authcfg_id: str,
+    params: Optional[Dict[str, str]],
+    data: Optional[Dict[str, str]],
+    files: Optional[List[FileField]],
+    headers: Optional[Dict[str, str]],
+    force_refresh: bool,
+    gzip_data: bool,
+    body: Optional[RequestBody],
+    timer: RequestTimer,
+    plugin: Optional[str],
+) -> QgsNetworkReplyContent:
+    timer.start_attempt()
+    # responses are decompressed here only if Qt does not do it
+    decompress = False
+    if ACCEPT_ENCODING is not None and "Accept-Encoding" not in (headers or {}):
+        decompress = True
+        headers = {**(headers or {}), "Accept-Encoding": ACCEPT_ENCODING}
+    req = _build_request(url, encoding, params, headers, plugin)
+    request_blocking = QgsBlockingNetworkRequest()
+    if authcfg_id:
+        request_blocking.setAuthCfg(authcfg_id)
+    request_blocking.downloadProgress.connect(lambda *_: timer.first_byte())
+    multipart_encoder: Optional[MultipartEncoder] = None
+    body_device: Optional[_FileLikeDevice] = None
+    payload: RequestBody = b""
+    if body is not None:
+        payload = body
+    elif data:
+        # Support JSON
+        payload = bytes(json.dumps(data), encoding)
+        req.setRawHeader(
+            b"Content-Type",
+            bytes(f"application/json; charset={encoding}", encoding),
+        )
+        if gzip_data:
+            payload = gzip.compress(payload)
+            req.setRawHeader(b"Content-Encoding", b"gzip")
+    elif files:
+        # Support multipart binary. Body is streamed from the encoder
+        # so the files are not copied into memory.
+        multipart_encoder = MultipartEncoder(files, encoding)
+        payload = body_device = _FileLikeDevice(
+            multipart_encoder, len(multipart_encoder)
+        )
+        req.setRawHeader(
+            b"Content-Type", bytes(multipart_encoder.content_type, encoding)
+        )
+        req.setHeader(QNetworkRequest.ContentLengthHeader, len(multipart_encoder))
+    timer.bytes_sent += _body_size(payload)
+
+    try:
+        if method == "get":
+            _ = request_blocking.get(req, force_refresh)
+        elif method == "head":
+            _ = request_blocking.head(req)
+        elif method == "delete":
+            _ = request_blocking.deleteResource(req)
+        elif method == "post":
+            _ = request_blocking.post(req, payload)
+        elif method == "put":
+            _ = request_blocking.put(req, payload)
+        elif method == "patch":
+            # QgsBlockingNetworkRequest does not support custom verbs
+            return _send_custom_request(
+                req, b"PATCH", payload, authcfg_id, encoding, decompress, timer
+            )
+        else:
+            raise QgsPluginNotImplementedException(
+                tr("Request method {} not supported", method)
+            )
+    finally:
+        if body_device is not None and multipart_encoder is not None:
+            body_device.close()
+            multipart_encoder.close()
+    reply: QgsNetworkReplyContent = request_blocking.reply()
+    timer.status_code = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+    timer.bytes_received += reply.content().size()
+    if decompress:
+        reply.setContent(
+            QByteArray(
+                _decompress(bytes(reply.content()), _reply_headers(reply, encoding))
+            )
+        )
+    _raise_for_reply_error(
+        reply.error(),
+        reply.errorString(),
+        bytes(reply.content()),
+        reply.attribute(QNetworkRequest.HttpStatusCodeAttribute),
+        _reply_headers(reply, encoding),
+    )
+    return reply
+
+
+def _send_custom_request(
+    req: QNetworkRequest,
+    verb: bytes,
+    payload: RequestBody,
+    authcfg_id: str,
+    encoding: str,
+    decompress: bool,
+    timer: RequestTimer,
+) -> QgsNetworkReplyContent:
+    """
+    Send request with a custom verb and wait for the reply in an event loop.
+    Like QgsBlockingNetworkRequest, the reply is updated with the authentication
+    configuration and aborted if there is no progress within the network timeout.
+    """
+    if authcfg_id and not QgsApplication.authManager().updateNetworkRequest(
+        req, authcfg_id
+    ):
+        raise QgsPluginNetworkException(
+            tr("Could not apply authentication configuration {}", authcfg_id)
+        )
+    reply = QgsNetworkAccessManager.instance().sendCustomRequest(req, verb, payload)
+    if authcfg_id:
+        QgsApplication.authManager().updateNetworkReply(reply, authcfg_id)
+    reply.metaDataChanged.connect(timer.first_byte)
+
+    timed_out = False
+
+    def on_timeout() -> None:
+        nonlocal timed_out
+        timed_out = True
+        reply.abort()
+
+    timeout = QTimer()
+    timeout.setSingleShot(True)
+    timeout.setInterval(QgsNetworkAccessManager.timeout())
+    timeout.timeout.connect(on_timeout)
+    reply.downloadProgress.connect(lambda *_: timeout.start())
+    reply.uploadProgress.connect(lambda *_: timeout.start())
+    loop = QEventLoop()
+    reply.finished.connect(loop.quit)
+    if not reply.isFinished():
+        timeout.start()
+        loop.exec_()
+    timeout.stop()
+    content = bytes(reply.readAll())
+    reply.deleteLater()
+
+    reply_content = QgsNetworkReplyContent(reply)
+    reply_content.setContent(QByteArray(content))
+    status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+    headers = _reply_headers(reply, encoding)
+    timer.status_code = status
+    timer.bytes_received += len(content)
+    if decompress:
+        content = _decompress(content, headers)
+        reply_content.setContent(QByteArray(content))
+    _raise_for_reply_error(
+        QNetworkReply.TimeoutError if timed_out else reply.error(),
+        reply.errorString(),
+        content,
+        status,
+        headers,
+    )
+    return reply_content
+
+
+def _body_size(payload: RequestBody) -> int:
+    if isinstance(payload, QIODevice):
+        return 0 if payload.isSequential() else payload.size() - payload.pos()
+    return len(payload)
+
+
+def fetch_json_stream(
+    url: str,
+    path: str = "features",
+    encoding: str = ENCODING,
+    authcfg_id: str = "",
+    params: Optional[Dict[str, str]] = None,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    use_requests_if_available: bool = True,
+) -> Iterator[Any]:
+    """
+    Fetch JSON document and yield the items of an array in it as they arrive.
+
+    The response is decoded incrementally, so memory use does not grow with
+    the size of the response and the items can be processed before the
+    download is finished. The request is sent when the iteration starts.
+
+    >>> for feature in fetch_json_stream("https://example.com/items.geojson"):
+    >>>     layer.addFeature(to_feature(feature))
+    :param url: address of the web resource
+    :param path: Dot separated keys of the objects containing the array,
+    e.g. "features" or "result.items". Empty for a top level array
+    :param encoding: Encoding which will be used to decode the bytes
+    :param authcfg_id: authcfg id from QGIS settings, defaults to ''.
+    Requests is not used with authentication configuration.
+    :param params: Dictionary to send in the query string
+    :param chunk_size: Maximum size of the chunk kept in memory in bytes
+    :param use_requests_if_available: Use Python package requests
+    if it is available in the environment
+    :return: iterator of the decoded items of the array
+    :raises QgsPluginNetworkException: if the request fails
+    :raises ValueError: if the response does not contain the array
+    """
+    if use_requests_if_available and _import_requests() is not None and not authcfg_id:
+        chunks = _iter_content_with_requests(url, params, chunk_size)
+    else:
+        chunks = _iter_content_with_qgis(url, encoding, authcfg_id, params, chunk_size)
+    return iter_json_items(
+        _timed_chunks(
+            RequestTimer(url, "get"), _limited_chunks(host_limiter(url), chunks)
+        ),
+        path,
+        encoding,
+    )
+
+
+def _limited_chunks(limiter: HostLimiter, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Hold the connection slot of the host until the response is read"""
+    with limiter.limit():
+        yield from chunks
+
+
+def _timed_chunks(timer: RequestTimer, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    timer.start_attempt()
+    error: Optional[Exception] = None
+    try:
+        for chunk in chunks:
+            timer.first_byte()
+            timer.bytes_received += len(chunk)
+            yield chunk
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        timer.finish(error)
+
+
+def fetch_paged(
+    url: str,
+    path: str = "features",
+    encoding: str = ENCODING,
+    authcfg_id: str = "",
+    params: Optional[Dict[str, str]] = None,
+    offset_param: Optional[str] = None,
+    limit_param: str = "limit",
+    page_size: Optional[int] = None,
+    max_pages: Optional[int] = None,
+) -> Iterator[Any]:
+    """
+    Fetch the pages of a paged JSON API and yield the records of the pages.
+
+    The next page is found from the Link header with rel="next", from a
+    "links" array of the page with rel "next" (OGC API Features, STAC) or
+    from a "next" url of the page. If the page has no next link and
+    offset_param is given, the next page is requested with the offset
+    increased by the number of records received.
+
+    The next page is fetched in the background while the records of the
+    current page are processed. Only the current and the next page are kept
+    in memory.
+
+    >>> for feature in fetch_paged("https://example.com/collections/a/items"):
+    >>>     layer.addFeature(to_feature(feature))
+    :param url: address of the first page
+    :param path: Dot separated keys of the objects containing the records,
+    e.g. "features" or "result.items". Empty if the page is the array
+    :param encoding: Encoding which will be used to decode the bytes
+    :param authcfg_id: authcfg id from QGIS settings, defaults to ''
+    :param params: Dictionary to send in the query string of the first page and
+    the offset pages. Next links contain their own query string.
+    :param offset_param: Name of the query parameter of the record offset
+    :param limit_param: Name of the query parameter of the page size
+    :param page_size: Number of records requested per page with offset_param.
+    A page with fewer records is the last page.
+    :param max_pages: Maximum number of pages to fetch, defaults to unlimited
+    :return: iterator of the records of the pages
+    :raises QgsPluginNetworkException: if a request fails
+    :raises ValueError: if a page does not contain the records
+    """
+
+    def page_params(offset: int) -> Optional[Dict[str, str]]:
+        if offset_param is None:
+            return params
+        query = {**(params or {}), offset_param: str(offset)}
+        if page_size is not None:
+            query[limit_param] = str(page_size)
+        return query
+
+    offset = int((params or {}).get(offset_param, 0)) if offset_param else 0
+    # resolved here, since the plugin is not found from the worker thread stack
+    plugin = plugin_name()
+    executor = ThreadPoolExecutor(1, thread_name_prefix="fetch_paged")
+    page_url = url
+    future: Optional["Future[Tuple[Any, Dict[str, str]]]"] = executor.submit(
+        _fetch_page, page_url, encoding, authcfg_id, page_params(offset), plugin
+    )
+    pages = 0
+    try:
+        while future is not None:
+            document, headers = _future_result(future)
+            records = _json_records(document, path)
+            pages += 1
+            next_url = _next_page_url(document, headers, page_url)
+            next_page: Optional[Tuple[str, Optional[Dict[str, str]]]] = None
+            if next_url is not None:
+                # a page linking to itself is the last page
+                if next_url != page_url:
+                    next_page = next_url, None
+            elif (
+                offset_param is not None
+                and records
+                and (page_size is None or len(records) >= page_size)
+            ):
+                offset += len(records)
+                next_page = page_url, page_params(offset)
+
+            future = None
+            if next_page is not None and (max_pages is None or pages < max_pages):
+                page_url = next_page[0]
+                future = executor.submit(
+                    _fetch_page, page_url, encoding, authcfg_id, next_page[1], plugin
+                )
+            yield from records
+    finally:
+        if future is not None:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def _fetch_page(
+    url: str,
+    encoding: str,
+    authcfg_id: str,
+    params: Optional[Dict[str, str]],
+    plugin: str,
+) -> Tuple[Any, Dict[str, str]]:
+    reply = _send_request(url, "get", encoding, authcfg_id, params, plugin=plugin)
+    headers = _reply_headers(reply, encoding)
+    return json.loads(bytes(reply.content()).decode(encoding)), headers
+
+
+def _future_result(future: "Future[T]") -> T:
+    """Result of the future, waited for without freezing the user interface"""
+    _wait_until(lambda timeout=None: not wait([future], timeout).not_done)
+    return future.result()
+
+
+def _json_records(document: Any, path: str) -> List[Any]:
+    records = document
+    for key in path.split(".") if path else []:
+        if not isinstance(records, dict) or key not in records:
+            raise ValueError(f"JSON document does not contain array {path}")
+        records = records[key]
+    if not isinstance(records, list):
+        raise ValueError(f"JSON document does not contain array {path}")
+    return records
+
+
+def _next_page_url(document: Any, headers: Dict[str, str], url: str) -> Optional[str]:
+    """Url of the next page from the Link header or the links of the document"""
+    next_url = None
+    for match in _LINK_HEADER_PATTERN.finditer(headers.get("link", "")):
+        rel = _LINK_REL_PATTERN.search(match.group(2))
+        if rel is not None and "next" in rel.group(1).split():
+            next_url = match.group(1)
+            break
+    if next_url is None and isinstance(document, dict):
+        links = document.get("links")
+        for link in links if isinstance(links, list) else []:
+            if isinstance(link, dict) and link.get("rel") == "next":
+                next_url = link.get("href")
+                break
+        if next_url is None and isinstance(document.get("next"), str):
+            next_url = document["next"]
+    return urljoin(url, next_url) if next_url else None
+
+
+def _iter_content_with_requests(
+    url: str, params: Optional[Dict[str, str]], chunk_size: int
+) -> Iterator[bytes]:
+    try:
+        with requests_session().get(url, params=params, stream=True) as r:
+            if not r.ok:
+                raise _requests_status_exception(r)
+            yield from r.iter_content(chunk_size)
+    except _import_requests().RequestException as e:
+        raise _requests_exception(e)
+
+
+def _iter_content_with_qgis(
+    url: str,
+    encoding: str,
+    authcfg_id: str,
+    params: Optional[Dict[str, str]],
+    chunk_size: int,
+) -> Iterator[bytes]:
+    headers = {"Accept-Encoding": ACCEPT_ENCODING} if ACCEPT_ENCODING else None
+    req = _build_request(url, encoding, params, headers)
+    req.setAttribute(
+        QNetworkRequest.RedirectPolicyAttribute,
+        QNetworkRequest.NoLessSafeRedirectPolicy,
+    )
+    if authcfg_id:
+        QgsApplication.authManager().updateNetworkRequest(req, authcfg_id)
+    reply = QgsNetworkAccessManager.instance().get(req)
+    if authcfg_id:
+        QgsApplication.authManager().updateNetworkReply(reply, authcfg_id)
+    # Do not let Qt buffer more than one chunk in memory
+    reply.setReadBufferSize(chunk_size)
+
+    loop = QEventLoop()
+    reply.readyRead.connect(loop.quit)
+    reply.finished.connect(loop.quit)
+    error_content = b""
+    decoder: Optional[_ContentDecoder] = None
+    try:
+        while not reply.isFinished() or reply.bytesAvailable():
+            if not reply.bytesAvailable():
+                loop.exec_()
+                continue
+            status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+            if status is not None and status >= 400:
+                error_content += bytes(reply.readAll())
+                continue
+            if decoder is None:
+                decoder = _ContentDecoder(
+                    _reply_headers(reply, encoding).get("content-encoding", "")
+                    if headers
+                    else ""
+                )
+            yield decoder.decompress(bytes(reply.read(chunk_size)))
+        if decoder is not None and reply.error() == QNetworkReply.NoError:
+            yield decoder.flush()
+        _raise_for_reply_error(
+            reply.error(),
+            reply.errorString(),
+            error_content,
+            reply.attribute(QNetworkRequest.HttpStatusCodeAttribute),
+            _reply_headers(reply, encoding),
+        )
+    finally:
+        if not reply.isFinished():
+            # iteration was stopped before the end of the response
+            reply.abort()
+        reply.deleteLater()
+
+
+def fetch_many(
+    urls: List[str],
+    encoding: str = ENCODING,
+    authcfg_id: str = "",
+    params: Optional[Dict[str, str]] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> List[str]:
+    """
+    Fetch multiple resources concurrently. Blocks until all the resources
+    have been fetched.
+    :param urls: addresses of the web resources
+    :param encoding: Encoding which will be used to decode the bytes
+    :param authcfg_id: authcfg id from QGIS settings, defaults to ''
+    :param params: Dictionary to send in the query string of every request
+    :param concurrency: Maximum number of simultaneous requests
+    :return: encoded strings of the contents in the same order as the urls
+    """
+    return [
+        content.decode(encoding)
+        for content, _ in fetch_raw_many(
+            urls, encoding, authcfg_id, params, concurrency
+        )
+    ]
+
+
+def fetch_raw_many(
+    urls: List[str],
+    encoding: str = ENCODING,
+    authcfg_id: str = "",
+    params: Optional[Dict[str, str]] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> List[Tuple[bytes, str]]:
+    """
+    Fetch multiple resources concurrently. Blocks until all the resources
+    have been fetched, so the total time is close to the slowest request
+    instead of the sum of all requests.
+    :param urls: addresses of the web resources
+    :param encoding: Encoding which will be used to decode the bytes
+    :param authcfg_id: authcfg id from QGIS settings, defaults to ''
+    :param params: Dictionary to send in the query string of every request
+    :param concurrency: Maximum number of simultaneous requests
+    :return: bytes of the contents and default names of the files or empty strings
+        in the same order as the urls
+    :raises QgsPluginNetworkException: error of the first failed url after all
+        the requests have finished
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+
+    futures: List["Future[Tuple[bytes, str]]"] = []
+    loop = QEventLoop()
+    # the requests are also started from the callbacks, where the plugin is not
+    # found from the stack
+    plugin = plugin_name()
+
+    def start_next() -> None:
+        if len(futures) < len(urls):
+            future = _fetch_raw_async(
+                urls[len(futures)], encoding, authcfg_id, params, plugin
+            )
+            futures.append(future)
+            future.add_done_callback(on_done)
+
+    def on_done(_: "Future[Tuple[bytes, str]]") -> None:
+        start_next()
+        if len(futures) == len(urls) and all(f.done() for f in futures):
+            loop.quit()
+
+    for _ in range(min(concurrency, len(urls))):
+        start_next()
+    if not all(f.done() for f in futures) or len(futures) < len(urls):
+        loop.exec_()
+
+    return [future.result() for future in futures]
+
+
+def fetch_raw_async(
+    url: str,
+    encoding: str = ENCODING,
+    authcfg_id: str = "",
+    params: Optional[Dict[str, str]] = None,
+) -> "Future[Tuple[bytes, str]]":
+    """
+    Start fetching resource from the internet without blocking.
+
+    The request is run by the QgsNetworkAccessManager of the calling thread, so
+    the thread must run an event loop (QGIS main thread or QEventLoop) until the
+    future is done. Use asyncio.wrap_future to await the result in a coroutine
+    when running asyncio on top of the Qt event loop.
+    :param url: address of the web resource
+    :param encoding: Encoding which will be used to decode the bytes
+    :param authcfg_id: authcfg id from QGIS settings, defaults to ''
+    :param params: Dictionary to send in the query string
+    :return: future resolving to bytes of the content and default name of the file
+        or empty string, or to QgsPluginNetworkException. Concurrent identical
+        requests share a single request, also with the blocking requests that
+        are not retried.
+    """
+    return _fetch_raw_async(url, encoding, authcfg_id, params, plugin_name())
+
+
+def _fetch_raw_async(
+    url: str,
+    encoding: str,
+    authcfg_id: str,
+    params: Optional[Dict[str, str]],
+    plugin: str,
+) -> "Future[Tuple[bytes, str]]":
+    # async requests are not retried
+    key = _request_key("get", url, params, authcfg_id, encoding)
+    with _IN_FLIGHT_LOCK:
+        in_flight = _IN_FLIGHT.get(key)
+        if in_flight is None:
+            in_flight = _IN_FLIGHT[key] = _InFlightRequest()
+            leader = True
+        else:
+            leader = False
+    if not leader:
+        if in_flight.thread_id == threading.get_ident():
+            return in_flight.future
+        return _follow_in_this_thread(in_flight.future)
+    future: "Future[Tuple[bytes, str]]" = in_flight.future
+
+    req = _build_request(url, encoding, params, plugin=plugin)
+    if authcfg_id:
+        QgsApplication.authManager().updateNetworkRequest(req, authcfg_id)
+    limiter = host_limiter(url, plugin)
+    timer = RequestTimer(url, "get")
+
+    def start() -> None:
+        if not limiter.try_acquire():
+            # try again when the host may allow more requests
+            QTimer.singleShot(int(WAIT_INTERVAL * 1000), start)
+            return
+        timer.start_attempt()
+        reply = QgsNetworkAccessManager.instance().get(req)
+        if authcfg_id:
+            QgsApplication.authManager().updateNetworkReply(reply, authcfg_id)
+
+        def on_finished() -> None:
+            limiter.release()
+            with _IN_FLIGHT_LOCK:
+                del _IN_FLIGHT[key]
+            try:
+                content = bytes(reply.readAll())
+                timer.status_code = reply.attribute(
+                    QNetworkRequest.HttpStatusCodeAttribute
+                )
+                timer.bytes_received += len(content)
+                _raise_for_reply_error(
+                    reply.error(),
+                    reply.errorString(),
+                    content,
+                    timer.status_code,
+                    _reply_headers(reply, encoding),
+                )
+                timer.finish()
+                future.set_result((content, _default_file_name(reply, encoding)))
+            except Exception as e:
+                # any error must complete the future, or its waiters wait forever
+                if (
+                    isinstance(e, QgsPluginNetworkException)
+                    and e.status_code == HTTP_TOO_MANY_REQUESTS
+                ):
+                    limiter.throttled(e.headers.get("retry-after"))
+                timer.finish(e)
+                future.set_exception(e)
+            finally:
+                reply.deleteLater()
+
+        reply.metaDataChanged.connect(timer.first_byte)
+        reply.finished.connect(on_finished)
+
+    start()
+    return future
+
+
+def _follow_in_this_thread(future: "Future[T]") -> "Future[T]":
+    """
+    Future completed in the calling thread when the future of another thread is,
+    so that its done callbacks run in the event loop of the calling thread.
+    """
+    follower: "Future[T]" = Future()
+    follower.set_running_or_notify_cancel()
+
+    def poll() -> None:
+        if not future.done():
+            QTimer.singleShot(int(WAIT_INTERVAL * 1000), poll)
+            return
+        error = future.exception()
+        if error is not None:
+            follower.set_exception(error)
+        else:
+            follower.set_result(future.result())
+
+    poll()
+    return follower
+
+
+def _build_request(
+    url: str,
+    encoding: str = ENCODING,
+    params: Optional[Dict[str, str]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    plugin: Optional[str] = None,
+) -> QNetworkRequest:
+    """
+    Build request with the QGIS user agent and extra headers
+    :param plugin: Name of the plugin in the user agent, defaults to the calling
+        plugin. Pass it when building the request in a worker thread or callback.
+    """
     if params:
         url += "?" + urlencode(params)
     LOGGER.debug(url)
     req = QNetworkRequest(QUrl(url))
+    # https://www.riverbankcomputing.com/pipermail/pyqt/2016-May/037514.html
+    req.setRawHeader(b"User-Agent", bytes(_user_agent(plugin), encoding))
+    for name, value in (headers or {}).items():
+        req.setRawHeader(bytes(name, encoding), bytes(value, encoding))
+    return req
+
+
+def _user_agent(plugin: Optional[str] = None) -> str:
     # http://osgeo-org.1560.x6.nabble.com/QGIS-Developer-Do-we-have-a-User-Agent-string-for-QGIS-td5360740.html
     user_agent = QSettings().value("/qgis/networkAndProxy/userAgent", "Mozilla/5.0")
     user_agent += " " if len(user_agent) else ""
     # noinspection PyUnresolvedReferences
     user_agent += f"QGIS/{Qgis.QGIS_VERSION_INT}"
-    user_agent += f" {plugin_name()}"
-    # https://www.riverbankcomputing.com/pipermail/pyqt/2016-May/037514.html
-    req.setRawHeader(b"User-Agent", bytes(user_agent, encoding))
-    request_blocking = QgsBlockingNetworkRequest()
-    if authcfg_id:
-        request_blocking.setAuthCfg(authcfg_id)
-    # QNetworkRequest *only* supports get and post. No idea why.
-    if method == "get":
-        _ = request_blocking.get(req)
-    elif method == "post":
-        if data:
-            # Support JSON
-            byte_data = bytes(json.dumps(data), encoding)
-            req.setRawHeader(
-                b"Content-Type",
-                bytes(f"application/json; charset={encoding}", encoding),
-            )
-        elif files:
-            # Support multipart binary. Generate boundary like
-            # https://github.com/requests/toolbelt/blob/master/requests_toolbelt/multipart/encoder.py
-            boundary = uuid4().hex
-            byte_boundary = bytes(f"\r\n--{boundary}\r\n", encoding)
-            last_byte_boundary = bytes(f"\r\n--{boundary}--\r\n", encoding)
-
-            # each file may have different content type, name and filename
-            byte_data = b""
-            for file_field in files:
-                name = file_field[0]
-                file_info = file_field[1]
-                file_name = file_info[0]
-                content = file_info[1]
-                content_type = file_info[2]
-                content_disposition_form_data = (
-                    f"Content-Disposition: form-data;"
-                    f' name="{name}";'
-                    f' filename="{file_name}"\r\n'
-                )
-                content_type_form_data = f"Content-Type: {content_type}\r\n\r\n"
-                byte_boundary_with_headers = (
-                    byte_boundary
-                    + bytes(content_disposition_form_data, encoding)
-                    + bytes(content_type_form_data, encoding)
-                )
-                byte_data += byte_boundary_with_headers + content
-            byte_data += last_byte_boundary
-            req.setRawHeader(
-                b"Content-Type",
-                bytes(f"multipart/form-data; boundary={boundary}", encoding),
-            )
-        else:
-            byte_data = b""
-        _ = request_blocking.post(req, byte_data)
-    else:
-        raise Exception(f"Request method {method} not supported.")
-    reply: QgsNetworkReplyContent = request_blocking.reply()
-    reply_error = reply.error()
+    user_agent += f" {plugin or plugin_name()}"
+    return user_agent
+
+
+def _raise_for_reply_error(
+    reply_error: QNetworkReply.NetworkError,
+    error_string: str,
+    content: bytes,
+    status_code: Optional[int] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> None:
     if reply_error != QNetworkReply.NoError:
         # Error content will be empty in older QGIS versions:
         # https://github.com/qgis/QGIS/issues/42442
-        message = (
-            bytes(reply.content()).decode("utf-8")
-            if len(bytes(reply.content()))
-            else None
-        )
+        message = content.decode("utf-8") if len(content) else None
         # bar_msg will just show a generic Qt error string.
         raise QgsPluginNetworkException(
             message=message,
             error=reply_error,
-            bar_msg=bar_msg(reply.errorString()),
+            status_code=status_code,
+            headers=headers,
+            bar_msg=bar_msg(error_string),
         )
 
-    # https://stackoverflow.com/a/39103880/10068922
-    default_name = ""
+
+def _reply_headers(
+    reply: Union[QgsNetworkReplyContent, QNetworkReply], encoding: str
+) -> Dict[str, str]:
+    """Headers of the reply with lower case names"""
+    return {
+        bytes(name).decode(encoding).lower(): bytes(value).decode(encoding)
+        for name, value in reply.rawHeaderPairs()
+    }
+
+
+class _ContentDecoder:
+    """Decompresses the body incrementally according to its Content-Encoding"""
+
+    def __init__(self, content_encoding: str) -> None:
+        codings = [
+            coding.strip().lower()
+            for coding in content_encoding.split(",")
+            if coding.strip().lower() not in ("", "identity")
+        ]
+        # codings are listed in the order they were applied
+        self._decompressors = [self._decompressor(coding) for coding in codings]
+        self._decompressors.reverse()
+
+    def decompress(self, chunk: bytes) -> bytes:
+        for decompressor in self._decompressors:
+            chunk = decompressor(chunk)
+        return chunk
+
+    def flush(self) -> bytes:
+        return self.decompress(b"")
+
+    @staticmethod
+    def _decompressor(coding: str) -> Callable[[bytes], bytes]:
+        if coding in ("gzip", "x-gzip"):
+            return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress
+        if coding == "deflate":
+            return _DeflateDecompressor().decompress
+        if coding == "br" and brotli is not None:
+            return brotli.Decompressor().process
+        raise QgsPluginNetworkException(tr("Unsupported content encoding {}", coding))
+
+
+class _DeflateDecompressor:
+    """Deflate with zlib header or raw deflate, as sent by some servers"""
+
+    def __init__(self) -> None:
+        self._decompressor = zlib.decompressobj()
+        self._first_chunk = True
+
+    def decompress(self, chunk: bytes) -> bytes:
+        if not self._first_chunk:
+            return self._decompressor.decompress(chunk)
+        try:
+            content = self._decompressor.decompress(chunk)
+        except zlib.error:
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            content = self._decompressor.decompress(chunk)
+        self._first_chunk = not chunk
+        return content
+
+
+def _decompress(content: bytes, headers: Dict[str, str]) -> bytes:
+    decoder = _ContentDecoder(headers.get("content-encoding", ""))
+    return decoder.decompress(content) + decoder.flush()
+
+
+def _default_file_name(
+    reply: Union[QgsNetworkReplyContent, QNetworkReply], encoding: str
+) -> str:
+    """Reads the default file name from Content-Disposition header of the reply"""
     if reply.hasRawHeader(CONTENT_DISPOSITION_BYTE_HEADER):
         header: QByteArray = reply.rawHeader(CONTENT_DISPOSITION_BYTE_HEADER)
-        default_name = bytes(header).decode(encoding).split("filename=")[1]
-        if default_name[0] in ['"', "'"]:
-            default_name = default_name[1:-1]
+        return _file_name_from_content_disposition(bytes(header).decode(encoding))
+    return ""
+
+
+def _file_name_from_content_disposition(content_disposition: str) -> str:
+    # https://stackoverflow.com/a/39103880/10068922
+    if "filename=" not in content_disposition:
+        return ""
+    default_name = content_disposition.split("filename=")[1]
+    if default_name[0] in ['"', "'"]:
+        default_name = default_name[1:-1]
+    return default_name
+
+
+@functools.lru_cache(maxsize=None)
+def _import_requests() -> Any:
+    """
+    Import requests on first use instead of with this module, since importing
+    it takes a noticeable part of the plugin startup. None if not installed.
+    """
+    try:
+        import requests
+        import requests.adapters
+    except ImportError:
+        return None
+    return requests
+
+
+def requests_session(plugin: Optional[str] = None) -> "requests.Session":
+    """
+    Shared requests session used by the requests based helpers of this module.
+
+    The session keeps connections alive and reuses them, and has the QGIS
+    user agent and proxy configured. Use it for bulk requests to get
+    connection reuse. Configure the pool with configure_requests_session.
+    :param plugin: Name of the plugin of the session, defaults to the calling
+        plugin. Pass it when calling from a thread the plugin did not start
+        itself, such as a thread pool, since the calling plugin is found from
+        the stack of the calling thread.
+    :raises QgsPluginNotImplementedException: if requests is not installed
+    """
+    name = plugin or plugin_name()
+    with _SESSIONS_LOCK:
+        if name not in _SESSIONS:
+            _SESSIONS[name] = _create_requests_session(
+                DEFAULT_POOL_CONNECTIONS, DEFAULT_POOL_SIZE, name
+            )
+        return _SESSIONS[name]
+
+
+def configure_requests_session(
+    pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+    pool_maxsize: int = DEFAULT_POOL_SIZE,
+    plugin: Optional[str] = None,
+) -> "requests.Session":
+    """
+    Replaces the shared requests session with a new one. Call this also to take
+    changed QGIS proxy settings into use.
+    :param pool_connections: Number of hosts to keep connection pools for
+    :param pool_maxsize: Maximum number of connections kept alive per host
+    :param plugin: Name of the plugin of the session, defaults to the calling
+        plugin. Pass it when calling from a thread the plugin did not start
+        itself, as with requests_session.
+    :return: the new shared session
+    """
+    name = plugin or plugin_name()
+    session = _create_requests_session(pool_connections, pool_maxsize, name)
+    with _SESSIONS_LOCK:
+        old_session = _SESSIONS.get(name)
+        _SESSIONS[name] = session
+    if old_session is not None:
+        old_session.close()
+    return session
 
-    return bytes(reply.content()), default_name
+
+def _create_requests_session(
+    pool_connections: int, pool_maxsize: int, plugin: str
+) -> "requests.Session":
+    requests_module = _import_requests()
+    if requests_module is None:
+        raise QgsPluginNotImplementedException(tr("requests is not installed"))
+    session = requests_module.Session()
+    adapter = requests_module.adapters.HTTPAdapter(
+        pool_connections=pool_connections, pool_maxsize=pool_maxsize
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = _user_agent(plugin)
+    session.proxies.update(_qgis_proxies())
+    return session
+
+
+def _qgis_proxies() -> Dict[str, str]:
+    """Proxies for requests from the QGIS network settings"""
+    proxy = QgsNetworkAccessManager.instance().fallbackProxy()
+    if proxy.type() in (QNetworkProxy.HttpProxy, QNetworkProxy.HttpCachingProxy):
+        scheme = "http"
+    elif proxy.type() == QNetworkProxy.Socks5Proxy:
+        scheme = "socks5h"
+    else:
+        return {}
+    credentials = ""
+    if proxy.user():
+        credentials = f"{quote(proxy.user())}:{quote(proxy.password())}@"
+    proxy_url = f"{scheme}://{credentials}{proxy.hostName()}:{proxy.port()}"
+    proxies = {"http": proxy_url, "https": proxy_url}
+    excludes = QgsNetworkAccessManager.instance().fallbackProxyExcludeList()
+    if excludes:
+        proxies["no_proxy"] = ",".join(excludes)
+    return proxies
+
+
+def _requests_exception(
+    e: "requests.RequestException",
+) -> QgsPluginNetworkException:
+    """Convert the exception raised by requests to the plugin exception"""
+    requests_module = _import_requests()
+    if isinstance(e, requests_module.HTTPError) and e.response is not None:
+        return _requests_status_exception(e.response)
+    if isinstance(e, requests_module.Timeout):
+        error = QNetworkReply.TimeoutError
+    elif isinstance(
+        e,
+        (
+            requests_module.ConnectionError,
+            requests_module.exceptions.ChunkedEncodingError,
+        ),
+    ):
+        error = QNetworkReply.UnknownNetworkError
+    else:
+        error = None
+    return QgsPluginNetworkException(
+        tr("Request failed"), error=error, bar_msg=bar_msg(e)
+    )
+
+
+def _requests_status_exception(
+    r: "requests.Response", message: Optional[str] = None
+) -> QgsPluginNetworkException:
+    return QgsPluginNetworkException(
+        message or tr("Request failed with status code {}", r.status_code),
+        status_code=r.status_code,
+        headers={name.lower(): value for name, value in r.headers.items()},
+        bar_msg=bar_msg(r.reason),
+    )
 
 
 def download_to_file(
@@ -243,9 +1673,28 @@ def download_to_file(
     output_name: Optional[str] = None,
     use_requests_if_available: bool = True,
     encoding: str = ENCODING,
+    progress_callback: Optional[Callable[[DownloadProgress], None]] = None,
+    feedback: Optional[QgsFeedback] = None,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    segments: int = 1,
+    expected_checksum: Optional[str] = None,
+    checksum_algorithm: str = "sha256",
+    retry_policy: Optional[RetryPolicy] = None,
 ) -> Path:
     """
     Downloads a binary file to the file efficiently
+
+    The file is written in chunks to a .part file next to the output, which is
+    renamed when the download is complete. If the download is interrupted, the
+    next download of the same file continues from the end of the .part file
+    using HTTP Range request if the server supports it and the file has not
+    changed.
+
+    Large files can be downloaded in multiple segments concurrently, if the
+    server supports Range requests. Segmented download is not resumable.
+
+    Failed download is retried according to the retry policy. Retried single
+    stream download continues from the end of the .part file.
     :param url: Url of the file
     :param output_dir: Path to the output directory
     :param output_name: If given, use this as file name. Otherwise reads file name from
@@ -253,6 +1702,15 @@ def download_to_file(
     :param use_requests_if_available: Use Python package requests
     if it is available in the environment
     :param encoding: Encoding which will be used to decode the bytes
+    :param progress_callback: Called with the progress of the download
+    :param feedback: Feedback to report the progress percentage to and to
+    cancel the download with
+    :param chunk_size: Maximum size of the chunk kept in memory in bytes
+    :param segments: Number of byte ranges to download concurrently
+    :param expected_checksum: If given, hex digest the downloaded file must match
+    :param checksum_algorithm: Name of the hashlib algorithm of the checksum
+    :param retry_policy: Policy for retrying transient failures, defaults to the
+    policy set with set_default_retry_policy
     :return: Path to the file
     """
 
@@ -268,35 +1726,567 @@ def download_to_file(
             out_name = output_name
         return Path(output_dir, out_name)
 
-    output = Path()
+    part_path = Path(output_dir, _part_file_name(url, output_name))
+    timer = RequestTimer(url, "get")
+    writer = _DownloadWriter(part_path, progress_callback, feedback, timer)
 
-    if use_requests_if_available and requests is not None:
+    use_requests = use_requests_if_available and _import_requests() is not None
+    if use_requests:
         # https://stackoverflow.com/a/39217788/10068922
+        download = _download_with_requests
+    else:
+        download = _download_with_qgis
+
+    limiter = host_limiter(url)
+
+    def download_once() -> Dict[str, str]:
+        timer.start_attempt()
+        headers = None
+        if segments > 1:
+            headers = _download_segments(
+                url, writer, encoding, chunk_size, segments, use_requests
+            )
+        if headers is None:
+            with limiter.limit():
+                headers = download(url, writer, encoding, chunk_size)
+            if headers is None:
+                # Range was not satisfiable, the .part file is not usable
+                writer.discard()
+                with limiter.limit():
+                    headers = download(url, writer, encoding, chunk_size)
+                assert headers is not None
+        return headers
+
+    policy = retry_policy if retry_policy is not None else _default_retry_policy
+    try:
+        headers = policy.call("get", download_once)
+    except Exception as e:
+        timer.finish(e)
+        raise
+    timer.finish()
+
+    if expected_checksum is not None:
+        _verify_checksum(writer, expected_checksum, checksum_algorithm)
+
+    output = get_output(
+        _file_name_from_content_disposition(
+            headers.get(CONTENT_DISPOSITION_HEADER.lower(), "")
+        )
+    )
+    writer.finish(output)
+    return output
+
+
+def _part_file_name(url: str, output_name: Optional[str]) -> str:
+    """
+    Name of the .part file of the download. The response is not known yet, so the
+    name is the output name or the last segment of the url path, without the query
+    string and the characters not allowed in file names.
+    """
+    if output_name is None:
+        parts = urlsplit(url)
+        output_name = unquote(parts.path.rstrip("/").split("/")[-1]) or parts.netloc
+    return re.sub(r'[<>:"/\\|?*]', "_", output_name) + ".part"
+
+
+class _DownloadWriter:
+    """
+    Writes downloaded chunks to a .part file and reports the progress.
+
+    The validator (ETag or Last-Modified) of the response is stored next to the
+    .part file, so an interrupted download can be resumed only if the file
+    has not changed on the server.
+    """
+
+    def __init__(
+        self,
+        part_path: Path,
+        progress_callback: Optional[Callable[[DownloadProgress], None]] = None,
+        feedback: Optional[QgsFeedback] = None,
+        timer: Optional[RequestTimer] = None,
+    ) -> None:
+        self.part_path = part_path
+        self._validator_path = part_path.with_name(part_path.name + ".validator")
+        self._progress_callback = progress_callback
+        self.feedback = feedback
+        self.timer = timer
+        self._file: Optional[IO[bytes]] = None
+        self._bytes_received = 0
+        self._session_bytes = 0
+        self._total_bytes: Optional[int] = None
+        self._started_at = 0.0
+        self._last_reported_at = 0.0
+        self._lock = threading.Lock()
+
+    def resume_headers(self) -> Dict[str, str]:
+        """Headers for the request, including Range if the download can resume"""
+        # Encoded transfer would make the byte ranges refer to compressed content
+        headers = {"Accept-Encoding": "identity"}
+        if self.part_path.exists() and self._validator_path.exists():
+            headers["Range"] = f"bytes={self.part_path.stat().st_size}-"
+            headers["If-Range"] = self._validator_path.read_text(ENCODING)
+        return headers
+
+    def start(self, status: int, headers: Dict[str, str]) -> None:
+        """
+        Opens the .part file for the response.
+        :param status: HTTP status code of the response
+        :param headers: Response headers with lower case names
+        """
+        if status == HTTP_PARTIAL_CONTENT and self.part_path.exists():
+            self._file = open(self.part_path, "ab")
+            self._bytes_received = self.part_path.stat().st_size
+            LOGGER.debug(f"Resuming download at {self._bytes_received} bytes")
+        else:
+            self._file = open(self.part_path, "wb")
+            self._bytes_received = 0
+
+        content_range = headers.get("content-range", "")
+        if "/" in content_range and not content_range.endswith("*"):
+            self._total_bytes = int(content_range.split("/")[-1])
+        elif headers.get("content-length", "").isdigit():
+            self._total_bytes = self._bytes_received + int(headers["content-length"])
+
+        validator = headers.get("etag", headers.get("last-modified"))
+        if validator:
+            self._validator_path.write_text(validator, ENCODING)
+        elif self._validator_path.exists():
+            self._validator_path.unlink()
+
+        self._session_bytes = 0
+        self._started_at = self._last_reported_at = time.monotonic()
+        if self.timer is not None:
+            self.timer.first_byte()
+            self.timer.status_code = status
+
+    def start_segmented(self, total_bytes: int) -> None:
+        """
+        Opens the .part file preallocated to the total size for writing
+        the segments in any order.
+        """
+        self.discard()
+        self._file = open(self.part_path, "wb")
+        self._file.truncate(total_bytes)
+        self._bytes_received = self._session_bytes = 0
+        self._total_bytes = total_bytes
+        self._started_at = self._last_reported_at = time.monotonic()
+        if self.timer is not None:
+            self.timer.first_byte()
+            self.timer.status_code = HTTP_PARTIAL_CONTENT
+
+    def write(self, chunk: bytes) -> None:
+        assert self._file is not None
+        self._file.write(chunk)
+        self._bytes_received += len(chunk)
+        self._session_bytes += len(chunk)
+        if self.timer is not None:
+            self.timer.bytes_received += len(chunk)
+        self.report_progress()
+
+    def write_at(self, offset: int, chunk: bytes) -> None:
+        """
+        Writes the chunk at the offset of the segmented download.
+        Safe to call from multiple threads, progress is not reported.
+        """
+        with self._lock:
+            assert self._file is not None
+            self._file.seek(offset)
+            self._file.write(chunk)
+            self._bytes_received += len(chunk)
+            self._session_bytes += len(chunk)
+            if self.timer is not None:
+                self.timer.bytes_received += len(chunk)
+
+    def is_canceled(self) -> bool:
+        return self.feedback is not None and self.feedback.isCanceled()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self) -> None:
+        """Removes the .part file so the download starts from the beginning"""
+        self.close()
+        for path in (self.part_path, self._validator_path):
+            if path.exists():
+                path.unlink()
+
+    def finish(self, output: Path) -> None:
+        """Moves the complete .part file to the output path"""
+        self.close()
+        self.report_progress(force=True)
+        os.replace(self.part_path, output)
+        if self._validator_path.exists():
+            self._validator_path.unlink()
+
+    def report_progress(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_reported_at < PROGRESS_INTERVAL:
+            return
+        self._last_reported_at = now
+        elapsed = now - self._started_at
+        progress = DownloadProgress(
+            self._bytes_received,
+            self._total_bytes,
+            self._session_bytes / elapsed if elapsed > 0 else 0.0,
+        )
+        if self._progress_callback is not None:
+            self._progress_callback(progress)
+        if self.feedback is not None and self._total_bytes:
+            self.feedback.setProgress(100 * self._bytes_received / self._total_bytes)
+
+
+def _download_with_requests(
+    url: str, writer: _DownloadWriter, encoding: str, chunk_size: int
+) -> Optional[Dict[str, str]]:
+    """
+    Downloads the url in chunks with requests.
+    :return: response headers or None if the requested range was not satisfiable
+    """
+    try:
+        with requests_session().get(
+            url, stream=True, headers=writer.resume_headers()
+        ) as r:
+            if r.status_code == HTTP_RANGE_NOT_SATISFIABLE:
+                return None
+            if not r.ok:
+                raise _requests_status_exception(r)
+            headers = {name.lower(): value for name, value in r.headers.items()}
+            writer.start(r.status_code, headers)
+            try:
+                for chunk in r.iter_content(chunk_size):
+                    if writer.is_canceled():
+                        raise QgsPluginNetworkException(
+                            tr("Download was canceled"),
+                            error=QNetworkReply.OperationCanceledError,
+                        )
+                    writer.write(chunk)
+            finally:
+                writer.close()
+    except _import_requests().RequestException as e:
+        raise _requests_exception(e)
+    return headers
 
+
+def _download_with_qgis(
+    url: str, writer: _DownloadWriter, encoding: str, chunk_size: int
+) -> Optional[Dict[str, str]]:
+    """
+    Downloads the url in chunks with QgsNetworkAccessManager.
+    :return: response headers or None if the requested range was not satisfiable
+    """
+    req = _build_request(url, encoding, headers=writer.resume_headers())
+    req.setAttribute(
+        QNetworkRequest.RedirectPolicyAttribute,
+        QNetworkRequest.NoLessSafeRedirectPolicy,
+    )
+    reply = QgsNetworkAccessManager.instance().get(req)
+    # Do not let Qt buffer more than one chunk in memory
+    reply.setReadBufferSize(chunk_size)
+
+    loop = QEventLoop()
+    status: Optional[int] = None
+    headers: Dict[str, str] = {}
+    error_content = b""
+
+    def read_metadata() -> None:
+        nonlocal status, headers
+        status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+        headers = _reply_headers(reply, encoding)
+        if status is not None and status < 400:
+            writer.start(status, headers)
+
+    def on_ready_read() -> None:
+        nonlocal error_content
+        if status is None:
+            read_metadata()
+        if writer.is_canceled():
+            reply.abort()
+            return
+        while reply.bytesAvailable():
+            if status is not None and status < 400:
+                writer.write(bytes(reply.read(chunk_size)))
+            else:
+                error_content += bytes(reply.readAll())
+
+    reply.readyRead.connect(on_ready_read)
+    reply.finished.connect(loop.quit)
+    if writer.feedback is not None:
+        writer.feedback.canceled.connect(reply.abort)
+    try:
+        if not reply.isFinished():
+            loop.exec_()
+        on_ready_read()
+    finally:
+        writer.close()
+        if writer.feedback is not None:
+            writer.feedback.canceled.disconnect(reply.abort)
+        reply.deleteLater()
+
+    if writer.is_canceled():
+        raise QgsPluginNetworkException(
+            tr("Download was canceled"), error=QNetworkReply.OperationCanceledError
+        )
+    if reply.attribute(QNetworkRequest.HttpStatusCodeAttribute) == (
+        HTTP_RANGE_NOT_SATISFIABLE
+    ):
+        return None
+    _raise_for_reply_error(
+        reply.error(),
+        reply.errorString(),
+        error_content,
+        reply.attribute(QNetworkRequest.HttpStatusCodeAttribute),
+        headers,
+    )
+    return headers
+
+
+def _download_segments(
+    url: str,
+    writer: _DownloadWriter,
+    encoding: str,
+    chunk_size: int,
+    segments: int,
+    use_requests: bool,
+) -> Optional[Dict[str, str]]:
+    """
+    Downloads the url in concurrent byte range segments.
+    :return: response headers or None if the file cannot be downloaded in segments
+    """
+    limiter = host_limiter(url)
+    with limiter.limit():
+        headers = _head_with_requests(url) if use_requests else _head_with_qgis(url)
+    total_bytes = int(headers.get("content-length", "0") or "0")
+    segments = min(segments, total_bytes // MIN_SEGMENT_SIZE)
+    if limiter.max_connections:
+        segments = min(segments, limiter.max_connections)
+    if headers.get("accept-ranges") != "bytes" or segments < 2:
+        LOGGER.debug(f"Downloading {url} without segments")
+        return None
+
+    segment_size = -(-total_bytes // segments)
+    ranges = [
+        (start, min(start + segment_size, total_bytes) - 1)
+        for start in range(0, total_bytes, segment_size)
+    ]
+    LOGGER.debug(f"Downloading {url} in {len(ranges)} segments")
+
+    writer.start_segmented(total_bytes)
+    try:
+        if use_requests:
+            _download_segments_with_requests(url, writer, ranges, chunk_size)
+        else:
+            _download_segments_with_qgis(url, writer, encoding, ranges, chunk_size)
+        writer.close()
+        if writer.part_path.stat().st_size != total_bytes:
+            raise QgsPluginNetworkException(tr("Downloaded file is incomplete"))
+    except Exception:
+        writer.discard()
+        raise
+    return headers
+
+
+def _download_segments_with_requests(
+    url: str, writer: _DownloadWriter, ranges: List[Tuple[int, int]], chunk_size: int
+) -> None:
+    stopped = threading.Event()
+    limiter = host_limiter(url)
+    # resolved here, since the plugin is not found from the worker thread stack
+    session = requests_session()
+
+    def download_segment(start: int, end: int) -> None:
+        segment_headers = {
+            "Accept-Encoding": "identity",
+            "Range": f"bytes={start}-{end}",
+        }
         try:
-            with requests.get(url, stream=True) as r:
-                try:
-                    r.raise_for_status()
-                except Exception:
+            with limiter.limit(), session.get(
+                url, stream=True, headers=segment_headers
+            ) as r:
+                if not r.ok:
+                    raise _requests_status_exception(r)
+                if r.status_code != HTTP_PARTIAL_CONTENT:
                     raise QgsPluginNetworkException(
-                        tr("Request failed with status code {}", r.status_code),
-                        bar_msg=bar_msg(r.text),
+                        tr("Server did not return the requested range")
                     )
-                default_filenames = re.findall(
-                    "filename=(.+)", r.headers.get(CONTENT_DISPOSITION_HEADER, "")
+                position = start
+                for chunk in r.iter_content(chunk_size):
+                    if stopped.is_set():
+                        return
+                    writer.write_at(position, chunk)
+                    position += len(chunk)
+        except _import_requests().RequestException as e:
+            raise _requests_exception(e)
+        if position != end + 1:
+            raise QgsPluginNetworkException(tr("Downloaded file is incomplete"))
+
+    with ThreadPoolExecutor(len(ranges)) as executor:
+        futures = [executor.submit(download_segment, *r) for r in ranges]
+        try:
+            while True:
+                done, not_done = wait(
+                    futures, timeout=PROGRESS_INTERVAL, return_when=FIRST_EXCEPTION
                 )
-                default_filename = (
-                    default_filenames[0] if len(default_filenames) else ""
+                writer.report_progress()
+                for future in done:
+                    # raises the exception of the failed segment
+                    future.result()
+                if not not_done:
+                    break
+                if writer.is_canceled():
+                    raise QgsPluginNetworkException(
+                        tr("Download was canceled"),
+                        error=QNetworkReply.OperationCanceledError,
+                    )
+        finally:
+            stopped.set()
+
+
+def _download_segments_with_qgis(
+    url: str,
+    writer: _DownloadWriter,
+    encoding: str,
+    ranges: List[Tuple[int, int]],
+    chunk_size: int,
+) -> None:
+    loop = QEventLoop()
+    replies: List[QNetworkReply] = []
+    positions = [start for start, _ in ranges]
+    limiter = host_limiter(url)
+
+    def abort_all() -> None:
+        for reply in replies:
+            if not reply.isFinished():
+                reply.abort()
+
+    def on_ready_read(index: int) -> None:
+        reply = replies[index]
+        status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+        if status != HTTP_PARTIAL_CONTENT or writer.is_canceled():
+            # Server ignored the range or the download was canceled
+            abort_all()
+            return
+        while reply.bytesAvailable():
+            chunk = bytes(reply.read(chunk_size))
+            writer.write_at(positions[index], chunk)
+            positions[index] += len(chunk)
+        writer.report_progress()
+
+    def on_finished() -> None:
+        if any(reply.error() != QNetworkReply.NoError for reply in replies):
+            abort_all()
+        if all(reply.isFinished() for reply in replies):
+            loop.quit()
+
+    for index, (start, end) in enumerate(ranges):
+        req = _build_request(
+            url,
+            encoding,
+            headers={"Accept-Encoding": "identity", "Range": f"bytes={start}-{end}"},
+        )
+        req.setAttribute(
+            QNetworkRequest.RedirectPolicyAttribute,
+            QNetworkRequest.NoLessSafeRedirectPolicy,
+        )
+        acquired = limiter.acquire()
+        reply = QgsNetworkAccessManager.instance().get(req)
+        reply.setReadBufferSize(chunk_size)
+        reply.readyRead.connect(functools.partial(on_ready_read, index))
+        if acquired:
+            reply.finished.connect(limiter.release)
+        reply.finished.connect(on_finished)
+        replies.append(reply)
+
+    if writer.feedback is not None:
+        writer.feedback.canceled.connect(abort_all)
+    try:
+        if not all(reply.isFinished() for reply in replies):
+            loop.exec_()
+        for index, reply in enumerate(replies):
+            if reply.error() == QNetworkReply.NoError:
+                on_ready_read(index)
+    finally:
+        if writer.feedback is not None:
+            writer.feedback.canceled.disconnect(abort_all)
+        for reply in replies:
+            reply.deleteLater()
+
+    if writer.is_canceled():
+        raise QgsPluginNetworkException(
+            tr("Download was canceled"), error=QNetworkReply.OperationCanceledError
+        )
+    for reply in replies:
+        status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+        if status is not None and status < 400 and status != HTTP_PARTIAL_CONTENT:
+            raise QgsPluginNetworkException(
+                tr("Server did not return the requested range")
+            )
+    # replies aborted due to the failure of another segment are raised last
+    for reply in sorted(
+        replies, key=lambda r: r.error() == QNetworkReply.OperationCanceledError
+    ):
+        _raise_for_reply_error(
+            reply.error(),
+            reply.errorString(),
+            b"",
+            reply.attribute(QNetworkRequest.HttpStatusCodeAttribute),
+            _reply_headers(reply, ENCODING),
+        )
+    if positions != [end + 1 for _, end in ranges]:
+        raise QgsPluginNetworkException(tr("Downloaded file is incomplete"))
+
+
+def _head_with_requests(url: str) -> Dict[str, str]:
+    try:
+        r = requests_session().head(
+            url, allow_redirects=True, headers={"Accept-Encoding": "identity"}
+        )
+        r.raise_for_status()
+    except _import_requests().RequestException as e:
+        raise _requests_exception(e)
+    return {name.lower(): value for name, value in r.headers.items()}
+
+
+def _head_with_qgis(url: str, encoding: str = ENCODING) -> Dict[str, str]:
+    req = _build_request(url, encoding, headers={"Accept-Encoding": "identity"})
+    req.setAttribute(
+        QNetworkRequest.RedirectPolicyAttribute,
+        QNetworkRequest.NoLessSafeRedirectPolicy,
+    )
+    reply = QgsNetworkAccessManager.instance().head(req)
+    loop = QEventLoop()
+    reply.finished.connect(loop.quit)
+    if not reply.isFinished():
+        loop.exec_()
+    reply.deleteLater()
+    _raise_for_reply_error(
+        reply.error(),
+        reply.errorString(),
+        b"",
+        reply.attribute(QNetworkRequest.HttpStatusCodeAttribute),
+        _reply_headers(reply, encoding),
+    )
+    return _reply_headers(reply, encoding)
+
+
+def _verify_checksum(
+    writer: _DownloadWriter, expected_checksum: str, checksum_algorithm: str
+) -> None:
+    file_hash = hashlib.new(checksum_algorithm)
+    with open(writer.part_path, "rb") as f:
+        while chunk := f.read(CHECKSUM_CHUNK_SIZE):
+            file_hash.update(chunk)
+    if file_hash.hexdigest().lower() != expected_checksum.lower():
+        writer.discard()
+        raise QgsPluginNetworkException(
+            tr("Checksum of the downloaded file does not match"),
+            bar_msg=bar_msg(
+                tr(
+                    "Expected {} checksum {} but got {}",
+                    checksum_algorithm,
+                    expected_checksum,
+                    file_hash.hexdigest(),
                 )
-                output = get_output(default_filename)
-                with open(output, "wb") as f:
-                    shutil.copyfileobj(r.raw, f)
-        except RequestException as e:
-            raise QgsPluginNetworkException(tr("Request failed"), bar_msg=bar_msg(e))
-    else:
-        # Using simple fetch_raw
-        content, default_filename = fetch_raw(url, encoding)
-        output = get_output(default_filename)
-        with open(output, "wb") as f:
-            f.write(content)
-    return output
+            ),
+        )
@@ -0,0 +1,243 @@
+"""On-disk HTTP response cache for the network tools."""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+from qgis.core import QgsNetworkReplyContent
+from qgis.PyQt.QtCore import QByteArray
+from qgis.PyQt.QtNetwork import QNetworkRequest
+
+from .network import ENCODING, _default_file_name, _send_request
+from .resources import plugin_name, profile_path
+
+__copyright__ = "Copyright 2020-2021, Gispo Ltd"
+__license__ = "GPL version 3"
+__email__ = "info@gispo.fi"
+__revision__ = "$Format:%H$"
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 50 * 1024 * 1024
+DEFAULT_TTL = 300
+HTTP_NOT_MODIFIED = 304
+
+
+class CacheEntry(NamedTuple):
+    url: str
+    default_name: str
+    stored_at: float
+    ttl: int
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def is_fresh(self) -> bool:
+        return time.time() - self.stored_at < self.ttl
+
+
+class ResponseCache:
+    """
+    Size-bounded on-disk cache for GET responses.
+
+    Fresh responses are returned without a request. Stale responses are
+    revalidated with If-None-Match and If-Modified-Since headers, so unchanged
+    resources cost only a 304 round-trip. The least recently used responses are
+    evicted when the cache grows over its maximum size.
+
+    Responses with Cache-Control no-store are not stored and responses with
+    no-cache are revalidated on every use. The cache is private to the user,
+    so responses with Cache-Control private are stored.
+
+    >>> cache = ResponseCache(ttl=600)
+    >>> fetch("https://example.com/catalog.json", cache=cache)
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Union[str, "os.PathLike"]] = None,
+        max_size: int = DEFAULT_MAX_SIZE,
+        ttl: int = DEFAULT_TTL,
+    ) -> None:
+        """
+        :param directory: Directory of the cache files, defaults to
+            cache/<plugin name>/http inside the profile folder
+        :param max_size: Maximum total size of the cached responses in bytes
+        :param ttl: Default time in seconds the response is used without
+            revalidation, if the server does not specify max-age
+        """
+        self.directory = Path(
+            directory
+            if directory is not None
+            else profile_path("cache", plugin_name(), "http")
+        )
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def fetch_raw(
+        self,
+        url: str,
+        encoding: str = ENCODING,
+        authcfg_id: str = "",
+        params: Optional[Dict[str, str]] = None,
+    ) -> Tuple[bytes, str]:
+        """
+        Fetch resource using the cache.
+        :param url: address of the web resource
+        :param encoding: Encoding which will be used to decode the bytes
+        :param authcfg_id: authcfg id from QGIS settings, defaults to ''
+        :param params: Dictionary to send in the query string
+        :return: bytes of the content and default name of the file or empty string
+        """
+        key = self._key(url, authcfg_id, params)
+        cached = self._read(key)
+        if cached is not None and cached[0].is_fresh():
+            LOGGER.debug(f"Using cached response of {url}")
+            return cached[1], cached[0].default_name
+
+        headers: Dict[str, str] = {}
+        if cached is not None:
+            if cached[0].etag:
+                headers["If-None-Match"] = cached[0].etag
+            if cached[0].last_modified:
+                headers["If-Modified-Since"] = cached[0].last_modified
+
+        reply = _send_request(
+            url,
+            "get",
+            encoding,
+            authcfg_id,
+            params,
+            headers=headers,
+            force_refresh=True,
+        )
+        status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+        if cached is not None and status == HTTP_NOT_MODIFIED:
+            LOGGER.debug(f"Cached response of {url} is not modified")
+            entry, content = cached
+            self._write_entry(
+                key,
+                entry._replace(
+                    stored_at=time.time(),
+                    ttl=self._ttl(reply, entry.ttl),
+                    etag=_header(reply, "ETag") or entry.etag,
+                    last_modified=_header(reply, "Last-Modified")
+                    or entry.last_modified,
+                ),
+            )
+            return content, entry.default_name
+
+        content = bytes(reply.content())
+        default_name = _default_file_name(reply, encoding)
+        if "no-store" not in _cache_control(_header(reply, "Cache-Control")):
+            self._store(
+                key,
+                CacheEntry(
+                    url=url,
+                    default_name=default_name,
+                    stored_at=time.time(),
+                    ttl=self._ttl(reply, self.ttl),
+                    etag=_header(reply, "ETag"),
+                    last_modified=_header(reply, "Last-Modified"),
+                ),
+                content,
+            )
+        return content, default_name
+
+    def clear(self) -> None:
+        """Remove all cached responses"""
+        with self._lock:
+            for path in self.directory.iterdir():
+                if path.suffix in (".body", ".json"):
+                    path.unlink()
+
+    def size(self) -> int:
+        """Total size of the cached responses in bytes"""
+        return sum(path.stat().st_size for path in self.directory.glob("*.body"))
+
+    @staticmethod
+    def _key(url: str, authcfg_id: str, params: Optional[Dict[str, str]]) -> str:
+        key_data = json.dumps([url, sorted((params or {}).items()), authcfg_id])
+        return hashlib.sha256(key_data.encode(ENCODING)).hexdigest()
+
+    @staticmethod
+    def _ttl(reply: QgsNetworkReplyContent, default: int) -> int:
+        directives = _cache_control(_header(reply, "Cache-Control"))
+        if "no-cache" in directives:
+            # may be stored, but must be revalidated before every use
+            return 0
+        try:
+            return int(directives.get("max-age") or default)
+        except ValueError:
+            return default
+
+    def _read(self, key: str) -> Optional[Tuple[CacheEntry, bytes]]:
+        body_path = self.directory / f"{key}.body"
+        with self._lock:
+            try:
+                with open(self.directory / f"{key}.json", encoding=ENCODING) as f:
+                    entry = CacheEntry(**json.load(f))
+                content = body_path.read_bytes()
+            except (OSError, TypeError, ValueError):
+                return None
+            # body modification time is used as the last access time in eviction
+            os.utime(body_path)
+        return entry, content
+
+    def _store(self, key: str, entry: CacheEntry, content: bytes) -> None:
+        if len(content) > self.max_size:
+            return
+        with self._lock:
+            _write_atomically(self.directory / f"{key}.body", content)
+        self._write_entry(key, entry)
+        self._evict()
+
+    def _write_entry(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            _write_atomically(
+                self.directory / f"{key}.json",
+                json.dumps(entry._asdict()).encode(ENCODING),
+            )
+
+    def _evict(self) -> None:
+        with self._lock:
+            bodies: List[Tuple[float, int, Path]] = []
+            for path in self.directory.glob("*.body"):
+                stat = path.stat()
+                bodies.append((stat.st_mtime, stat.st_size, path))
+            total_size = sum(size for _, size, _ in bodies)
+            for _, size, path in sorted(bodies):
+                if total_size <= self.max_size:
+                    break
+                path.unlink()
+                path.with_suffix(".json").unlink(missing_ok=True)
+                total_size -= size
+
+
+def _cache_control(value: Optional[str]) -> Dict[str, str]:
+    """Directives of the Cache-Control header value with their arguments"""
+    directives = {}
+    for directive in (value or "").split(","):
+        name, _, argument = directive.partition("=")
+        if name.strip():
+            directives[name.strip().lower()] = argument.strip().strip('"')
+    return directives
+
+
+def _header(reply: QgsNetworkReplyContent, name: str) -> Optional[str]:
+    byte_name = QByteArray(bytes(name, ENCODING))
+    if not reply.hasRawHeader(byte_name):
+        return None
+    return bytes(reply.rawHeader(byte_name)).decode(ENCODING)
+
+
+def _write_atomically(path: Path, content: bytes) -> None:
+    temporary_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+    temporary_path.write_bytes(content)
+    os.replace(temporary_path, path)
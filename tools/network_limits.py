@@ -0,0 +1,312 @@
+"""Per host rate and concurrency limits of the network tools."""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Iterator, Optional, Tuple, Type, TypeVar
+from urllib.parse import urlsplit
+
+from qgis.PyQt.QtCore import QCoreApplication, QEventLoop, QTimer
+
+from .exceptions import QgsPluginNetworkException
+from .resources import plugin_name
+from .settings import get_setting
+
+__copyright__ = "Copyright 2020-2021, Gispo Ltd"
+__license__ = "GPL version 3"
+__email__ = "info@gispo.fi"
+__revision__ = "$Format:%H$"
+
+LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T", int, float)
+
+# Plugin setting keys of the limits. Limits of a single host can be set with
+# keys network/hosts/<host>/<name>, for example network/hosts/example.com/rate_limit
+RATE_LIMIT_KEY = "network/rate_limit"
+RATE_LIMIT_BURST_KEY = "network/rate_limit_burst"
+MAX_CONNECTIONS_KEY = "network/max_connections_per_host"
+
+# Requests per second, 0 is unlimited
+DEFAULT_RATE_LIMIT = 0.0
+DEFAULT_RATE_LIMIT_BURST = 1
+# Concurrent requests, 0 is unlimited
+DEFAULT_MAX_CONNECTIONS = 0
+# Pause of a throttled host in seconds if the server does not send Retry-After
+DEFAULT_THROTTLE_PAUSE = 1.0
+HTTP_TOO_MANY_REQUESTS = 429
+# Interval of processing events while waiting on the main thread in seconds
+WAIT_INTERVAL = 0.05
+# Maximum wait for a connection slot on the main thread in seconds. The holder of
+# the slot may be able to finish only on the main thread, so after the timeout the
+# request is sent without a slot instead of waiting forever.
+MAIN_THREAD_ACQUIRE_TIMEOUT = 10.0
+
+# Limiters by plugin name and host
+_LIMITERS: Dict[Tuple[str, str], "HostLimiter"] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+class TokenBucket:
+    """
+    Token bucket allowing requests at the rate on average and bursts of
+    the capacity. Tokens are reserved in the order of the calls, so the waiting
+    callers are served first come, first served.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1) -> None:
+        """
+        :param rate: Tokens added per second
+        :param capacity: Maximum number of tokens
+        """
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return the delay in seconds before it may be used"""
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def try_take(self) -> bool:
+        """Take a token if one is available now"""
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+
+class HostLimiter:
+    """Limits the rate and the number of concurrent requests to a host"""
+
+    def __init__(
+        self,
+        host: str,
+        rate_limit: float = DEFAULT_RATE_LIMIT,
+        burst: int = DEFAULT_RATE_LIMIT_BURST,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+    ) -> None:
+        """
+        :param host: Host name and port of the urls
+        :param rate_limit: Maximum requests per second, 0 is unlimited
+        :param burst: Number of requests allowed at once within the rate limit
+        :param max_connections: Maximum concurrent requests, 0 is unlimited
+        """
+        self.host = host
+        self.rate_limit = rate_limit
+        self.max_connections = max_connections
+        self._bucket = TokenBucket(rate_limit, burst) if rate_limit > 0 else None
+        self._connections = (
+            threading.BoundedSemaphore(max_connections) if max_connections > 0 else None
+        )
+        self._paused_until = 0.0
+        # Number of limit contexts holding a slot on the main thread
+        self._main_thread_holders = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def limit(self) -> Iterator[None]:
+        """
+        Wait until a request to the host is allowed and hold a connection slot
+        for the duration of the context. A throttled response pauses the host.
+        """
+        acquired = self.acquire()
+        holds_main_thread = acquired and _is_main_thread()
+        if holds_main_thread:
+            with self._lock:
+                self._main_thread_holders += 1
+        try:
+            yield
+        except QgsPluginNetworkException as e:
+            if e.status_code == HTTP_TOO_MANY_REQUESTS:
+                self.throttled(e.headers.get("retry-after"))
+            raise
+        finally:
+            if holds_main_thread:
+                with self._lock:
+                    self._main_thread_holders -= 1
+            if acquired:
+                self.release()
+
+    def acquire(self) -> bool:
+        """
+        Wait until a request to the host is allowed and take a connection slot.
+
+        On the main thread, the slot is not waited for if a limit context of the
+        main thread already holds one, since that request can finish only after
+        this one, or longer than MAIN_THREAD_ACQUIRE_TIMEOUT.
+        :return: whether a connection slot was taken and must be released
+        """
+        acquired = False
+        if self._connections is not None:
+            acquired = self._acquire_connection()
+        _wait(self._pause_remaining())
+        if self._bucket is not None:
+            _wait(self._bucket.reserve())
+        return acquired
+
+    def _acquire_connection(self) -> bool:
+        assert self._connections is not None
+        if not _is_main_thread():
+            self._connections.acquire()
+            return True
+        if self._connections.acquire(False):
+            return True
+        with self._lock:
+            nested = self._main_thread_holders > 0
+        if not nested and _wait_until(
+            self._connections.acquire, MAIN_THREAD_ACQUIRE_TIMEOUT
+        ):
+            return True
+        LOGGER.debug(
+            f"Sending a request to {self.host} without a free connection slot"
+            " to avoid blocking the main thread"
+        )
+        return False
+
+    def try_acquire(self) -> bool:
+        """Acquire a connection slot and a token only if available now"""
+        if self._pause_remaining() > 0:
+            return False
+        if self._connections is not None and not self._connections.acquire(False):
+            return False
+        if self._bucket is not None and not self._bucket.try_take():
+            if self._connections is not None:
+                self._connections.release()
+            return False
+        return True
+
+    def release(self) -> None:
+        if self._connections is not None:
+            self._connections.release()
+
+    def throttled(self, retry_after: Optional[str] = None) -> None:
+        """
+        Pause the requests to the host after the server asked to slow down
+        :param retry_after: Value of the Retry-After header, seconds or HTTP-date
+        """
+        pause = _parse_retry_after(retry_after)
+        if pause is None:
+            pause = DEFAULT_THROTTLE_PAUSE
+        LOGGER.debug(f"{self.host} is throttling requests, pausing for {pause} s")
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+
+    def _pause_remaining(self) -> float:
+        with self._lock:
+            return max(0.0, self._paused_until - time.monotonic())
+
+
+def host_limiter(url: str, plugin: Optional[str] = None) -> HostLimiter:
+    """
+    Limiter of the host of the url. The limits are read from the plugin settings
+    when the limiter of the host is first used by the plugin.
+    :param plugin: Name of the plugin, defaults to the calling plugin. Pass it when
+        calling from a worker thread or callback.
+    """
+    plugin = plugin or plugin_name()
+    host = urlsplit(url).netloc
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get((plugin, host))
+        if limiter is None:
+            limiter = _LIMITERS[(plugin, host)] = HostLimiter(
+                host,
+                _host_setting(plugin, host, RATE_LIMIT_KEY, DEFAULT_RATE_LIMIT, float),
+                _host_setting(
+                    plugin, host, RATE_LIMIT_BURST_KEY, DEFAULT_RATE_LIMIT_BURST, int
+                ),
+                _host_setting(
+                    plugin, host, MAX_CONNECTIONS_KEY, DEFAULT_MAX_CONNECTIONS, int
+                ),
+            )
+        return limiter
+
+
+def reset_host_limits() -> None:
+    """Read the limits from the settings again, for example after changing them"""
+    with _LIMITERS_LOCK:
+        _LIMITERS.clear()
+
+
+def _host_setting(plugin: str, host: str, key: str, default: T, typehint: Type[T]) -> T:
+    # the settings of the given plugin, not of the plugin found from the stack
+    prefix = f"/{plugin}"
+    # without type hint missing setting is None instead of the zero of the type
+    value = get_setting(
+        f"{prefix}/network/hosts/{host}/{key.split('/')[-1]}", internal=False
+    )
+    if value is None:
+        value = get_setting(f"{prefix}/{key}", default, internal=False)
+    return typehint(value)
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from the Retry-After header value, seconds or HTTP-date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_main_thread() -> bool:
+    """Whether called from the thread running the Qt event loop of the application"""
+    return (
+        QCoreApplication.instance() is not None
+        and threading.current_thread() is threading.main_thread()
+    )
+
+
+def _wait(delay: float) -> None:
+    """Wait without freezing the user interface if called from the main thread"""
+    if delay <= 0:
+        return
+    if _is_main_thread():
+        loop = QEventLoop()
+        QTimer.singleShot(int(delay * 1000), loop.quit)
+        loop.exec_()
+    else:
+        time.sleep(delay)
+
+
+def _wait_until(
+    acquire: Callable[..., bool], main_thread_timeout: Optional[float] = None
+) -> bool:
+    """
+    Wait until acquire(timeout=...) succeeds, without freezing the user
+    interface on the main thread
+    :param main_thread_timeout: Maximum wait in seconds on the main thread
+    :return: whether acquire succeeded
+    """
+    if _is_main_thread():
+        deadline = (
+            time.monotonic() + main_thread_timeout
+            if main_thread_timeout is not None
+            else None
+        )
+        while not acquire(timeout=WAIT_INTERVAL):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            QCoreApplication.processEvents()
+        return True
+    return acquire()
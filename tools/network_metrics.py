@@ -0,0 +1,286 @@
+"""Timing metrics of the requests made with the network tools."""
+
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple, Union
+from urllib.parse import urlsplit, urlunsplit
+
+__copyright__ = "Copyright 2020-2021, Gispo Ltd"
+__license__ = "GPL version 3"
+__email__ = "info@gispo.fi"
+__revision__ = "$Format:%H$"
+
+ENCODING = "utf-8"
+# Upper bounds of the histogram buckets in seconds
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DEFAULT_MAX_RECORDS = 10_000
+
+_collector: Optional["NetworkMetrics"] = None
+
+
+class RequestMetrics(NamedTuple):
+    # Scheme, host and path of the url, without the query and the credentials
+    url: str
+    host: str
+    method: str
+    # Unix time of the start of the request
+    started_at: float
+    # Seconds from the start of the last attempt until the response started
+    time_to_first_byte: Optional[float]
+    # Seconds until the response was read, including the retries
+    total_time: float
+    bytes_sent: int
+    bytes_received: int
+    status_code: Optional[int]
+    retries: int
+    error: Optional[str] = None
+
+
+class Histogram:
+    """Cumulative histogram of durations in seconds"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        # last count is for the values over the largest bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket containing the quantile q between 0 and 1"""
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank and cumulative > 0:
+                return bound
+        return self.max
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.mean,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": {
+                str(bound): count for bound, count in zip(self.buckets, self.counts)
+            },
+            "overflow": self.counts[-1],
+        }
+
+
+class HostStatistics:
+    """Aggregated metrics of the requests to a single host"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.total_time = Histogram(buckets)
+        self.time_to_first_byte = Histogram(buckets)
+
+    def add(self, metrics: RequestMetrics) -> None:
+        self.requests += 1
+        self.errors += metrics.error is not None
+        self.retries += metrics.retries
+        self.bytes_sent += metrics.bytes_sent
+        self.bytes_received += metrics.bytes_received
+        self.total_time.add(metrics.total_time)
+        if metrics.time_to_first_byte is not None:
+            self.time_to_first_byte.add(metrics.time_to_first_byte)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "total_time": self.total_time.as_dict(),
+            "time_to_first_byte": self.time_to_first_byte.as_dict(),
+        }
+
+
+class NetworkMetrics:
+    """
+    Collects the metrics of the requests and aggregates them per host.
+
+    >>> metrics = enable_metrics(NetworkMetrics(json_lines_path="requests.jsonl"))
+    >>> fetch("https://example.com/data.json")
+    >>> metrics.summary()["example.com"]["total_time"]["p95"]
+    """
+
+    def __init__(
+        self,
+        max_records: int = DEFAULT_MAX_RECORDS,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+        json_lines_path: Optional[Union[str, "os.PathLike"]] = None,
+    ) -> None:
+        """
+        :param max_records: Maximum number of the latest request metrics kept
+        :param buckets: Upper bounds of the histogram buckets in seconds
+        :param json_lines_path: If given, each request metrics is appended to
+            this file as JSON line when recorded
+        """
+        self.records: Deque[RequestMetrics] = deque(maxlen=max_records)
+        self.buckets = buckets
+        self.json_lines_path = (
+            Path(json_lines_path) if json_lines_path is not None else None
+        )
+        self._hosts: Dict[str, HostStatistics] = {}
+        self._listeners: List[Callable[[RequestMetrics], None]] = []
+        self._lock = threading.Lock()
+
+    def record(self, metrics: RequestMetrics) -> None:
+        with self._lock:
+            self.records.append(metrics)
+            if metrics.host not in self._hosts:
+                self._hosts[metrics.host] = HostStatistics(self.buckets)
+            self._hosts[metrics.host].add(metrics)
+            if self.json_lines_path is not None:
+                with open(self.json_lines_path, "a", encoding=ENCODING) as f:
+                    f.write(json.dumps(metrics._asdict()) + "\n")
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(metrics)
+
+    def add_listener(self, listener: Callable[[RequestMetrics], None]) -> None:
+        """Call the listener with the metrics of every recorded request"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[RequestMetrics], None]) -> None:
+        with self._lock:
+            self._listeners.remove(listener)
+
+    def host_statistics(self, host: str) -> Optional[HostStatistics]:
+        return self._hosts.get(host)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Aggregated metrics by host"""
+        with self._lock:
+            return {host: stats.as_dict() for host, stats in self._hosts.items()}
+
+    def export_json_lines(self, path: Union[str, "os.PathLike"]) -> None:
+        """Write the kept request metrics to the file as JSON lines"""
+        with self._lock:
+            records = list(self.records)
+        with open(path, "w", encoding=ENCODING) as f:
+            for metrics in records:
+                f.write(json.dumps(metrics._asdict()) + "\n")
+
+    def clear(self) -> None:
+        with self._lock:
+            self.records.clear()
+            self._hosts.clear()
+
+
+class RequestTimer:
+    """Measures a single request and records it to the enabled metrics"""
+
+    def __init__(self, url: str, method: str) -> None:
+        self.url = _redacted_url(url)
+        self._full_url = url
+        self.method = method.upper()
+        self.attempts = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.status_code: Optional[int] = None
+        self._started_at = time.time()
+        self._start = time.perf_counter()
+        self._attempt_start = self._start
+        self._first_byte: Optional[float] = None
+
+    def first_byte(self) -> None:
+        """Mark the response headers received, only the first call counts"""
+        if self._first_byte is None:
+            self._first_byte = time.perf_counter()
+
+    def start_attempt(self) -> None:
+        """Reset the per-attempt measurements when the request is (re)tried"""
+        self.attempts += 1
+        self._attempt_start = time.perf_counter()
+        self._first_byte = None
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        if _collector is None:
+            return
+        _collector.record(
+            RequestMetrics(
+                url=self.url,
+                host=urlsplit(self.url).netloc,
+                method=self.method,
+                started_at=self._started_at,
+                time_to_first_byte=(
+                    self._first_byte - self._attempt_start
+                    if self._first_byte is not None
+                    else None
+                ),
+                total_time=time.perf_counter() - self._start,
+                bytes_sent=self.bytes_sent,
+                bytes_received=self.bytes_received,
+                status_code=(
+                    self.status_code
+                    if self.status_code is not None
+                    else getattr(error, "status_code", None)
+                ),
+                retries=max(0, self.attempts - 1),
+                error=(
+                    str(error).replace(self._full_url, self.url)
+                    if error is not None
+                    else None
+                ),
+            )
+        )
+
+
+def _redacted_url(url: str) -> str:
+    """
+    Url without the query, the fragment and the user info, which may contain
+    credentials such as API keys
+    """
+    parts = urlsplit(url)
+    return urlunsplit(
+        (parts.scheme, parts.netloc.rpartition("@")[2], parts.path, "", "")
+    )
+
+
+def enable_metrics(collector: Optional[NetworkMetrics] = None) -> NetworkMetrics:
+    """
+    Start recording the metrics of the requests.
+    :param collector: Metrics to record to, defaults to new NetworkMetrics
+    :return: the collector recording the metrics
+    """
+    global _collector
+    _collector = collector if collector is not None else NetworkMetrics()
+    return _collector
+
+
+def disable_metrics() -> None:
+    global _collector
+    _collector = None
+
+
+def metrics() -> Optional[NetworkMetrics]:
+    """The collector recording the metrics or None if metrics are disabled"""
+    return _collector
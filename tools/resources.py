@@ -2,16 +2,19 @@
 import configparser
 import importlib.resources
 import inspect
+import os
 import sys
+import time
 from os.path import abspath, dirname, exists, join, pardir
 from pathlib import Path
-from typing import TYPE_CHECKING, Dict, Iterator, NamedTuple, Optional
+from types import FrameType, MappingProxyType
+from typing import TYPE_CHECKING, Dict, Iterator, Mapping, NamedTuple, Optional, Tuple
 
-from qgis.PyQt import uic
 from qgis.PyQt.QtWidgets import QDialog, QWidget
 
+from .ui_cache import load_ui_type
+
 if TYPE_CHECKING:
-    import os
     from typing import Union
 
 __copyright__ = (
@@ -26,6 +29,8 @@ from qgis.core import QgsApplication
 
 PLUGIN_NAME: str = ""
 SLUG_NAME: str = ""
+# Seconds between checking whether metadata.txt has changed
+METADATA_CHECK_INTERVAL = 1.0
 
 
 def is_submodule() -> bool:
@@ -48,6 +53,26 @@ def is_submodule() -> bool:
 
 _IS_SUBMODULE_USAGE = is_submodule()
 
+# plugin directories by the names of the calling modules
+_PLUGIN_DIRECTORIES: Dict[str, str] = {}
+# metadata and the monotonic time of its last check by metadata.txt path
+_METADATA: Dict[str, Tuple["PluginMetadata", float]] = {}
+
+
+class PluginMetadata(NamedTuple):
+    """Immutable contents of the metadata.txt of a plugin"""
+
+    path: str
+    # modification time of the file in nanoseconds, None if it does not exist
+    mtime: Optional[int]
+    # raw values of the options by section
+    sections: Mapping[str, Mapping[str, str]]
+
+    def get(
+        self, option: str, section: str = "general", fallback: Optional[str] = None
+    ) -> Optional[str]:
+        return self.sections.get(section, {}).get(option, fallback)
+
 
 def _plugin_path_submodule() -> str:
     # assume qgis_plugin_tools is inside the plugin package,
@@ -130,22 +155,40 @@ def _plugin_path_dependency() -> str:
     """Get the path to the plugin package folder.
 
     Traverses packages of calling modules bottom up and checks if it is a qgis plugin.
+    The plugin directory found for a calling module is cached, so that plugins
+    using the tools in the same process resolve to their own directories.
     """
 
-    for frame_info in inspect.stack():
-        caller_module_name: Optional[str] = frame_info.frame.f_globals.get("__name__")
+    # sys._getframe is used instead of inspect.stack, which reads the source
+    # code context of every frame
+    frame: Optional[FrameType] = sys._getframe(1)
+    while frame is not None:
+        caller_module_name: Optional[str] = frame.f_globals.get("__name__")
+        frame = frame.f_back
         if caller_module_name is None or "qgis_plugin_tools" in caller_module_name:
             # We are interested only on calls from outside of qgis_plugin_tools
             continue
-        for module_name in _iterate_modules(caller_module_name):
-            if is_plugin := _is_module_qgis_plugin(module_name):
-                assert is_plugin.plugin_directory
-                return is_plugin.plugin_directory
+        plugin_directory = _PLUGIN_DIRECTORIES.get(caller_module_name)
+        if plugin_directory is None:
+            plugin_directory = _find_plugin_directory(caller_module_name)
+        if plugin_directory is not None:
+            return plugin_directory
 
     # fall back to default directory tree
     return _plugin_path_submodule()
 
 
+def _find_plugin_directory(caller_module_name: str) -> Optional[str]:
+    for module_name in _iterate_modules(caller_module_name):
+        if is_plugin := _is_module_qgis_plugin(module_name):
+            assert is_plugin.plugin_directory
+            # Only found directories are cached, since the plugin package
+            # may not be fully imported yet when it is first checked
+            _PLUGIN_DIRECTORIES[caller_module_name] = is_plugin.plugin_directory
+            return is_plugin.plugin_directory
+    return None
+
+
 def plugin_path(*args: str) -> str:
     """Get the path to plugin package folder.
 
@@ -205,11 +248,10 @@ def plugin_name() -> str:
     if PLUGIN_NAME != "":
         return PLUGIN_NAME
 
-    try:
-        metadata = metadata_config()
-        name: str = metadata["general"]["name"]
-        name = name.replace(" ", "").strip()
-    except KeyError:
+    metadata_name = plugin_metadata().get("name")
+    if metadata_name is not None:
+        name = metadata_name.replace(" ", "").strip()
+    else:
         name = "test_plugin"
 
     # if qgis plugin tools is run as a dependency, global var cannot be set
@@ -227,11 +269,8 @@ def plugin_display_name() -> str:
     :return: The original plugin name.
     :rtype: basestring
     """
-    try:
-        metadata = metadata_config()
-        return metadata["general"]["name"]
-    except KeyError:
-        return "Test plugin"
+    name = plugin_metadata().get("name")
+    return name if name is not None else "Test plugin"
 
 
 def slug_name() -> str:
@@ -241,11 +280,10 @@ def slug_name() -> str:
     if SLUG_NAME != "":
         return SLUG_NAME
 
-    try:
-        metadata = metadata_config()
-        name: str = metadata["general"]["repository"]
-        slug = name.split("/")[-1]
-    except KeyError:
+    repository = plugin_metadata().get("repository")
+    if repository is not None:
+        slug = repository.split("/")[-1]
+    else:
         slug = plugin_name()
 
     # if qgis plugin tools is run as a dependency, global var cannot be set
@@ -275,6 +313,48 @@ def metadata_config() -> configparser.ConfigParser:
     return config
 
 
+def plugin_metadata() -> PluginMetadata:
+    """Get the contents of the metadata file of the plugin.
+
+    The metadata is cached by the plugin directory. The file is read again if its
+    modification time has changed, which is checked at most once in
+    METADATA_CHECK_INTERVAL seconds.
+
+    :return: The metadata, empty if the file does not exist.
+    """
+    path = plugin_path("metadata.txt")
+    now = time.monotonic()
+    cached = _METADATA.get(path)
+    if cached is not None and now - cached[1] < METADATA_CHECK_INTERVAL:
+        return cached[0]
+
+    try:
+        mtime: Optional[int] = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+    if cached is not None and cached[0].mtime == mtime:
+        metadata = cached[0]
+    else:
+        metadata = _read_metadata(path, mtime)
+    _METADATA[path] = (metadata, now)
+    return metadata
+
+
+def _read_metadata(path: str, mtime: Optional[int]) -> PluginMetadata:
+    config = configparser.ConfigParser(interpolation=None)
+    config.read(path)
+    return PluginMetadata(
+        path,
+        mtime,
+        MappingProxyType(
+            {
+                section: MappingProxyType(dict(config.items(section, raw=True)))
+                for section in config.sections()
+            }
+        ),
+    )
+
+
 def qgis_plugin_ci_config() -> Optional[Dict]:
     """
     Get configuration of the ci config or None
@@ -347,7 +427,7 @@ def load_ui(*args: str) -> QWidget:
 
 
 def load_ui_from_file(ui_file_path: "Union[str, os.PathLike]") -> QWidget:
-    ui_class, _ = uic.loadUiType(ui_file_path)
+    ui_class, _ = load_ui_type(ui_file_path)
     return ui_class
 
 
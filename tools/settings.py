@@ -1,4 +1,4 @@
-from typing import Any, Optional, Union
+from typing import Any, Callable, List, Optional, Union
 
 from qgis.core import QgsExpressionContextUtils, QgsProject, QgsSettings
 from qgis.PyQt.QtCore import QVariant
@@ -6,6 +6,10 @@ from qgis.PyQt.QtCore import QVariant
 from .exceptions import QgsPluginInvalidProjectSetting
 from .resources import plugin_name
 
+# Functions called with the full key and the value of a setting changed
+# with set_setting
+_SETTING_LISTENERS: List[Callable[[str, Any], None]] = []
+
 
 def setting_key(*args: str) -> str:
     """
@@ -56,7 +60,25 @@ def set_setting(
     :param section: Section argument can be used to set a value to a specific Section
     """
     qs = QgsSettings()
-    return qs.setValue(setting_key(key) if internal else key, value, section)
+    full_key = setting_key(key) if internal else key
+    result = qs.setValue(full_key, value, section)
+    for listener in list(_SETTING_LISTENERS):
+        listener(full_key, value)
+    return result
+
+
+def add_setting_listener(listener: Callable[[str, Any], None]) -> None:
+    """
+    Call the listener when a setting is changed with set_setting.
+
+    :param listener: Function called with the full key of the setting, as
+        returned by setting_key for the plugin settings, and the new value
+    """
+    _SETTING_LISTENERS.append(listener)
+
+
+def remove_setting_listener(listener: Callable[[str, Any], None]) -> None:
+    _SETTING_LISTENERS.remove(listener)
 
 
 def get_project_setting(
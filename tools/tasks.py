@@ -3,6 +3,7 @@ from typing import Any, Callable, Optional, Union
 
 from qgis.core import QgsTask
 
+from .custom_logging import current_task_name
 from .exceptions import QgsPluginException, TaskInterruptedException
 from .i18n import tr
 from .messages import MsgBar
@@ -36,6 +37,8 @@ class BaseTask(QgsTask):
         :return: whether task finished successfully or not.
         """
 
+        # the task is included in the JSON log records of this thread
+        task_name_token = current_task_name.set(self.name)
         LOGGER.debug(f"Started task {self.name}")
         try:
             self._check_if_canceled()
@@ -43,6 +46,8 @@ class BaseTask(QgsTask):
         except Exception as e:  # noqa: PIE786
             self.exception = e
             return False
+        finally:
+            current_task_name.reset(task_name_token)
 
     def finished(self, result: bool) -> None:
         """
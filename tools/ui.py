@@ -1,10 +1,10 @@
 import importlib.resources
 from typing import Any, Dict, Type
 
-from qgis.PyQt import uic
 from qgis.PyQt.QtWidgets import QWidget
 
 from .resources import package_file
+from .ui_cache import load_ui_type
 
 
 class CompiledUI:
@@ -38,7 +38,7 @@ def load_ui_file(package: importlib.resources.Package, ui_file_name: str) -> Any
 
     ui_class: Type[CompiledUI]
     base_class: Type[QWidget]
-    ui_class, base_class = uic.loadUiType(str(ui_file_path))
+    ui_class, base_class = load_ui_type(ui_file_path)
 
     class UiFileWidget(base_class, ui_class):  # type: ignore
         def __init__(
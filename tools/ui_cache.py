@@ -0,0 +1,136 @@
+"""Cache of the classes compiled from Qt Designer .ui files."""
+
+import hashlib
+import io
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Type, Union
+
+from qgis.PyQt import QtWidgets
+from qgis.PyQt.QtCore import PYQT_VERSION_STR
+from qgis.PyQt.QtWidgets import QWidget
+
+__copyright__ = "Copyright 2020-2021, Gispo Ltd"
+__license__ = "GPL version 3"
+__email__ = "info@gispo.fi"
+__revision__ = "$Format:%H$"
+
+LOGGER = logging.getLogger(__name__)
+ENCODING = "utf-8"
+# First line of the cached code, followed by the names of the classes
+_HEADER = "# Compiled by qgis_plugin_tools from a .ui file:"
+
+UiClasses = Tuple[type, Type[QWidget]]
+
+# Compiled classes and the modification time of the .ui file by its path
+_CLASSES: Dict[str, Tuple[int, UiClasses]] = {}
+_disk_cache_dir: Optional[Path] = None
+
+
+def load_ui_type(ui_file_path: Union[str, "os.PathLike"]) -> UiClasses:
+    """
+    Get the form class and its Qt base class of the .ui file like uic.loadUiType.
+
+    The classes are compiled once per process and again only if the file
+    has been modified. With the disk cache enabled, the Python code generated
+    from the file is stored, so that it is not generated again when the plugin
+    is restarted.
+    :param ui_file_path: Path to the .ui file
+    :return: the form class and the Qt widget class it is set up on
+    """
+    path = os.path.abspath(ui_file_path)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _CLASSES.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    classes = _compile(path, mtime)
+    _CLASSES[path] = (mtime, classes)
+    return classes
+
+
+def enable_ui_disk_cache(directory: Union[str, "os.PathLike"]) -> None:
+    """
+    Store the code compiled from the .ui files in the directory.
+
+    The code is keyed by the path and the modification time of the .ui file
+    and the PyQt version, so a stale file is never used.
+    >>> enable_ui_disk_cache(profile_path("cache", plugin_name(), "ui"))
+    :param directory: Directory of the cached code, created if needed
+    """
+    global _disk_cache_dir
+    _disk_cache_dir = Path(directory)
+    _disk_cache_dir.mkdir(parents=True, exist_ok=True)
+
+
+def disable_ui_disk_cache() -> None:
+    global _disk_cache_dir
+    _disk_cache_dir = None
+
+
+def clear_ui_cache() -> None:
+    """Forget the classes compiled in this process"""
+    _CLASSES.clear()
+
+
+def _compile(path: str, mtime: int) -> UiClasses:
+    cache_file: Optional[Path] = None
+    code: Optional[str] = None
+    if _disk_cache_dir is not None:
+        key = f"{path}\n{mtime}\n{PYQT_VERSION_STR}".encode(ENCODING)
+        cache_file = _disk_cache_dir / f"ui_{hashlib.sha1(key).hexdigest()}.py"
+        code = _read_cached_code(cache_file)
+
+    if code is None:
+        code = _generate_code(path)
+        if cache_file is not None:
+            _write_cached_code(cache_file, code)
+
+    header, _ = code.split("\n", 1)
+    ui_class_name, base_class_name = header[len(_HEADER) :].split()
+    ui_globals: Dict[str, Any] = {}
+    exec(compile(code, str(cache_file or path), "exec"), ui_globals)
+    # The base class is either a custom widget imported by the code or a Qt widget
+    base_class = ui_globals.get(base_class_name) or getattr(QtWidgets, base_class_name)
+    return ui_globals[ui_class_name], base_class
+
+
+def _generate_code(path: str) -> str:
+    """Generate the code of the form class with the names of the classes as header"""
+    # imported here, so that the classes loaded from the disk cache do not need them
+    import xml.etree.ElementTree as ET  # noqa: N817
+
+    from qgis.PyQt import uic
+
+    root = ET.parse(path).getroot()
+    widget = root.find("widget")
+    if widget is None:
+        raise ValueError(f"{path} does not define a widget")
+    # pyuic names the form class after the class element of the .ui file
+    ui_class_name = f"Ui_{root.findtext('class', '').strip()}"
+
+    code = io.StringIO()
+    code.write(f"{_HEADER} {ui_class_name} {widget.get('class')}\n")
+    uic.compileUi(path, code)
+    return code.getvalue()
+
+
+def _read_cached_code(cache_file: Path) -> Optional[str]:
+    try:
+        code = cache_file.read_text(encoding=ENCODING)
+    except OSError:
+        return None
+    if not code.startswith(_HEADER):
+        return None
+    return code
+
+
+def _write_cached_code(cache_file: Path, code: str) -> None:
+    # written to a temporary file first, so a partial file is never read
+    temporary_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    try:
+        temporary_file.write_text(code, encoding=ENCODING)
+        os.replace(temporary_file, cache_file)
+    except OSError as e:
+        LOGGER.warning(f"Could not write compiled ui to {cache_file}: {e}")
@@ -1,10 +1,8 @@
 """Tools about version."""
 from typing import Tuple
 
-from osgeo import osr
-
 from .exceptions import QgsPluginVersionInInvalidFormat
-from .resources import metadata_config
+from .resources import plugin_metadata
 
 
 def format_version_integer(version_string: str) -> int:
@@ -18,7 +16,7 @@ def format_version_integer(version_string: str) -> int:
 
 def version(remove_v_prefix: bool = True) -> str:
     """Return the version defined in metadata.txt."""
-    v = metadata_config()["general"]["version"]
+    v = plugin_metadata().sections["general"]["version"]
     if v.startswith("v") and remove_v_prefix:
         v = v[1:]
     return v
@@ -26,6 +24,9 @@ def version(remove_v_prefix: bool = True) -> str:
 
 def proj_version() -> Tuple[int, int]:
     """Returns PROJ library version"""
+    # imported here, since importing GDAL is slow and rarely needed
+    from osgeo import osr
+
     major: int = osr.GetPROJVersionMajor()
     minor: int = osr.GetPROJVersionMinor()
     return major, minor
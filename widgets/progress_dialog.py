@@ -6,7 +6,6 @@ import logging
 from typing import Callable, Optional, Union
 
 from qgis.core import QgsApplication, QgsTask
-from qgis.PyQt import uic
 from qgis.PyQt.QtCore import pyqtSignal
 from qgis.PyQt.QtGui import QCloseEvent
 from qgis.PyQt.QtWidgets import (
@@ -24,9 +23,10 @@ from qgis.PyQt.QtWidgets import (
 from ..tools.decorations import log_if_fails
 from ..tools.i18n import tr
 from ..tools.resources import qgis_plugin_tools_resources
+from ..tools.ui_cache import load_ui_type
 
 FORM_CLASS: QWidget
-FORM_CLASS, _ = uic.loadUiType(qgis_plugin_tools_resources("ui", "progress_dialog.ui"))
+FORM_CLASS, _ = load_ui_type(qgis_plugin_tools_resources("ui", "progress_dialog.ui"))
 LOGGER = logging.getLogger(__name__)
 
 